@@ -1,10 +1,35 @@
 # 作者：Alex
 # 2026/1/28 16:48
-from src.telegram_world_bot.telegram.build_app import build_app
+import argparse
+
+ALLOWED_UPDATES = ["message"]
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile-startup", action="store_true", help="打印启动各阶段耗时后退出")
+    args = parser.parse_args()
+    if args.profile_startup:
+        from src.telegram_world_bot.telegram.startup_profile import profile_startup
+        profile_startup()
+        return
+
+    from src.telegram_world_bot.telegram.build_app import build_app
+
     app = build_app()
-    app.run_polling(allowed_updates=["message"])
+    webhook = app.bot_data["settings"].webhook
+    if webhook.url:
+        # PTB 自带的 webhook server：收到请求先 ack，再把 update 丢进 app.update_queue
+        app.run_webhook(
+            listen=webhook.listen,
+            port=webhook.port,
+            url_path=webhook.path,
+            webhook_url=webhook.full_url(),
+            secret_token=webhook.secret_token or None,
+            max_connections=webhook.max_connections,
+            allowed_updates=ALLOWED_UPDATES,
+        )
+    else:
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
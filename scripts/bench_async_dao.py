@@ -0,0 +1,110 @@
+"""
+对比 onboarding.confirm 里的 DB 调用：同步 MySQLDAO（直接在 async handler 里调用） vs AsyncLocalDAO。
+每次 DB 调用人为注入固定延迟，模拟 MySQL commit 往返。
+
+用法：python -m scripts.bench_async_dao --updates 200 --concurrency 32 --latency-ms 20
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import StaticPool
+
+from src.telegram_world_bot.db.dao import MySQLDAO, AsyncLocalDAO
+from src.telegram_world_bot.db.local import make_async_session_factory, init_local_db_async
+from src.telegram_world_bot.db.models import Base
+
+
+class _SlowSyncDAO(MySQLDAO):
+    # 阻塞式驱动：等待期间整个线程（也就是 event loop）都停住
+    def __init__(self, session_factory, latency: float):
+        super().__init__(session_factory)
+        self._latency = latency
+
+    def try_acquire_idempotency(self, key: str) -> bool:
+        time.sleep(self._latency)
+        return super().try_acquire_idempotency(key)
+
+    def log_event(self, user_id: int, event: str, payload: str | None = None) -> None:
+        time.sleep(self._latency)
+        super().log_event(user_id, event, payload)
+
+
+class _SlowAsyncDAO(AsyncLocalDAO):
+    # async 驱动：等待期间 event loop 可以去处理别的 update
+    def __init__(self, session_factory, latency: float):
+        super().__init__(session_factory)
+        self._latency = latency
+
+    async def try_acquire_idempotency(self, key: str) -> bool:
+        await asyncio.sleep(self._latency)
+        return await super().try_acquire_idempotency(key)
+
+    async def log_event(self, user_id: int, event: str, payload: str | None = None) -> None:
+        await asyncio.sleep(self._latency)
+        await super().log_event(user_id, event, payload)
+
+
+async def _drive(handle, updates: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> None:
+        async with sem:
+            await handle(i)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(updates)))
+    return time.perf_counter() - t0
+
+
+async def bench_sync(updates: int, concurrency: int, latency: float) -> float:
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    dao = _SlowSyncDAO(sessionmaker(bind=engine, class_=Session, autoflush=False), latency)
+
+    async def handle(i: int) -> None:
+        if dao.try_acquire_idempotency(f"onboarding_submit:{i}:新用户模式"):
+            dao.log_event(i, "onboarding_submit", payload="mode=新用户模式")
+
+    try:
+        return await _drive(handle, updates, concurrency)
+    finally:
+        engine.dispose()
+
+
+async def bench_async(updates: int, concurrency: int, latency: float) -> float:
+    # 内存库只能共用一个连接，并发 session 会互相踩事务：这里用临时文件库
+    tmpdir = tempfile.mkdtemp()
+    factory, engine = make_async_session_factory(f"sqlite+aiosqlite:///{Path(tmpdir) / 'bench.db'}")
+    await init_local_db_async(engine)
+    dao = _SlowAsyncDAO(factory, latency)
+
+    async def handle(i: int) -> None:
+        if await dao.try_acquire_idempotency(f"onboarding_submit:{i}:新用户模式"):
+            await dao.log_event(i, "onboarding_submit", payload="mode=新用户模式")
+
+    try:
+        return await _drive(handle, updates, concurrency)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    print(f"updates={args.updates} concurrency={args.concurrency} injected_latency={args.latency_ms}ms")
+    for label, fn in (("sync MySQLDAO (before)", bench_sync), ("AsyncMySQLDAO (after)", bench_async)):
+        elapsed = asyncio.run(fn(args.updates, args.concurrency, latency))
+        print(f"{label:<24} {args.updates / elapsed:8.1f} updates/s  ({elapsed:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+指标的开销：单个操作（inc / observe / labels 查找）和一条 update 完整走一遍 Application.process_update 时，
+有 / 没有 instrument_handlers 的差值；再加上 SQL 语句挂 engine 事件前后的差值。
+
+用法：python -m scripts.bench_metrics --ops 1000000 --updates 20000
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import create_engine, text
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters
+
+from src.telegram_world_bot.db.instrumentation import instrument_engine
+from src.telegram_world_bot.metrics import Registry
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+from src.telegram_world_bot.telegram.instrumentation import instrument_handlers
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+
+def _per_op_ns(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - t0) / n * 1e9
+
+def bench_ops(n: int) -> None:
+    reg = Registry()
+    counter = reg.counter("c_total", "c", ("handler",))
+    hist = reg.histogram("h_seconds", "h", ("handler",))
+    c_child = counter.labels("confirm")
+    h_child = hist.labels("confirm")
+
+    def loop_empty(n):
+        for _ in range(n):
+            pass
+
+    def loop_inc(n):
+        for _ in range(n):
+            c_child.inc()
+
+    def loop_observe(n):
+        for _ in range(n):
+            h_child.observe(0.0123)
+
+    def loop_labels_observe(n):
+        for _ in range(n):
+            hist.labels("confirm").observe(0.0123)
+
+    def loop_timed(n):
+        perf = time.perf_counter
+        for _ in range(n):
+            t0 = perf()
+            h_child.observe(perf() - t0)
+
+    base = _per_op_ns(loop_empty, n)
+    for label, fn in (
+        ("counter.inc (cached child)", loop_inc),
+        ("histogram.observe (cached child)", loop_observe),
+        ("histogram.labels().observe", loop_labels_observe),
+        ("2x perf_counter + observe", loop_timed),
+    ):
+        print(f"  {label:<36} {_per_op_ns(fn, n) - base:8.1f} ns/op")
+
+async def _process(updates: int, instrument: bool) -> float:
+    async def on_text(update, context):
+        return None
+
+    async def on_cmd(update, context):
+        return None
+
+    app = Application.builder().token("123:TEST").request(FakeRequest(FakeBotAPI())).build()
+    app.add_handler(CommandHandler("start", on_cmd))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
+    if instrument:
+        instrument_handlers(app)
+    batch = [Update.de_json(make_text_update(i, i % 100 + 1, "hello" if i % 2 else "/start"), app.bot) for i in range(updates)]
+    async with app:
+        t0 = time.perf_counter()
+        for update in batch:
+            await app.process_update(update)
+        return (time.perf_counter() - t0) / updates * 1e6
+
+def bench_updates(updates: int, rounds: int) -> None:
+    # 交替跑几轮取最小值，减少噪声
+    plain = min(asyncio.run(_process(updates, False)) for _ in range(rounds))
+    inst = min(asyncio.run(_process(updates, True)) for _ in range(rounds))
+    print(f"  process_update plain          {plain:8.2f} us/update")
+    print(f"  process_update instrumented   {inst:8.2f} us/update  (+{inst - plain:.2f} us)")
+
+def bench_sql(queries: int) -> None:
+    def run(instrument: bool) -> float:
+        engine = create_engine("sqlite:///:memory:")
+        if instrument:
+            instrument_engine(engine, registry=Registry())
+        with engine.connect() as conn:
+            stmt = text("SELECT 1")
+            t0 = time.perf_counter()
+            for _ in range(queries):
+                conn.execute(stmt)
+            return (time.perf_counter() - t0) / queries * 1e6
+
+    plain, inst = run(False), run(True)
+    print(f"  sqlite SELECT 1 plain         {plain:8.2f} us/query")
+    print(f"  sqlite SELECT 1 instrumented  {inst:8.2f} us/query  (+{inst - plain:.2f} us)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=1_000_000)
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print("single operations:")
+    bench_ops(args.ops)
+    print("per update:")
+    bench_updates(args.updates, args.rounds)
+    print("per SQL statement:")
+    bench_sql(args.queries)
+
+if __name__ == "__main__":
+    main()
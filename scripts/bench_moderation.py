@@ -0,0 +1,69 @@
+"""
+敏感词匹配压测：随机生成 N 个 CJK 词（2~6 字）和一批消息，比较
+- KeywordMatcher（Aho–Corasick，含归一化）
+- 朴素做法：for word in words: if word in text
+的建树时间、每条消息耗时，以及 Aho–Corasick 的节点数。
+
+用法：python -m scripts.bench_moderation --sizes 10000 100000 --messages 2000 --length 200
+"""
+import argparse
+import random
+import time
+
+from src.telegram_world_bot.agents.wordfilter import KeywordMatcher
+
+CJK_START, CJK_END = 0x4E00, 0x9FA5
+
+def _rand_cjk(rng: random.Random, n: int) -> str:
+    return "".join(chr(rng.randint(CJK_START, CJK_END)) for _ in range(n))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=200, help="每条消息的字数")
+    parser.add_argument("--hit-rate", type=float, default=0.1, help="含敏感词的消息比例")
+    parser.add_argument("--naive-limit", type=int, default=10_000, help="词表大于这个数就不跑朴素做法（太慢）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        words = [_rand_cjk(rng, rng.randint(2, 6)) for _ in range(size)]
+        messages = []
+        for _ in range(args.messages):
+            text = _rand_cjk(rng, args.length)
+            if rng.random() < args.hit_rate:
+                pos = rng.randint(0, args.length)
+                # 插分隔符，测归一化
+                text = text[:pos] + " - ".join(rng.choice(words)) + text[pos:]
+            messages.append(text)
+
+        t0 = time.perf_counter()
+        matcher = KeywordMatcher(words)
+        build_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        hits = sum(1 for m in messages if matcher.first(m) is not None)
+        ac_us = (time.perf_counter() - t0) / len(messages) * 1e6
+
+        t0 = time.perf_counter()
+        for m in messages:
+            matcher.search(m)
+        all_us = (time.perf_counter() - t0) / len(messages) * 1e6
+
+        line = (
+            f"patterns={size:<7} nodes={matcher.node_count:<8} build={build_s:6.2f}s  "
+            f"first={ac_us:8.1f}us/msg  search_all={all_us:8.1f}us/msg  hits={hits}"
+        )
+        if size <= args.naive_limit:
+            sample = messages[: min(len(messages), 200)]
+            t0 = time.perf_counter()
+            for m in sample:
+                any(w in m for w in words)
+            naive_us = (time.perf_counter() - t0) / len(sample) * 1e6
+            line += f"  naive={naive_us:10.1f}us/msg"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+onboarding 流程的端到端吞吐基准：不连 Telegram 也不连 MySQL。
+
+- 真正的 build_app()：handler、ConversationHandler、session/user/memory store、event sink、agent 全部照常
+- 发往 Bot API 的请求走进程内 FakeRequest（只记录调用），DB 换成临时目录里的 SQLite
+- N 个合成用户，每人依次发 /start → 新用户模式 → 确认提交，等上一条处理完才发下一条（像真人等回复）；
+  同时在线的用户数 = --concurrency，>1 时用 PerUserUpdateProcessor 并发处理
+  （SQLite 同一时间只有一个写者，并发下 confirm 的尾延迟主要是在等 SQLite 的写锁，和 MySQL 上不可比）
+- 每条 update 的延迟从交给 update processor 算到处理完（含排队）
+- 内存另跑一轮（tracemalloc 会让速度慢好几倍，不和计时混在一起）：
+  统计的是处理完之后留下来的净分配（字节 / 块数，按 update 平均）和这一轮的峰值，不是分配次数
+
+结果写成 JSON（默认 data/bench/onboarding-<commit>.json），--compare 和之前的结果对比。
+
+用法：python -m scripts.bench_onboarding --users 2000 --concurrency 32
+     python -m scripts.bench_onboarding --users 2000 --compare data/bench/onboarding-abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from telegram import Update
+
+from src.telegram_world_bot.config import RateLimitConfig, UserStoreConfig
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI
+from src.telegram_world_bot.telegram.standin import build_standin_app, start_standin, stop_standin
+from src.telegram_world_bot.telegram.synthetic import ONBOARDING_STEPS, make_text_update
+
+USER_ID_BASE = 20_000_000
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+def summarize(values_ms: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(values_ms),
+        "mean": round(sum(values_ms) / len(values_ms), 3) if values_ms else 0.0,
+        "p50": round(percentile(values_ms, 50), 3),
+        "p95": round(percentile(values_ms, 95), 3),
+        "p99": round(percentile(values_ms, 99), 3),
+        "max": round(max(values_ms, default=0.0), 3),
+    }
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+class _Harness:
+    def __init__(self, app, concurrency: int):
+        self.app = app
+        self.concurrency = concurrency
+        self.next_update_id = 1
+
+    async def _process(self, user_id: int, text: str) -> float:
+        update = Update.de_json(make_text_update(self.next_update_id, user_id, text), self.app.bot)
+        self.next_update_id += 1
+        t0 = time.perf_counter()
+        # 和 Application 自己取 update 时一样：经过 update processor
+        await self.app.update_processor.process_update(update, self.app.process_update(update))
+        return (time.perf_counter() - t0) * 1000
+
+    async def walk(self, user_ids: range, latencies: Dict[str, List[float]] | None = None) -> float:
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one_user(user_id: int) -> None:
+            async with sem:
+                for step, text in ONBOARDING_STEPS:
+                    ms = await self._process(user_id, text)
+                    if latencies is not None:
+                        latencies[step].append(ms)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_user(uid) for uid in user_ids))
+        return time.perf_counter() - t0
+
+def _alloc_top(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, n: int = 10) -> List[Dict[str, Any]]:
+    rows = []
+    for stat in after.compare_to(before, "lineno")[:n]:
+        frame = stat.traceback[0]
+        rows.append({"where": f"{frame.filename}:{frame.lineno}", "size_diff": stat.size_diff, "count_diff": stat.count_diff})
+    return rows
+
+async def _run(args, workdir: Path) -> Dict[str, Any]:
+    api = FakeBotAPI()
+    app = build_standin_app(
+        workdir,
+        api,
+        user_store=UserStoreConfig(path=str(workdir / "users.json"), journal=args.user_store_journal),
+        rate_limit=RateLimitConfig(enabled=args.rate_limit),
+        concurrent_updates=args.concurrency,
+    )
+    errors: List[BaseException] = []
+
+    async def count_error(update, context) -> None:
+        errors.append(context.error)
+
+    app.add_error_handler(count_error)
+    harness = _Harness(app, args.concurrency)
+
+    await start_standin(app)
+    try:
+        next_user = USER_ID_BASE
+        await harness.walk(range(next_user, next_user + args.warmup))
+        next_user += args.warmup
+
+        latencies: Dict[str, List[float]] = {step: [] for step, _ in ONBOARDING_STEPS}
+        timed_users = range(next_user, next_user + args.users)
+        wall_s = await harness.walk(timed_users, latencies)
+        next_user += args.users
+
+        alloc: Dict[str, Any] = {}
+        if args.alloc_users:
+            alloc_users = range(next_user, next_user + args.alloc_users)
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            await harness.walk(alloc_users)
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            n = args.alloc_users * len(ONBOARDING_STEPS)
+            diffs = after.compare_to(before, "filename")
+            alloc = {
+                "updates": n,
+                "retained_bytes_per_update": round(sum(s.size_diff for s in diffs) / n, 1),
+                "retained_blocks_per_update": round(sum(s.count_diff for s in diffs) / n, 2),
+                "peak_kb": round(peak / 1024, 1),
+                "top": _alloc_top(before, after),
+            }
+    finally:
+        await stop_standin(app)
+
+    # 每个用户最后一条回复应当是"已完成设置"：否则基准测的是出错路径
+    done_users = {
+        p["chat_id"] for p in api.sent_messages() if str(p.get("text", "")).startswith("✅")
+    }
+    completed = sum(1 for uid in timed_users if uid in done_users)
+    all_ms = [ms for values in latencies.values() for ms in values]
+    updates = len(all_ms)
+    return {
+        "benchmark": "onboarding",
+        "git_commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "users": args.users,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "rate_limit": args.rate_limit,
+            "user_store_journal": args.user_store_journal,
+            "alloc_users": args.alloc_users,
+        },
+        "updates": updates,
+        "wall_s": round(wall_s, 3),
+        "throughput_ups": round(updates / wall_s, 1) if wall_s else 0.0,
+        "latency_ms": summarize(all_ms),
+        "latency_ms_by_step": {step: summarize(values) for step, values in latencies.items()},
+        "alloc": alloc,
+        "completed_users": completed,
+        "errors": len(errors),
+        "bot_api_calls": dict(Counter(method for _, method, _ in api.calls)),
+    }
+
+def run_benchmark(args) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bench_onboarding_") as tmp:
+        return asyncio.run(_run(args, Path(tmp)))
+
+def _compare(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"vs {baseline.get('git_commit', '?')} ({baseline.get('timestamp', '?')}):")
+    rows = [("throughput_ups", result["throughput_ups"], baseline.get("throughput_ups"))]
+    for key in ("p50", "p95", "p99"):
+        rows.append((f"latency_ms.{key}", result["latency_ms"][key], baseline.get("latency_ms", {}).get(key)))
+    key = "retained_bytes_per_update"
+    rows.append((f"alloc.{key}", result["alloc"].get(key), baseline.get("alloc", {}).get(key)))
+    for name, new, old in rows:
+        if new is None or not old:
+            print(f"  {name:<34} {new}")
+            continue
+        print(f"  {name:<34} {old:>10} -> {new:<10} ({(new - old) / old * 100:+.1f}%)")
+
+def print_result(result: Dict[str, Any]) -> None:
+    lat = result["latency_ms"]
+    print(
+        f"{result['updates']} updates in {result['wall_s']:.2f}s -> {result['throughput_ups']:.0f} updates/s "
+        f"(concurrency={result['params']['concurrency']})"
+    )
+    print(f"  latency  p50={lat['p50']:.2f}ms p95={lat['p95']:.2f}ms p99={lat['p99']:.2f}ms max={lat['max']:.2f}ms")
+    for step, s in result["latency_ms_by_step"].items():
+        print(f"    {step:<8} p50={s['p50']:.2f}ms p95={s['p95']:.2f}ms p99={s['p99']:.2f}ms")
+    alloc = result["alloc"]
+    if alloc:
+        print(
+            f"  memory   {alloc['retained_bytes_per_update']:.0f} B / {alloc['retained_blocks_per_update']:.1f} blocks "
+            f"retained per update, peak {alloc['peak_kb']:.0f} KiB over {alloc['updates']} updates"
+        )
+    print(f"  completed {result['completed_users']}/{result['params']['users']} users, {result['errors']} handler errors")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1, help="同时在走流程的用户数")
+    parser.add_argument("--alloc-users", type=int, default=200, help="tracemalloc 那一轮的用户数；0 跳过")
+    parser.add_argument("--rate-limit", action="store_true", help="挂上出站限速器（私聊 1 条/秒，会成为瓶颈）")
+    parser.add_argument("--user-store-journal", action="store_true")
+    parser.add_argument("--out", default="", help="默认 data/bench/onboarding-<commit>.json")
+    parser.add_argument("--compare", default="", help="之前某次的结果 JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = run_benchmark(args)
+    print_result(result)
+
+    out = Path(args.out or f"data/bench/onboarding-{result['git_commit']}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"saved {out}")
+    if args.compare:
+        _compare(result, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    if result["completed_users"] != args.users or result["errors"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
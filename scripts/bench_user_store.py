@@ -0,0 +1,55 @@
+"""
+UserStore.upsert 吞吐：旧实现（每次整文件重写） vs journal 模式（每次 fsync / group commit）。
+
+用法：python -m scripts.bench_user_store --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from src.telegram_world_bot.services.user_store import UserStore, UserProfile
+
+def _seed_snapshot(path: Path, n: int) -> None:
+    data = {str(i): {"user_id": i, "username": f"user{i}", "first_name": "x"} for i in range(n)}
+    path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+
+def _bench(store: UserStore, n_users: int, ops: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(ops):
+        uid = (i * 7919) % n_users
+        store.upsert(UserProfile(user_id=uid, username=f"renamed{i}", first_name="y"))
+    elapsed = time.perf_counter() - t0
+    store.close()
+    return ops / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=5000, help="journal 模式每轮 upsert 次数")
+    parser.add_argument("--legacy-budget", type=int, default=2_000_000,
+                        help="旧实现每轮大约重写这么多条 profile（ops = budget / size）")
+    parser.add_argument("--group-commit-ms", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'profiles':>10} {'mode':<22} {'upserts/s':>12}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "users.json"
+            modes = [
+                ("legacy (rewrite)", dict(), max(3, args.legacy_budget // n)),
+                ("journal fsync/op", dict(journal=True, compact_threshold=10 ** 9), args.ops),
+                (f"journal group {args.group_commit_ms}ms",
+                 dict(journal=True, group_commit_ms=args.group_commit_ms), args.ops),
+            ]
+            for label, kwargs, ops in modes:
+                for p in Path(tmp).iterdir():
+                    p.unlink()
+                _seed_snapshot(path, n)
+                store = UserStore(str(path), **kwargs)
+                rate = _bench(store, n, ops)
+                print(f"{n:>10} {label:<22} {rate:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+给所有 onboarding 过的用户群发一条消息；中断后用同一个 --campaign 再跑一次就从断点继续。
+
+用法：python -m scripts.broadcast --campaign 2026-10-news --text-file data/news.txt
+     python -m scripts.broadcast --campaign 2026-10-news --text "..." --source events
+
+--dry-run：不连 Telegram 也不碰 MySQL —— 消息发给进程内的假 Bot API，进度写本地 SQLite，
+限速照常生效，可以先看一眼总耗时 / ETA。没有用户数据时用 --fake-users 生成一批。
+     python -m scripts.broadcast --campaign test --text hi --dry-run --fake-users 2000
+"""
+import argparse
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from telegram.ext import ExtBot
+
+from src.telegram_world_bot.services.broadcast import Broadcaster, EventLogRecipients, UserStoreRecipients
+from src.telegram_world_bot.services.user_store import UserStore
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+from src.telegram_world_bot.telegram.rate_limiter import OutboundRateLimiter
+
+class _FakeUsers:
+    """--fake-users：user_id 1..n，接口和 UserStore 的收件人部分一样。"""
+    def __init__(self, n: int):
+        self.n = n
+
+    def count_user_ids(self, after: int = 0) -> int:
+        return max(0, self.n - after)
+
+    def iter_user_ids(self, after: int = 0, chunk_size: int = 1000):
+        for start in range(after + 1, self.n + 1, chunk_size):
+            yield list(range(start, min(start + chunk_size, self.n + 1)))
+
+async def _dry_run_deps(args):
+    from src.telegram_world_bot.db.dao import AsyncLocalDAO
+    from src.telegram_world_bot.db.local import make_async_session_factory, init_local_db_async
+
+    api = FakeBotAPI()
+    limiter = None if args.no_rate_limit else OutboundRateLimiter()
+    bot = ExtBot("0:DRYRUN", request=FakeRequest(api, latency_s=args.fake_latency_ms / 1000), rate_limiter=limiter)
+    session_factory, engine = make_async_session_factory(args.db_url)
+    await init_local_db_async(engine)
+    users = _FakeUsers(args.fake_users) if args.fake_users else UserStore(args.users_path)
+    return bot, AsyncLocalDAO(session_factory), users, engine
+
+async def _live_deps(args):
+    from src.telegram_world_bot.config import load_settings
+    from src.telegram_world_bot.db.dao import AsyncMySQLDAO
+    from src.telegram_world_bot.db.migrations import check_schema_async
+    from src.telegram_world_bot.db.mysql import make_async_session_factory
+
+    settings = load_settings()
+    kwargs = {"base_url": settings.bot_api_base_url} if settings.bot_api_base_url else {}
+    bot = ExtBot(settings.bot_token, rate_limiter=OutboundRateLimiter.from_config(settings.rate_limit), **kwargs)
+    session_factory, engine = make_async_session_factory(settings.db)
+    # checkpoint / blocked_users 两张表由 scripts.init_db 建
+    await check_schema_async(engine)
+    users = UserStore(args.users_path or settings.user_store.path)
+    return bot, AsyncMySQLDAO(session_factory), users, engine
+
+async def run(args) -> None:
+    text = Path(args.text_file).read_text(encoding="utf-8") if args.text_file else args.text
+    if not text:
+        raise SystemExit("need --text or --text-file")
+
+    bot, dao, users, engine = await (_dry_run_deps(args) if args.dry_run else _live_deps(args))
+    if args.source == "events":
+        recipients = EventLogRecipients(dao, args.event, args.chunk_size)
+    else:
+        recipients = UserStoreRecipients(users, args.chunk_size)
+
+    t0 = time.perf_counter()
+    try:
+        async with bot:
+            progress = await Broadcaster(
+                bot,
+                dao,
+                args.campaign,
+                text,
+                recipients,
+                concurrency=args.concurrency,
+                parse_mode=args.parse_mode,
+                report_interval_s=args.report_interval_s,
+                checkpoint_every=args.checkpoint_every,
+                on_progress=lambda p: print(p.summary(), flush=True),
+            ).run()
+    finally:
+        await engine.dispose()
+    limiter = bot.rate_limiter
+    print(f"done in {time.perf_counter() - t0:.1f}s: {progress.summary()}")
+    if limiter is not None:
+        print(f"rate limiter: {limiter.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--campaign", required=True, help="断点按这个名字保存；同名再跑一次就是续发")
+    parser.add_argument("--text")
+    parser.add_argument("--text-file")
+    parser.add_argument("--parse-mode", default=None, help="HTML / MarkdownV2")
+    parser.add_argument("--source", choices=("users", "events"), default="users",
+                        help="users：UserStore；events：event_logs 里触发过 --event 的用户")
+    parser.add_argument("--event", default="onboarding_submit")
+    parser.add_argument("--users-path", default="", help="默认用 USER_STORE_PATH")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每次从库里取多少收件人")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="每发多少人存一次断点；崩溃时最多重发这么多")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--report-interval-s", type=float, default=10)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--db-url", default="sqlite+aiosqlite:///data/broadcast_dry_run.db", help="dry-run 用的本地库")
+    parser.add_argument("--fake-users", type=int, default=0)
+    parser.add_argument("--fake-latency-ms", type=float, default=0, help="dry-run 时假 API 每个请求的延迟")
+    parser.add_argument("--no-rate-limit", action="store_true", help="dry-run 时不限速，只看引擎本身的吞吐")
+    args = parser.parse_args()
+    if args.dry_run and not args.users_path:
+        args.users_path = "data/users.json"
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
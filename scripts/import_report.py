@@ -0,0 +1,75 @@
+"""
+冷启动 import 耗时报告：子进程里跑 python -X importtime，按累计耗时排序列出最慢的模块，
+再把每个 agent 单独加载一遍，看 lazy agent 各自的 import / 构造成本。
+
+用法：python -m scripts.import_report --module src.telegram_world_bot.telegram.build_app --top 20
+     python -m scripts.import_report --json   # 方便 CI 存档对比
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+AGENTS = {
+    "onboarding": "src.telegram_world_bot.agents.onboarding_agent:OnboardingAgent",
+    "control": "src.telegram_world_bot.agents.control_agent:ControlAgent",
+    "moderation": "src.telegram_world_bot.agents.moderation_agent:ModerationAgent",
+}
+
+def import_times(module: str) -> List[Dict]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return rows
+
+def agent_load_times() -> List[Dict]:
+    # 每个 agent 一个干净的子进程，不受别的 agent 已经 import 的模块影响
+    code = (
+        "import json, sys\n"
+        "from src.telegram_world_bot.agents.registry import AgentRegistry\n"
+        "r = AgentRegistry(); r.register_lazy(sys.argv[1], sys.argv[2]); r.get(sys.argv[1])\n"
+        "print(json.dumps(r.load_report()[0]))\n"
+    )
+    out = []
+    for name, path in AGENTS.items():
+        proc = subprocess.run([sys.executable, "-c", code, name, path], capture_output=True, text=True, check=True)
+        out.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="src.telegram_world_bot.telegram.build_app")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    top_level = [r for r in rows if r["module"] == args.module]
+    total_ms = top_level[-1]["cumulative_ms"] if top_level else sum(r["self_ms"] for r in rows)
+    slowest = sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[: args.top]
+    agents = agent_load_times()
+
+    if args.json:
+        print(json.dumps({"module": args.module, "total_ms": total_ms, "slowest": slowest, "agents": agents}, indent=2))
+        return
+
+    print(f"import {args.module}: {total_ms:.1f}ms ({len(rows)} modules)")
+    for r in slowest:
+        print(f"  {r['cumulative_ms']:9.1f}ms  {r['self_ms']:8.1f}ms  {r['module']}")
+    print("\nlazy agents (first get):")
+    for a in agents:
+        print(f"  {a['name']:<12} import={a['import_ms']:8.2f}ms init={a['init_ms']:8.2f}ms  {a['source']}")
+
+if __name__ == "__main__":
+    main()
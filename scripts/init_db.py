@@ -2,13 +2,14 @@
 # 2026/1/28 16:57
 from src.telegram_world_bot.config import load_settings
 from src.telegram_world_bot.db.mysql import make_session_factory
-from src.telegram_world_bot.db.models import Base
+from src.telegram_world_bot.db.migrations import SCHEMA_VERSION, migrate
 
 def main():
     settings = load_settings()
     session_factory, engine = make_session_factory(settings.db)
-    Base.metadata.create_all(engine)
-    print("✅ MySQL tables created/verified.")
+    for step in migrate(engine):
+        print(f"✅ migration {step}")
+    print(f"✅ MySQL schema is at version {SCHEMA_VERSION}.")
 
 if __name__ == "__main__":
     main()
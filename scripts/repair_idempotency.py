@@ -1,18 +1,35 @@
 # 作者：Alex
 # 2026/1/28 16:58
+import argparse
+
 from src.telegram_world_bot.config import load_settings
 from src.telegram_world_bot.db.mysql import make_session_factory
 from src.telegram_world_bot.db.models import Base
 from src.telegram_world_bot.db.dao import MySQLDAO
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--all", action="store_true", help="清空整张表（旧行为），默认只分批删已过期的 key")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
     settings = load_settings()
     session_factory, engine = make_session_factory(settings.db)
     Base.metadata.create_all(engine)
 
     dao = MySQLDAO(session_factory)
-    deleted = dao.clear_idempotency_keys()
-    print(f"✅ cleared idempotency keys: {deleted}")
+    if args.all:
+        deleted = dao.clear_idempotency_keys()
+        print(f"✅ cleared idempotency keys: {deleted}")
+        return
+
+    deleted = 0
+    while True:
+        n = dao.sweep_expired_idempotency(args.batch)
+        deleted += n
+        if n < args.batch:
+            break
+    print(f"✅ swept expired idempotency keys: {deleted}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,186 @@
+"""
+把 RECORD_UPDATES=1 录下的真实 update（telegram/recorder.py，已脱敏）重新喂给本地 build_app()，做性能回归。
+Bot API 换成进程内 FakeBotAPI，MySQL 换成临时 SQLite（telegram/standin.py），每次回放都从空库开始，结果可重复。
+
+- --speed 1：按录制时的时间间隔原速回放；10：十倍速；max：不等待，能多快就多快
+- 每条 update 的延迟从它"应该到达"的时刻算起，处理不过来积压的时间也算在里面
+- 输出：bot 对每个 chat 依次发了什么（方法 + 文本），以及总体 / 按命令分类的延迟分布
+- --save 存成 JSON；--baseline 和之前存的结果对比：回复内容有差异时退出码 1，
+  给了 --max-regression 且 p95 变慢超过这个百分比时退出码 2
+
+用法：python -m scripts.replay_updates data/updates.jsonl.gz --speed max --save data/replay/base.json
+     python -m scripts.replay_updates data/updates.jsonl.gz --speed max --baseline data/replay/base.json
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import logging
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from telegram import Update
+
+from scripts.bench_onboarding import git_commit, summarize
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI
+from src.telegram_world_bot.telegram.recorder import KEEP_TEXTS, read_recording
+from src.telegram_world_bot.telegram.standin import build_standin_app, start_standin, stop_standin
+
+def update_kind(update: Update) -> str:
+    """延迟按这个分组：命令名 / 键盘按钮原文 / 普通文字。"""
+    msg = update.effective_message
+    if msg is None or msg.text is None:
+        return "other"
+    if msg.text.startswith("/"):
+        return msg.text.split(" ", 1)[0].split("@", 1)[0]
+    if msg.text in KEEP_TEXTS:
+        return msg.text
+    return "text"
+
+def bot_outputs(api: FakeBotAPI) -> Dict[str, List[str]]:
+    """每个 chat 收到的东西，按顺序；同一个用户的 update 串行处理，所以每个 chat 内部的顺序是确定的。"""
+    out: Dict[str, List[str]] = defaultdict(list)
+    for _, method, params in api.calls:
+        if "chat_id" not in params:
+            continue
+        out[str(params["chat_id"])].append(f"{method}: {params.get('text', params.get('caption', ''))}")
+    return dict(out)
+
+async def _replay(records: List[Dict[str, Any]], args, workdir: Path) -> Dict[str, Any]:
+    api = FakeBotAPI()
+    app = build_standin_app(workdir, api, concurrent_updates=args.concurrency)
+    errors: List[BaseException] = []
+
+    async def count_error(update, context) -> None:
+        errors.append(context.error)
+
+    app.add_error_handler(count_error)
+    proc = app.update_processor
+    latencies: List[Tuple[str, float]] = []
+
+    async def one(update: Update, due: float) -> None:
+        await proc.process_update(update, app.process_update(update))
+        latencies.append((update_kind(update), (time.perf_counter() - due) * 1000))
+
+    await start_standin(app)
+    try:
+        tasks = []
+        t_first = records[0]["t"] if records else 0.0
+        start = time.perf_counter()
+        for rec in records:
+            due = time.perf_counter()
+            if args.speed > 0:
+                due = start + (rec["t"] - t_first) / args.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    # sleep 醒晚了不算 bot 的；还在积压（delay <= 0）时从应到时刻算
+                    due = time.perf_counter()
+            update = Update.de_json(rec["update"], app.bot)
+            # 和 Application 取 update 的方式一致：并发处理时不等，串行时一条一条等
+            if proc.max_concurrent_updates > 1:
+                tasks.append(asyncio.create_task(one(update, due)))
+            else:
+                await one(update, due)
+        await asyncio.gather(*tasks)
+        wall_s = time.perf_counter() - start
+    finally:
+        await stop_standin(app)
+
+    by_kind: Dict[str, List[float]] = defaultdict(list)
+    for kind, ms in latencies:
+        by_kind[kind].append(ms)
+    return {
+        "replay": str(args.recording),
+        "git_commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "params": {"speed": args.speed or "max", "concurrency": args.concurrency, "updates": len(records)},
+        "wall_s": round(wall_s, 3),
+        "throughput_ups": round(len(latencies) / wall_s, 1) if wall_s else 0.0,
+        "latency_ms": summarize([ms for _, ms in latencies]),
+        "latency_ms_by_kind": {kind: summarize(values) for kind, values in sorted(by_kind.items())},
+        "errors": len(errors),
+        "outputs": bot_outputs(api),
+    }
+
+def replay(args) -> Dict[str, Any]:
+    records = list(read_recording(args.recording))
+    if args.limit:
+        records = records[: args.limit]
+    with tempfile.TemporaryDirectory(prefix="replay_updates_") as tmp:
+        return asyncio.run(_replay(records, args, Path(tmp)))
+
+def diff_outputs(result: Dict[str, Any], baseline: Dict[str, Any], show: int = 5) -> List[str]:
+    """返回有差异的 chat_id，并打印前 show 个的 diff。"""
+    new, old = result["outputs"], baseline["outputs"]
+    changed = sorted(chat for chat in set(new) | set(old) if new.get(chat) != old.get(chat))
+    for chat in changed[:show]:
+        print(f"--- chat {chat}")
+        for line in difflib.unified_diff(old.get(chat, []), new.get(chat, []), "baseline", "replay", lineterm="", n=1):
+            print(f"  {line}")
+    return changed
+
+def compare_latency(result: Dict[str, Any], baseline: Dict[str, Any]) -> float:
+    """打印各分类 p50/p95/p99 的变化，返回总体 p95 的变化百分比。"""
+    rows = [("all", result["latency_ms"], baseline["latency_ms"])]
+    for kind, stats in result["latency_ms_by_kind"].items():
+        if kind in baseline["latency_ms_by_kind"]:
+            rows.append((kind, stats, baseline["latency_ms_by_kind"][kind]))
+    print(f"{'kind':<12} {'n':>6} {'p50':>18} {'p95':>18} {'p99':>18}")
+    for kind, new, old in rows:
+        cells = []
+        for key in ("p50", "p95", "p99"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{new[key]:8.2f} ({change:+6.1f}%)")
+        print(f"{kind:<12} {new['n']:>6} {' '.join(f'{c:>18}' for c in cells)}")
+    old_p95 = baseline["latency_ms"]["p95"]
+    return (result["latency_ms"]["p95"] - old_p95) / old_p95 * 100 if old_p95 else 0.0
+
+def _parse_speed(raw: str) -> float:
+    return 0.0 if raw == "max" else float(raw)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", help="RECORD_UPDATES_PATH 录下的 .jsonl.gz")
+    parser.add_argument("--speed", type=_parse_speed, default=0.0, help="1 / 10 / max（默认 max）")
+    parser.add_argument("--concurrency", type=int, default=1, help="CONCURRENT_UPDATES，和线上配置保持一致")
+    parser.add_argument("--limit", type=int, default=0, help="只回放前 N 条")
+    parser.add_argument("--save", default="", help="结果 JSON 写到这里")
+    parser.add_argument("--baseline", default="", help="之前 --save 的结果")
+    parser.add_argument("--show-diffs", type=int, default=5)
+    parser.add_argument("--max-regression", type=float, default=0.0, help="p95 变慢超过这个百分比算失败；0 不检查")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    result = replay(args)
+    lat = result["latency_ms"]
+    print(
+        f"replayed {result['params']['updates']} updates in {result['wall_s']:.2f}s "
+        f"({result['throughput_ups']:.0f}/s, speed={result['params']['speed']}), {result['errors']} handler errors"
+    )
+    print(f"  latency p50={lat['p50']:.2f}ms p95={lat['p95']:.2f}ms p99={lat['p99']:.2f}ms max={lat['max']:.2f}ms")
+
+    if args.save:
+        out = Path(args.save)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"saved {out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print(f"vs {baseline.get('git_commit', '?')} ({baseline.get('timestamp', '?')}):")
+        changed = diff_outputs(result, baseline, args.show_diffs)
+        print(f"outputs: {len(changed)} of {len(set(result['outputs']) | set(baseline['outputs']))} chats differ")
+        p95_change = compare_latency(result, baseline)
+        if changed:
+            sys.exit(1)
+        if args.max_regression and p95_change > args.max_regression:
+            print(f"p95 regressed {p95_change:+.1f}% (limit {args.max_regression}%)")
+            sys.exit(2)
+
+if __name__ == "__main__":
+    main()
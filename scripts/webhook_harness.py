@@ -0,0 +1,116 @@
+"""
+webhook 模式的本地压测：不经过 Telegram。
+
+1. 本脚本先在 --api-port 上起一个假 Bot API（FakeBotAPIServer）
+2. 用下面的环境变量启动 bot（另一个终端）：
+     BOT_API_BASE_URL=http://127.0.0.1:8081/bot WEBHOOK_URL=http://127.0.0.1:8443 \\
+     WEBHOOK_SECRET_TOKEN=xxx python main.py
+3. 等 bot 调用 setWebhook 之后，脚本并发 POST 合成 update 到 webhook，
+   统计 ack 延迟（HTTP 200 返回）和端到端延迟（假 API 收到对应 chat 的第一条回复）。
+
+用法：python -m scripts.webhook_harness --updates 500 --concurrency 50 --text /help --secret xxx
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeBotAPIServer
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+USER_ID_BASE = 10_000_000
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+def report(label: str, values_ms: List[float]) -> None:
+    print(
+        f"{label:<10} n={len(values_ms):<6} "
+        f"p50={percentile(values_ms, 50):7.2f}ms p95={percentile(values_ms, 95):7.2f}ms "
+        f"p99={percentile(values_ms, 99):7.2f}ms max={max(values_ms, default=0):7.2f}ms"
+    )
+
+async def run(args) -> None:
+    api = FakeBotAPI()
+    server = FakeBotAPIServer(api, port=args.api_port)
+    await server.start()
+
+    webhook_set = asyncio.Event()
+    first_reply: Dict[int, float] = {}
+
+    def on_call(method: str, params: dict) -> None:
+        if method == "setWebhook":
+            webhook_set.set()
+        elif method == "sendMessage":
+            chat_id = params.get("chat_id")
+            if isinstance(chat_id, int) and chat_id not in first_reply:
+                first_reply[chat_id] = time.perf_counter()
+
+    api.add_listener(on_call)
+    print(f"fake Bot API listening on {server.base_url}")
+    if not args.no_wait:
+        print("waiting for the bot to call setWebhook ...")
+        await webhook_set.wait()
+
+    url = f"http://{args.webhook_host}:{args.webhook_port}/{args.webhook_path.lstrip('/')}"
+    headers = {"Content-Type": "application/json"}
+    if args.secret:
+        headers[SECRET_HEADER] = args.secret
+
+    sent_at: Dict[int, float] = {}
+    ack_ms: List[float] = []
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        async def post(i: int) -> None:
+            user_id = USER_ID_BASE + i
+            body = json.dumps(make_text_update(i + 1, user_id, args.text))
+            async with sem:
+                t0 = time.perf_counter()
+                sent_at[user_id] = t0
+                resp = await client.post(url, content=body, headers=headers)
+                ack_ms.append((time.perf_counter() - t0) * 1000)
+                resp.raise_for_status()
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(post(i) for i in range(args.updates)))
+        t_acked = time.perf_counter()
+
+    deadline = time.perf_counter() + args.reply_timeout
+    while len(first_reply) < len(sent_at) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+    e2e_ms = [(first_reply[uid] - t0) * 1000 for uid, t0 in sent_at.items() if uid in first_reply]
+    print(f"posted {args.updates} updates in {t_acked - t_start:.2f}s "
+          f"({args.updates / (t_acked - t_start):.1f} updates/s acked)")
+    report("ack", ack_ms)
+    report("e2e", e2e_ms)
+    if len(e2e_ms) < len(sent_at):
+        print(f"no reply for {len(sent_at) - len(e2e_ms)} updates within {args.reply_timeout}s")
+
+    await server.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--text", default="/help")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-host", default="127.0.0.1")
+    parser.add_argument("--webhook-port", type=int, default=8443)
+    parser.add_argument("--webhook-path", default="telegram")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    parser.add_argument("--no-wait", action="store_true", help="不等 setWebhook，直接开始发")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
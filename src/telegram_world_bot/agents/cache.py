@@ -0,0 +1,103 @@
+"""
+agent 结果缓存：在 AgentRegistry.register(agent, cache=CachePolicy(...)) 时套一层，默认不缓存。
+
+- key = agent 名 + 规范化后的 input（key_fields 指定只看哪些字段；默认整个 input 去掉 memory）
+- 每个 agent 自己的 TTL / LRU 上限
+- single-flight：同一个 key 正在算的时候，后来的请求直接等那一次的结果；那一次被取消时由等待者之一接着算
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+from src.telegram_world_bot.agents.base import BaseAgent
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl_s: float = 300
+    max_size: int = 1024
+    # 结果只依赖这些 input 字段；None 表示整个 input（除了 ignore_fields）
+    key_fields: Tuple[str, ...] | None = None
+    ignore_fields: Tuple[str, ...] = ("memory",)
+
+def canonical_key(name: str, input: Dict[str, Any], policy: CachePolicy) -> str:
+    if policy.key_fields is not None:
+        fields = {k: input.get(k) for k in policy.key_fields}
+    else:
+        fields = {k: v for k, v in input.items() if k not in policy.ignore_fields}
+    return name + ":" + json.dumps(fields, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+class CachedAgent(BaseAgent):
+    def __init__(self, agent: BaseAgent, policy: CachePolicy):
+        self.agent = agent
+        self.name = agent.name
+        self.policy = policy
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+
+    async def run(self, input: Dict[str, Any]) -> Dict[str, Any]:
+        key = canonical_key(self.name, input, self.policy)
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(result)
+                del self._entries[key]
+                self.expired += 1
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            # asyncio.wait 不会取消 inflight，只有自己被取消时才抛 CancelledError
+            await asyncio.wait((inflight,))
+            if not inflight.cancelled():
+                return dict(inflight.result())
+            # 被取消的是 leader（比如被审核拦下）：不跟着一起失败，回到开头重来，第一个回来的成为新 leader
+
+        self.misses += 1
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self.agent.run(input)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # 异常不缓存，只转给正在等这一次的请求
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self._entries[key] = (time.monotonic() + self.policy.ttl_s, result)
+        while len(self._entries) > self.policy.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        future.set_result(result)
+        return dict(result)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.policy.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
@@ -0,0 +1,197 @@
+"""
+按 token 预算组装 LLM 上下文：从最新的轮次往回填，填不下的旧轮次折叠进滚动摘要。
+消息既可以是 langchain 的 BaseMessage，也可以是 AgentMemory 里的 {"role", "content"} dict。
+
+摘要是增量维护的：每次只把新掉出窗口的那一段连同旧摘要交给 summarize 回调，
+结果落盘到会话日志旁边（N.summary.json），重启后按指纹找回折叠到哪一条。
+"""
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Awaitable, Callable, List, Sequence, Tuple
+
+MESSAGE_OVERHEAD_TOKENS = 4  # 每条消息的 role / 分隔符开销
+ANCHOR_MESSAGES = 4  # 摘要边界指纹取最后几条被折叠的消息，单条消息（"好的"之类）太容易重复
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+
+Summarize = Callable[[str, str], Awaitable[str]]  # (旧摘要, 新折叠的对话) -> 新摘要
+MakeMessage = Callable[[str, str], Any]  # (role, content) -> 消息对象
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """粗略估算：CJK 字符一个算一个 token，其余按 4 个字符一个 token。按文本缓存。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def role_of(msg: Any) -> str:
+    if isinstance(msg, dict):
+        return str(msg.get("role", ""))
+    return {"human": "user", "ai": "assistant"}.get(msg.type, msg.type)
+
+def content_of(msg: Any) -> str:
+    content = msg.get("content", "") if isinstance(msg, dict) else msg.content
+    return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+
+def message_tokens(msg: Any) -> int:
+    return count_tokens(content_of(msg)) + MESSAGE_OVERHEAD_TOKENS
+
+def total_tokens(messages: Sequence[Any]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+def fingerprint(messages: Sequence[Any]) -> str:
+    h = hashlib.sha1()
+    for msg in messages:
+        h.update(f"{role_of(msg)}\0{content_of(msg)}\0".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def _anchor_at(messages: Sequence[Any], upto: int) -> str:
+    return fingerprint(messages[max(1, upto - ANCHOR_MESSAGES):upto])
+
+def newest_within(messages: Sequence[Any], budget: int, by_turn: bool = True) -> int:
+    """
+    从最新往回累加，返回能放进 budget 的起始下标。
+    by_turn=True 时按整轮（user 开头）取舍，不会把一轮拆开；最新一轮超预算也照样保留。
+    """
+    used = 0
+    start = len(messages)
+    pending = 0
+    for i in range(len(messages) - 1, -1, -1):
+        pending += message_tokens(messages[i])
+        if by_turn and role_of(messages[i]) != "user" and i > 0:
+            continue
+        if used + pending > budget and start < len(messages):
+            break
+        used += pending
+        pending = 0
+        start = i
+    return start
+
+def _dict_message(role: str, content: str) -> dict:
+    return {"role": role, "content": content}
+
+@dataclass
+class RollingSummary:
+    text: str = ""
+    anchor: str = ""  # 最后几条被折叠的消息指纹
+    folded: int = 0  # 累计折叠了多少条消息（只用于展示）
+    upto: int = field(default=1, compare=False)  # 运行时：messages[1:upto] 已在摘要里，不落盘
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.text)
+
+    @classmethod
+    def load(cls, path: Path) -> "RollingSummary":
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+            return cls(text=raw.get("text", ""), anchor=raw.get("anchor", ""), folded=int(raw.get("folded", 0)))
+        except (FileNotFoundError, ValueError):
+            return cls()
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(
+            json.dumps({"text": self.text, "anchor": self.anchor, "folded": self.folded}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, path)
+
+    def resolve(self, messages: Sequence[Any]) -> None:
+        """
+        按 anchor 在 messages 里找回折叠边界。找不到说明边界在已加载的消息之前
+        （比如续聊时只读了日志尾部），那就认为摘要覆盖了加载范围之前的全部内容。
+        有多处匹配时取最早的：宁可重复摘要几轮，也不要漏掉没摘要过的内容。
+        """
+        self.upto = 1
+        if not self.anchor:
+            return
+        for upto in range(2, len(messages) + 1):
+            if _anchor_at(messages, upto) == self.anchor:
+                self.upto = upto
+                return
+
+    def valid_for(self, messages: Sequence[Any]) -> bool:
+        """消息被撤回 / 改写到摘要边界之内时，摘要就作废了。"""
+        if self.upto <= 1:
+            return True
+        return len(messages) >= self.upto and _anchor_at(messages, self.upto) == self.anchor
+
+@dataclass
+class ContextWindow:
+    messages: List[Any]
+    prompt_tokens: int
+    full_tokens: int  # 不裁剪、不摘要时要发的 token 数
+    unsummarized: int  # 掉出窗口但还没折叠进摘要的消息数
+
+    @property
+    def needs_fold(self) -> bool:
+        return self.unsummarized > 0
+
+class ContextBuilder:
+    """
+    messages[0] 必须是 system。窗口 = system + 摘要 + 从最新往回能放下的整轮。
+    折叠时只保留 keep_ratio * 预算 的最新轮次，其余进摘要：这样不会每一轮都去调一次 summarize。
+    """
+    def __init__(
+        self,
+        budget_tokens: int = 6000,
+        keep_ratio: float = 0.5,
+        make_message: MakeMessage = _dict_message,
+        summary_prefix: str = "以下是更早对话的摘要：\n",
+    ):
+        self.budget_tokens = budget_tokens
+        self.keep_ratio = keep_ratio
+        self.make_message = make_message
+        self.summary_prefix = summary_prefix
+
+    def _available(self, messages: Sequence[Any], summary: RollingSummary) -> int:
+        used = message_tokens(messages[0])
+        if summary.text:
+            used += count_tokens(self.summary_prefix + summary.text) + MESSAGE_OVERHEAD_TOKENS
+        return max(0, self.budget_tokens - used)
+
+    def build(self, messages: Sequence[Any], summary: RollingSummary) -> ContextWindow:
+        system = messages[0]
+        rest = list(messages[summary.upto:])
+        start = newest_within(rest, self._available(messages, summary))
+
+        prompt: List[Any] = [system]
+        if summary.text:
+            prompt.append(self.make_message("system", self.summary_prefix + summary.text))
+        prompt.extend(rest[start:])
+        return ContextWindow(
+            messages=prompt,
+            prompt_tokens=total_tokens(prompt),
+            full_tokens=total_tokens(messages),
+            unsummarized=start,
+        )
+
+    def fold_plan(self, messages: Sequence[Any], summary: RollingSummary) -> Tuple[List[Any], int]:
+        """返回 (这次要折叠的消息, 折叠后的 upto)。"""
+        rest = list(messages[summary.upto:])
+        keep = newest_within(rest, int(self._available(messages, summary) * self.keep_ratio))
+        return rest[:keep], summary.upto + keep
+
+    async def fold(self, messages: Sequence[Any], summary: RollingSummary, summarize: Summarize) -> RollingSummary:
+        """把掉出窗口的消息增量折叠进摘要；返回新的 RollingSummary（不改传入的那个）。"""
+        to_fold, upto = self.fold_plan(messages, summary)
+        if not to_fold:
+            return summary
+        transcript = "\n".join(f"{role_of(m)}: {content_of(m)}" for m in to_fold)
+        text = await summarize(summary.text, transcript)
+        return RollingSummary(
+            text=text.strip(),
+            anchor=_anchor_at(messages, upto),
+            folded=summary.folded + len(to_fold),
+            upto=upto,
+        )
+
+def summary_path(log_fp: Path) -> Path:
+    """N.jsonl -> N.summary.json"""
+    return log_fp.with_suffix(".summary.json")
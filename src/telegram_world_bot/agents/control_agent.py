@@ -9,4 +9,9 @@ class ControlAgent(BaseAgent):
 
     async def run(self, input: Dict[str, Any]) -> Dict[str, Any]:
         user_message = safe_trim(str(input.get("user_message", "")))
-        return {"reply": f"[control agent stub]\nyou said: {user_message}", "confidence": 0.5}
+        # memory 由调用方注入（services.memory_store），agent 只读不写
+        memory = input.get("memory") or []
+        return {
+            "reply": f"[control agent stub]\nhistory={len(memory)}\nyou said: {user_message}",
+            "confidence": 0.5,
+        }
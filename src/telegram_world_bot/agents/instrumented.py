@@ -0,0 +1,42 @@
+"""
+AgentRegistry 注册时自动套的计时层：bot_agent_run_duration_seconds{agent}。
+套在结果缓存里面，只统计真正跑了 agent 的那些（缓存命中看 bot_agent_cache_*）。
+"""
+import asyncio
+import time
+from typing import Any, Dict
+
+from src.telegram_world_bot import metrics
+from src.telegram_world_bot.agents.base import BaseAgent
+
+AGENT_SECONDS = metrics.histogram("bot_agent_run_duration_seconds", "Agent run latency", ("agent",))
+AGENT_ERRORS = metrics.counter("bot_agent_errors_total", "Agent runs that raised", ("agent",))
+AGENT_CANCELLED = metrics.counter("bot_agent_cancelled_total", "Agent runs cancelled (e.g. blocked by moderation)", ("agent",))
+
+class InstrumentedAgent(BaseAgent):
+    def __init__(self, agent: BaseAgent):
+        self.agent = agent
+        self.name = agent.name
+        self._seconds = AGENT_SECONDS.labels(agent.name)
+        self._errors = AGENT_ERRORS.labels(agent.name)
+        self._cancelled = AGENT_CANCELLED.labels(agent.name)
+
+    async def run(self, input: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        try:
+            result = await self.agent.run(input)
+        except asyncio.CancelledError:
+            self._cancelled.inc()
+            raise
+        except Exception:
+            self._errors.inc()
+            self._seconds.observe(time.perf_counter() - t0)
+            raise
+        self._seconds.observe(time.perf_counter() - t0)
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        # 其余属性（matcher、stats 等）原样转给被包的 agent
+        if name == "agent":
+            raise AttributeError(name)
+        return getattr(self.agent, name)
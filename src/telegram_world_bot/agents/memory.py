@@ -1,18 +1,39 @@
 # 作者：Alex
 # 2026/1/28 17:06
 """
-Agent memory 的占位实现。
-你以后可以替换成：SQLite / Redis / 向量库 / LangChain memory。
+Agent memory：单个 user / chat 的最近若干条对话，定长环形缓冲。
+按用户取、持久化、空闲淘汰由 services.memory_store.MemoryStore 负责；
+agent 自己不持有 memory，由调用方通过 input["memory"] 传进去。
 """
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Any, Dict, List
+from typing import Any, Deque, Dict, Iterable, List
+
+from src.telegram_world_bot.agents.context import newest_within
 
 @dataclass
 class AgentMemory:
-    history: List[Dict[str, Any]] = field(default_factory=list)
+    capacity: int = 50
+    history: Deque[Dict[str, Any]] = field(default_factory=deque)
+
+    def __post_init__(self):
+        self.history = deque(self.history, maxlen=self.capacity)
 
     def add(self, role: str, content: str) -> None:
         self.history.append({"role": role, "content": content})
 
+    def extend(self, items: Iterable[Dict[str, Any]]) -> None:
+        self.history.extend(items)
+
     def last_n(self, n: int = 10) -> List[Dict[str, Any]]:
-        return self.history[-n:]
+        if n <= 0:
+            return []
+        return list(self.history)[-n:]
+
+    def last_tokens(self, budget: int) -> List[Dict[str, Any]]:
+        """按 token 预算从最新往回取（至少保留最新一条）。"""
+        items = list(self.history)
+        return items[newest_within(items, budget, by_turn=False):]
+
+    def __len__(self) -> int:
+        return len(self.history)
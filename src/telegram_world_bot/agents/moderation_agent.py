@@ -2,14 +2,20 @@
 # 2026/1/28 17:07
 from typing import Any, Dict
 from src.telegram_world_bot.agents.base import BaseAgent
+from src.telegram_world_bot.agents.wordfilter import HotReloadMatcher
 
 class ModerationAgent(BaseAgent):
     name = "moderation"
 
+    def __init__(self, wordlist_path: str = "data/moderation_words.txt", reload_interval_s: float = 5.0):
+        # 敏感词表：一行一个词，改了文件会自动重新加载（见 agents/wordfilter.py）。
+        # 构造时同步建整个自动机（10 万词要几百 ms）：只通过 AgentRegistry.aget() / warm_up() 在线程里构造，
+        # 不要在 event loop 上直接 new
+        self.matcher = HotReloadMatcher(wordlist_path, check_interval_s=reload_interval_s)
+
     async def run(self, input: Dict[str, Any]) -> Dict[str, Any]:
-        # 这里只做占位：你以后可加敏感词/策略模型/第三方审核
         text = str(input.get("text", ""))
-        blocked = False
-        reason = None
-
-        return {"blocked": blocked, "reason": reason}
+        match = self.matcher.current().first(text)
+        if match is None:
+            return {"blocked": False, "reason": None}
+        return {"blocked": True, "reason": f"keyword:{match.word}", "span": (match.start, match.end)}
@@ -11,6 +11,9 @@ class OnboardingAgent(BaseAgent):
         # 这是一个 stub：后面你接 LangChain / LLM 的时候替换这里
         user_message = safe_trim(str(input.get("user_message", "")))
         mode = str(input.get("mode", ""))
+        # memory 由调用方注入（services.memory_store），agent 只读不写。
+        # stub 的回复只取决于 mode / user_message，build_app 里据此按这两个字段缓存；
+        # 以后回复要用到 memory 的话，记得把缓存的 key_fields 一起改掉。
         reply = f"[onboarding agent stub]\nmode={mode}\nyou said: {user_message}"
 
         return {"reply": reply, "confidence": 0.5}
@@ -0,0 +1,128 @@
+"""
+agent 流水线：审核（moderation）和回复（reply agent）并发跑，关键路径 ≈ max(两者) 而不是相加。
+
+- 审核拦截：取消还在跑的回复；回复已经算完的也直接丢掉，不会发出去
+- 每个阶段有自己的超时和兜底结果；审核超时默认放行（fail_closed=True 则按拦截处理）
+- 记录每个阶段和整条流水线的延迟
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from src.telegram_world_bot.agents.registry import AgentRegistry
+from src.telegram_world_bot.metrics import LatencyStats
+
+MODERATION_FALLBACK: Dict[str, Any] = {"blocked": False, "reason": None}
+REPLY_FALLBACK: Dict[str, Any] = {"reply": "(暂时无法回复，请稍后再试)"}
+
+@dataclass(frozen=True)
+class Stage:
+    agent: str
+    timeout_s: float
+    fallback: Dict[str, Any]
+
+@dataclass
+class PipelineResult:
+    blocked: bool
+    reason: Optional[str]
+    reply: Optional[str]
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    fallbacks: tuple = ()  # 用了兜底结果的阶段
+
+class AgentPipeline:
+    def __init__(
+        self,
+        registry: AgentRegistry,
+        moderation: Stage = Stage("moderation", 0.5, MODERATION_FALLBACK),
+        reply: Stage = Stage("control", 15.0, REPLY_FALLBACK),
+        fail_closed: bool = False,
+    ):
+        self._registry = registry
+        self.moderation = moderation
+        self.reply = reply
+        self.fail_closed = fail_closed
+        self._latency: Dict[str, LatencyStats] = {
+            "moderation": LatencyStats(),
+            "reply": LatencyStats(),
+            "total": LatencyStats(),
+        }
+        self.blocked = 0
+        self.suppressed = 0  # 审核拦截时回复已经生成完、被丢掉的次数
+        self.timeouts: Dict[str, int] = {"moderation": 0, "reply": 0}
+        self.errors: Dict[str, int] = {"moderation": 0, "reply": 0}
+
+    async def _run_stage(self, key: str, stage: Stage, input: Dict[str, Any]) -> tuple[Dict[str, Any], bool, float]:
+        """返回 (结果, 是否用了兜底, 耗时 ms)。被取消的阶段不计入延迟统计。"""
+        t0 = time.perf_counter()
+        fallback = False
+        try:
+            agent = await self._registry.aget(stage.agent)
+            result = await asyncio.wait_for(agent.run(input), timeout=stage.timeout_s)
+        except asyncio.TimeoutError:
+            self.timeouts[key] += 1
+            result, fallback = dict(stage.fallback), True
+        except Exception:
+            self.errors[key] += 1
+            result, fallback = dict(stage.fallback), True
+        ms = (time.perf_counter() - t0) * 1000
+        self._latency[key].add(ms)
+        return result, fallback, ms
+
+    async def run(self, input: Dict[str, Any]) -> PipelineResult:
+        """input 原样交给回复 agent；审核 agent 拿到 {"text": input["user_message"]}。"""
+        t0 = time.perf_counter()
+        text = str(input.get("user_message", ""))
+        mod_task = asyncio.create_task(self._run_stage("moderation", self.moderation, {"text": text}))
+        reply_task = asyncio.create_task(self._run_stage("reply", self.reply, input))
+        fallbacks = []
+        timings: Dict[str, float] = {}
+        try:
+            verdict, mod_fallback, timings["moderation"] = await mod_task
+            if mod_fallback:
+                fallbacks.append("moderation")
+                if self.fail_closed:
+                    verdict = {"blocked": True, "reason": "moderation_unavailable"}
+
+            if verdict.get("blocked"):
+                self.blocked += 1
+                if reply_task.done() and not reply_task.cancelled():
+                    self.suppressed += 1
+                reply_task.cancel()
+                return PipelineResult(
+                    blocked=True,
+                    reason=verdict.get("reason"),
+                    reply=None,
+                    timings_ms=self._timings(t0, timings),
+                    fallbacks=tuple(fallbacks),
+                )
+
+            result, reply_fallback, timings["reply"] = await reply_task
+            if reply_fallback:
+                fallbacks.append("reply")
+            return PipelineResult(
+                blocked=False,
+                reason=None,
+                reply=result.get("reply"),
+                timings_ms=self._timings(t0, timings),
+                fallbacks=tuple(fallbacks),
+            )
+        finally:
+            # 调用方被取消时别留下孤儿 task
+            for task in (mod_task, reply_task):
+                if not task.done():
+                    task.cancel()
+
+    def _timings(self, t0: float, timings: Dict[str, float]) -> Dict[str, float]:
+        timings["total"] = (time.perf_counter() - t0) * 1000
+        self._latency["total"].add(timings["total"])
+        return {k: round(v, 3) for k, v in timings.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "latency": {k: v.snapshot() for k, v in self._latency.items()},
+            "blocked": self.blocked,
+            "suppressed": self.suppressed,
+            "timeouts": dict(self.timeouts),
+            "errors": dict(self.errors),
+        }
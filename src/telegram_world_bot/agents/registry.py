@@ -1,16 +1,149 @@
 # 作者：Alex
 # 2026/1/28 17:06
-from typing import Dict
+import asyncio
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, Iterable, List
+
 from src.telegram_world_bot.agents.base import BaseAgent
+from src.telegram_world_bot.agents.cache import CachedAgent, CachePolicy
+from src.telegram_world_bot.agents.instrumented import InstrumentedAgent
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "telegram_world_bot.agents"
+
+@dataclass
+class _LazyAgent:
+    source: str  # "pkg.module:Name" / "entry_point:name"
+    factory: Callable[[], Any]
+    cache: CachePolicy | None = None
+    import_ms: float = 0.0
+    init_ms: float = 0.0
+
+def _import_target(path: str) -> Callable[[], Any]:
+    module_name, _, attr = path.partition(":")
+    if not attr:
+        raise ValueError(f"Agent path must look like 'package.module:Name': {path}")
+    return getattr(importlib.import_module(module_name), attr)
 
 class AgentRegistry:
+    """
+    register()：直接给实例。
+    register_lazy()：给 import 路径 / entry point 名 / 工厂函数，第一次 get() 时才 import + 构造，
+    启动时不用为这一次进程可能根本用不到的 agent（以及它拖进来的 LangChain / xAI client）付 import 时间。
+    event loop 上一律用 aget()：加载在线程里做，和 warm_up 正在进行的加载合并，不会卡住 loop。
+    """
     def __init__(self):
         self._agents: Dict[str, BaseAgent] = {}
+        self._lazy: Dict[str, _LazyAgent] = {}
+        self._lock = threading.Lock()  # 线程里的加载和同步 get() 互斥
+        self._loading: Dict[str, asyncio.Future] = {}  # 正在线程里加载的 agent
 
-    def register(self, agent: BaseAgent) -> None:
+    def register(self, agent: BaseAgent, cache: CachePolicy | None = None) -> None:
+        # 计时层套在里面（见 agents/instrumented.py）；cache 不为空时外面再套一层结果缓存（见 agents/cache.py）
+        if not isinstance(agent, InstrumentedAgent):
+            agent = InstrumentedAgent(agent)
+        if cache is not None:
+            agent = CachedAgent(agent, cache)
         self._agents[agent.name] = agent
 
+    def register_lazy(self, name: str, target: str | Callable[[], BaseAgent], cache: CachePolicy | None = None) -> None:
+        """
+        target："package.module:ClassOrFactory"、"entry_point:<name>"（ENTRY_POINT_GROUP 组）或者一个无参工厂。
+        """
+        if callable(target):
+            source = getattr(target, "__qualname__", repr(target))
+            self._lazy[name] = _LazyAgent(source=source, factory=lambda: target, cache=cache)
+        elif target.startswith("entry_point:"):
+            ep_name = target.split(":", 1)[1]
+            self._lazy[name] = _LazyAgent(source=target, factory=lambda: self._load_entry_point(ep_name), cache=cache)
+        else:
+            self._lazy[name] = _LazyAgent(source=target, factory=lambda: _import_target(target), cache=cache)
+
+    def discover_entry_points(self, group: str = ENTRY_POINT_GROUP) -> List[str]:
+        """把已安装的插件包声明的 agent 全部登记成 lazy（只读元数据，不 import）。"""
+        found = []
+        for ep in entry_points(group=group):
+            if ep.name not in self._agents and ep.name not in self._lazy:
+                self._lazy[ep.name] = _LazyAgent(source=f"entry_point:{ep.name}", factory=ep.load)
+                found.append(ep.name)
+        return found
+
+    @staticmethod
+    def _load_entry_point(name: str) -> Callable[[], Any]:
+        for ep in entry_points(group=ENTRY_POINT_GROUP, name=name):
+            return ep.load()
+        raise KeyError(f"Agent entry point not found: {name}")
+
     def get(self, name: str) -> BaseAgent:
-        if name not in self._agents:
+        """同步版本：没加载过的 lazy agent 会在当前线程里 import + 构造。event loop 上用 aget()。"""
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in self._lazy:
             raise KeyError(f"Agent not found: {name}")
-        return self._agents[name]
+        return self._load(name)
+
+    async def aget(self, name: str) -> BaseAgent:
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in self._lazy:
+            raise KeyError(f"Agent not found: {name}")
+        loading = self._loading.get(name)
+        if loading is None:
+            loading = self._loading[name] = asyncio.ensure_future(asyncio.to_thread(self._load, name))
+            loading.add_done_callback(lambda _: self._loading.pop(name, None))
+        # shield：调用方被取消（比如阶段超时）不影响加载本身，下一次直接拿到结果
+        return await asyncio.shield(loading)
+
+    def _load(self, name: str) -> BaseAgent:
+        with self._lock:
+            if name in self._agents:
+                return self._agents[name]
+            lazy = self._lazy[name]
+            t0 = time.perf_counter()
+            factory = lazy.factory()
+            t1 = time.perf_counter()
+            agent = factory()
+            t2 = time.perf_counter()
+            lazy.import_ms = (t1 - t0) * 1000
+            lazy.init_ms = (t2 - t1) * 1000
+            if agent.name != name:
+                raise ValueError(f"Agent registered as {name!r} but its name is {agent.name!r}")
+            self.register(agent, cache=lazy.cache)
+            logger.info("agent %s loaded from %s (import %.1fms, init %.1fms)", name, lazy.source, lazy.import_ms, lazy.init_ms)
+            return self._agents[name]
+
+    async def warm_up(self, names: Iterable[str] | None = None) -> None:
+        """后台把还没加载的 lazy agent 提前加载好（在线程里 import，不挡 event loop）。"""
+        for name in list(names if names is not None else self._lazy):
+            if name in self._agents:
+                continue
+            try:
+                await self.aget(name)
+            except Exception:
+                logger.exception("agent %s warm-up failed", name)
+
+    def names(self) -> List[str]:
+        return sorted(set(self._agents) | set(self._lazy))
+
+    def load_report(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": name,
+                "source": lazy.source,
+                "loaded": name in self._agents,
+                "import_ms": round(lazy.import_ms, 2),
+                "init_ms": round(lazy.init_ms, 2),
+            }
+            for name, lazy in sorted(self._lazy.items())
+        ]
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: a.stats() for name, a in self._agents.items() if isinstance(a, CachedAgent)}
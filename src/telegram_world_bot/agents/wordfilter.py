@@ -0,0 +1,221 @@
+"""
+敏感词匹配：Aho–Corasick 多模式匹配，每条消息只扫一遍（线性时间），和词表大小无关。
+
+匹配前先做归一化（词表和消息用同一套）：
+- NFKC：全角字母数字 / 兼容字符 → 半角；再 casefold
+- 繁体 → 简体（内置常用字对照表，可以用 extra_variants 补充）
+- 去掉分隔符（空白、标点、符号、控制字符），"敏-感 词" 和 "敏感词" 一样
+归一化时记下每个字符在原文里的位置，命中结果返回原文区间。
+
+词表文件一行一个词，# 开头是注释；HotReloadMatcher 发现文件变了就在后台线程里重建，重建期间继续用旧的。
+"""
+import logging
+import threading
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 常用繁简对照（只收敏感词里常见的字，够用为主）；更多对照用 extra_variants 传进来
+_TRAD = (
+    "國說話們會來時點這個對開關與為產業東車長門問題見現電動學體係經過還進運發後記議讓認變實氣際區錢連選擇聽買賣處導彈槍殺黨獨"
+    "騙賭麗愛戀禮懷滅戰鬥軍員錄網頁號碼幣額銀貸詐藥療醫詞語論讀書圖傳權歲紅藍綠黃舊義習訊視頻覺麼嗎機幹約劃態極專屬華陸灣衛濟"
+    "歡樂聯絡證據稅錯較廣場臺鐵飛裝術訴訪談請誰賺騷屍腦臉癮"
+)
+_SIMP = (
+    "国说话们会来时点这个对开关与为产业东车长门问题见现电动学体系经过还进运发后记议让认变实气际区钱连选择听买卖处导弹枪杀党独"
+    "骗赌丽爱恋礼怀灭战斗军员录网页号码币额银贷诈药疗医词语论读书图传权岁红蓝绿黄旧义习讯视频觉么吗机干约划态极专属华陆湾卫济"
+    "欢乐联络证据税错较广场台铁飞装术诉访谈请谁赚骚尸脑脸瘾"
+)
+TRAD_TO_SIMP: Dict[str, str] = dict(zip(_TRAD, _SIMP))
+
+def _is_separator(ch: str) -> bool:
+    cat = unicodedata.category(ch)
+    return cat[0] in "PZSC"
+
+class Normalizer:
+    def __init__(self, extra_variants: Optional[Dict[str, str]] = None):
+        self.variants = dict(TRAD_TO_SIMP)
+        if extra_variants:
+            self.variants.update(extra_variants)
+        self._cache: Dict[str, str] = {}  # 单字符 -> 归一化结果（分隔符映射成空串）
+
+    def _char(self, c: str) -> str:
+        out = self._cache.get(c)
+        if out is None:
+            parts = []
+            for ch in unicodedata.normalize("NFKC", c).casefold():
+                ch = self.variants.get(ch, ch)
+                if not _is_separator(ch):
+                    parts.append(ch)
+            out = self._cache[c] = "".join(parts)
+        return out
+
+    def normalize(self, text: str) -> Tuple[str, List[int]]:
+        """返回 (归一化文本, 每个归一化字符对应的原文下标)。"""
+        chars: List[str] = []
+        positions: List[int] = []
+        for i, c in enumerate(text):
+            n = self._char(c)
+            if n:
+                chars.append(n)
+                positions.extend([i] * len(n))
+        return "".join(chars), positions
+
+    def normalize_word(self, word: str) -> str:
+        return self.normalize(word)[0]
+
+@dataclass(frozen=True)
+class Match:
+    word: str  # 词表里的原词
+    start: int  # 原文区间 [start, end)
+    end: int
+
+class KeywordMatcher:
+    def __init__(self, words: Iterable[str], normalizer: Optional[Normalizer] = None):
+        self.normalizer = normalizer or Normalizer()
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[int] = [-1]  # 在这个节点结束的词
+        self._out_link: List[int] = [0]  # 沿 fail 链下一个有输出的节点
+        self._words: List[str] = []
+        self._lengths: List[int] = []
+
+        seen = set()
+        for word in words:
+            norm = self.normalizer.normalize_word(word)
+            if not norm or norm in seen:
+                continue
+            seen.add(norm)
+            self._insert(norm, word)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @property
+    def node_count(self) -> int:
+        return len(self._goto)
+
+    def _insert(self, norm: str, word: str) -> None:
+        state = 0
+        for ch in norm:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(-1)
+                self._out_link.append(0)
+            state = nxt
+        self._out[state] = len(self._words)
+        self._words.append(word)
+        self._lengths.append(len(norm))
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fail = self._goto[f].get(ch, 0)
+                self._fail[nxt] = fail if fail != nxt else 0
+                self._out_link[nxt] = fail if self._out[fail] >= 0 else self._out_link[fail]
+
+    def _scan(self, norm: str, first_only: bool):
+        goto, fail, out, out_link = self._goto, self._fail, self._out, self._out_link
+        state = 0
+        for i, ch in enumerate(norm):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            node = state if out[state] >= 0 else out_link[state]
+            while node:
+                yield i, out[node]
+                if first_only:
+                    return
+                node = out_link[node]
+
+    def search(self, text: str) -> List[Match]:
+        norm, positions = self.normalizer.normalize(text)
+        return [self._match(end, idx, positions) for end, idx in self._scan(norm, first_only=False)]
+
+    def first(self, text: str) -> Optional[Match]:
+        if not self._words:
+            return None
+        norm, positions = self.normalizer.normalize(text)
+        for end, idx in self._scan(norm, first_only=True):
+            return self._match(end, idx, positions)
+        return None
+
+    def _match(self, end: int, idx: int, positions: List[int]) -> Match:
+        start = end - self._lengths[idx] + 1
+        return Match(word=self._words[idx], start=positions[start], end=positions[end] + 1)
+
+def load_wordlist(path: Path) -> List[str]:
+    words = []
+    with path.open("r", encoding="utf-8") as f:
+        for raw in f:
+            raw = raw.strip()
+            if raw and not raw.startswith("#"):
+                words.append(raw)
+    return words
+
+class HotReloadMatcher:
+    """
+    current() 每 check_interval_s 最多 stat 一次词表文件；mtime / size 变了就在后台线程重建，
+    建好之后整体替换引用。文件不存在时是空词表（什么都不拦）。
+    """
+    def __init__(self, path: str | Path, check_interval_s: float = 5.0, normalizer: Optional[Normalizer] = None):
+        self.path = Path(path)
+        self.check_interval_s = check_interval_s
+        self.normalizer = normalizer or Normalizer()
+        self._matcher = KeywordMatcher((), self.normalizer)
+        self._signature: Tuple[int, int] | None = None
+        self._last_check = 0.0
+        self._reloading: threading.Thread | None = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.reload_now()
+
+    def _file_signature(self) -> Tuple[int, int] | None:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload_now(self) -> None:
+        signature = self._file_signature()
+        try:
+            words = load_wordlist(self.path) if signature is not None else []
+            t0 = time.perf_counter()
+            matcher = KeywordMatcher(words, self.normalizer)
+        except Exception:
+            self.reload_errors += 1
+            logger.exception("moderation wordlist reload failed: %s", self.path)
+            return
+        self._matcher = matcher
+        self._signature = signature
+        self.reloads += 1
+        logger.info(
+            "moderation wordlist loaded: %d words, %d nodes in %.0fms",
+            len(matcher), matcher.node_count, (time.perf_counter() - t0) * 1000,
+        )
+
+    def current(self) -> KeywordMatcher:
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval_s:
+            self._last_check = now
+            if self._file_signature() != self._signature and (self._reloading is None or not self._reloading.is_alive()):
+                self._reloading = threading.Thread(target=self.reload_now, name="wordlist_reload", daemon=True)
+                self._reloading.start()
+        return self._matcher
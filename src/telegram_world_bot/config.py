@@ -4,8 +4,6 @@ from dataclasses import dataclass
 import os
 from dotenv import load_dotenv
 
-load_dotenv()
-
 @dataclass(frozen=True)
 class DBConfig:
     host: str
@@ -23,14 +21,164 @@ class DBConfig:
             f"?charset={self.charset}"
         )
 
+    def sqlalchemy_async_url(self) -> str:
+        # aiomysql driver（给 AsyncMySQLDAO 用）
+        return (
+            f"mysql+aiomysql://{self.user}:{self.password}"
+            f"@{self.host}:{self.port}/{self.name}"
+            f"?charset={self.charset}"
+        )
+
+@dataclass(frozen=True)
+class EventSinkConfig:
+    max_queue: int = 10000
+    batch_size: int = 200
+    flush_interval_ms: int = 1000
+    overflow: str = "block"  # block / drop_oldest / spill
+    spill_path: str = "data/event_spill.jsonl"
+
+@dataclass(frozen=True)
+class IdempotencyConfig:
+    cache_size: int = 100_000
+    default_ttl_s: int = 7 * 24 * 3600
+    # ("onboarding_submit:*", 秒数)，按最长前缀匹配
+    prefix_ttls: tuple[tuple[str, int], ...] = ()
+    sweep_interval_s: int = 60
+    sweep_batch: int = 1000
+    sweep_max_batches: int = 10
+
+@dataclass(frozen=True)
+class UserStoreConfig:
+    path: str = "data/users.json"
+    journal: bool = False
+    group_commit_ms: int = 0
+    compact_threshold: int = 10000
+
+@dataclass(frozen=True)
+class SessionStoreConfig:
+    max_sessions: int = 100_000
+    idle_ttl_s: int = 3600
+    sweep_interval_s: int = 60
+
+@dataclass(frozen=True)
+class AgentMemoryConfig:
+    capacity: int = 50  # 每个 user/agent 在内存里保留的条数
+    max_scopes: int = 50_000
+    idle_ttl_s: int = 1800
+    flush_interval_ms: int = 1000
+    flush_batch: int = 200
+    sweep_interval_s: int = 60
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    reply_agent: str = "control"
+    moderation_timeout_s: float = 0.5
+    reply_timeout_s: float = 15.0
+    # 审核超时 / 出错时：False 放行，True 按拦截处理
+    fail_closed: bool = False
+    # 流程外的普通文字是否交给 reply agent 回复；默认关闭，只有 /start 等命令
+    chat_enabled: bool = False
+
+@dataclass(frozen=True)
+class ModerationConfig:
+    wordlist_path: str = "data/moderation_words.txt"
+    reload_interval_s: float = 5.0
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    enabled: bool = True
+    global_per_s: float = 30
+    private_per_s: float = 1
+    group_per_min: float = 20
+    max_retries: int = 3  # 429 之后最多重试几次
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    enabled: bool = True  # 只控制 /metrics 端口；指标本身一直在采集
+    host: str = "127.0.0.1"
+    port: int = 9464
+
+@dataclass(frozen=True)
+class ProfilingConfig:
+    interval_ms: float = 5  # /profile 的采样间隔
+    max_seconds: int = 60
+    top_n: int = 30
+    slow_update_ms: int = 0  # >0 时单个 update 超过这么久就把栈打到日志；0 关闭
+
+@dataclass(frozen=True)
+class RecorderConfig:
+    enabled: bool = False  # 录制脱敏后的 update，给 scripts.replay_updates 回放
+    path: str = "data/updates.jsonl.gz"
+    salt: str = ""  # 为空时每次启动随机
+
+@dataclass(frozen=True)
+class WebhookConfig:
+    url: str = ""  # 对外地址，例如 https://bot.example.com；为空则用 polling
+    listen: str = "0.0.0.0"
+    port: int = 8443
+    path: str = "telegram"
+    secret_token: str = ""
+    max_connections: int = 40
+
+    def full_url(self) -> str:
+        return f"{self.url.rstrip('/')}/{self.path.lstrip('/')}"
+
 @dataclass(frozen=True)
 class Settings:
     bot_token: str
     env: str = "dev"
     log_level: str = "INFO"
     db: DBConfig | None = None
+    events: EventSinkConfig = EventSinkConfig()
+    idempotency: IdempotencyConfig = IdempotencyConfig()
+    user_store: UserStoreConfig = UserStoreConfig()
+    sessions: SessionStoreConfig = SessionStoreConfig()
+    agent_memory: AgentMemoryConfig = AgentMemoryConfig()
+    pipeline: PipelineConfig = PipelineConfig()
+    moderation: ModerationConfig = ModerationConfig()
+    rate_limit: RateLimitConfig = RateLimitConfig()
+    metrics: MetricsConfig = MetricsConfig()
+    profiling: ProfilingConfig = ProfilingConfig()
+    recorder: RecorderConfig = RecorderConfig()
+    webhook: WebhookConfig = WebhookConfig()
+    # 能用 /profile 等管理命令的 Telegram user_id
+    admin_user_ids: tuple[int, ...] = ()
+    # >1 时不同用户的 update 并发处理，同一用户仍严格串行
+    concurrent_updates: int = 1
+    max_pending_updates: int = 10_000
+    # 自建 Bot API server / 本地压测用的假 API；为空走官方 api.telegram.org
+    bot_api_base_url: str = ""
+    # 启动后在后台预加载 lazy agent；关掉则第一次用到时才加载
+    agents_warmup: bool = True
+
+def _parse_prefix_ttls(raw: str) -> tuple[tuple[str, int], ...]:
+    # IDEM_PREFIX_TTLS="onboarding_submit:*=604800,ping:*=60"
+    out = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        prefix, _, ttl = item.rpartition("=")
+        if not prefix or not ttl.strip().isdigit():
+            raise RuntimeError(f"Invalid IDEM_PREFIX_TTLS entry: {item}")
+        out.append((prefix.strip(), int(ttl)))
+    return tuple(out)
+
+def _parse_ids(raw: str, name: str) -> tuple[int, ...]:
+    # ADMIN_USER_IDS="123,456"
+    out = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if not item.lstrip("-").isdigit():
+            raise RuntimeError(f"Invalid {name} entry: {item}")
+        out.append(int(item))
+    return tuple(out)
 
 def load_settings() -> Settings:
+    # 放在这里而不是 import 时：只 import config 里的 dataclass 不会去读 .env
+    load_dotenv()
     token = os.getenv("BOT_TOKEN", "").strip()
     if not token:
         raise RuntimeError("Missing BOT_TOKEN in .env")
@@ -55,9 +203,116 @@ def load_settings() -> Settings:
     if not db.user or not db.name:
         raise RuntimeError("Missing DB_USER or DB_NAME in .env")
 
+    events = EventSinkConfig(
+        max_queue=int(os.getenv("EVENT_QUEUE_MAX", "10000")),
+        batch_size=int(os.getenv("EVENT_BATCH_SIZE", "200")),
+        flush_interval_ms=int(os.getenv("EVENT_FLUSH_INTERVAL_MS", "1000")),
+        overflow=os.getenv("EVENT_OVERFLOW", "block").strip().lower(),
+        spill_path=os.getenv("EVENT_SPILL_PATH", "data/event_spill.jsonl").strip(),
+    )
+    if events.overflow not in ("block", "drop_oldest", "spill"):
+        raise RuntimeError("EVENT_OVERFLOW must be one of: block / drop_oldest / spill")
+
+    idempotency = IdempotencyConfig(
+        cache_size=int(os.getenv("IDEM_CACHE_SIZE", "100000")),
+        default_ttl_s=int(os.getenv("IDEM_DEFAULT_TTL_S", str(7 * 24 * 3600))),
+        prefix_ttls=_parse_prefix_ttls(os.getenv("IDEM_PREFIX_TTLS", "")),
+        sweep_interval_s=int(os.getenv("IDEM_SWEEP_INTERVAL_S", "60")),
+        sweep_batch=int(os.getenv("IDEM_SWEEP_BATCH", "1000")),
+        sweep_max_batches=int(os.getenv("IDEM_SWEEP_MAX_BATCHES", "10")),
+    )
+
+    user_store = UserStoreConfig(
+        path=os.getenv("USER_STORE_PATH", "data/users.json").strip(),
+        journal=os.getenv("USER_STORE_JOURNAL", "0").strip().lower() in ("1", "true", "yes"),
+        group_commit_ms=int(os.getenv("USER_STORE_GROUP_COMMIT_MS", "0")),
+        compact_threshold=int(os.getenv("USER_STORE_COMPACT_THRESHOLD", "10000")),
+    )
+
+    sessions = SessionStoreConfig(
+        max_sessions=int(os.getenv("SESSION_MAX", "100000")),
+        idle_ttl_s=int(os.getenv("SESSION_IDLE_TTL_S", "3600")),
+        sweep_interval_s=int(os.getenv("SESSION_SWEEP_INTERVAL_S", "60")),
+    )
+
+    agent_memory = AgentMemoryConfig(
+        capacity=int(os.getenv("AGENT_MEMORY_CAPACITY", "50")),
+        max_scopes=int(os.getenv("AGENT_MEMORY_MAX_SCOPES", "50000")),
+        idle_ttl_s=int(os.getenv("AGENT_MEMORY_IDLE_TTL_S", "1800")),
+        flush_interval_ms=int(os.getenv("AGENT_MEMORY_FLUSH_INTERVAL_MS", "1000")),
+        flush_batch=int(os.getenv("AGENT_MEMORY_FLUSH_BATCH", "200")),
+        sweep_interval_s=int(os.getenv("AGENT_MEMORY_SWEEP_INTERVAL_S", "60")),
+    )
+
+    pipeline = PipelineConfig(
+        reply_agent=os.getenv("PIPELINE_REPLY_AGENT", "control").strip(),
+        moderation_timeout_s=float(os.getenv("PIPELINE_MODERATION_TIMEOUT_S", "0.5")),
+        reply_timeout_s=float(os.getenv("PIPELINE_REPLY_TIMEOUT_S", "15")),
+        fail_closed=os.getenv("PIPELINE_FAIL_CLOSED", "0").strip().lower() in ("1", "true", "yes"),
+        chat_enabled=os.getenv("PIPELINE_CHAT", "0").strip().lower() in ("1", "true", "yes"),
+    )
+
+    moderation = ModerationConfig(
+        wordlist_path=os.getenv("MODERATION_WORDLIST", "data/moderation_words.txt").strip(),
+        reload_interval_s=float(os.getenv("MODERATION_RELOAD_INTERVAL_S", "5")),
+    )
+
+    rate_limit = RateLimitConfig(
+        enabled=os.getenv("RATE_LIMIT_ENABLED", "1").strip().lower() in ("1", "true", "yes"),
+        global_per_s=float(os.getenv("RATE_LIMIT_GLOBAL_PER_S", "30")),
+        private_per_s=float(os.getenv("RATE_LIMIT_PRIVATE_PER_S", "1")),
+        group_per_min=float(os.getenv("RATE_LIMIT_GROUP_PER_MIN", "20")),
+        max_retries=int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3")),
+    )
+
+    metrics = MetricsConfig(
+        enabled=os.getenv("METRICS_ENABLED", "1").strip().lower() in ("1", "true", "yes"),
+        host=os.getenv("METRICS_HOST", "127.0.0.1").strip(),
+        port=int(os.getenv("METRICS_PORT", "9464")),
+    )
+
+    profiling = ProfilingConfig(
+        interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        max_seconds=int(os.getenv("PROFILE_MAX_SECONDS", "60")),
+        top_n=int(os.getenv("PROFILE_TOP_N", "30")),
+        slow_update_ms=int(os.getenv("SLOW_UPDATE_MS", "0")),
+    )
+
+    recorder = RecorderConfig(
+        enabled=os.getenv("RECORD_UPDATES", "0").strip().lower() in ("1", "true", "yes"),
+        path=os.getenv("RECORD_UPDATES_PATH", "data/updates.jsonl.gz").strip(),
+        salt=os.getenv("RECORD_UPDATES_SALT", "").strip(),
+    )
+
+    webhook = WebhookConfig(
+        url=os.getenv("WEBHOOK_URL", "").strip(),
+        listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0").strip(),
+        port=int(os.getenv("WEBHOOK_PORT", "8443")),
+        path=os.getenv("WEBHOOK_PATH", "telegram").strip(),
+        secret_token=os.getenv("WEBHOOK_SECRET_TOKEN", "").strip(),
+        max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+    )
+
     return Settings(
         bot_token=token,
         env=env,
         log_level=log_level,
         db=db,
+        events=events,
+        idempotency=idempotency,
+        user_store=user_store,
+        sessions=sessions,
+        agent_memory=agent_memory,
+        pipeline=pipeline,
+        moderation=moderation,
+        rate_limit=rate_limit,
+        metrics=metrics,
+        profiling=profiling,
+        recorder=recorder,
+        webhook=webhook,
+        admin_user_ids=_parse_ids(os.getenv("ADMIN_USER_IDS", ""), "ADMIN_USER_IDS"),
+        concurrent_updates=int(os.getenv("CONCURRENT_UPDATES", "1")),
+        max_pending_updates=int(os.getenv("MAX_PENDING_UPDATES", "10000")),
+        bot_api_base_url=os.getenv("BOT_API_BASE_URL", "").strip(),
+        agents_warmup=os.getenv("AGENTS_WARMUP", "1").strip().lower() in ("1", "true", "yes"),
     )
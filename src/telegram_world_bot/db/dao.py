@@ -1,32 +1,410 @@
 # 作者：Alex
 # 2026/1/28 16:52
-from sqlalchemy.exc import IntegrityError
+import asyncio
+import time
+from collections import Counter
+
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.orm import Session
-from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, insert, select, update, func
+
+from src.telegram_world_bot.db.models import (
+    IdempotencyKey, EventLog, AgentMemoryEntry, BroadcastCheckpoint, BlockedUser,
+)
+from src.telegram_world_bot.db.idempotency import IdempotencyCache, IdempotencyTTL, utcnow
+from src.telegram_world_bot.db.instrumentation import DB_RETRIES
+
+# MySQL 1213 死锁：整个事务已被回滚；1205 锁等待超时：innodb_rollback_on_timeout 默认 OFF，只回滚那一条语句，
+# 事务前面的写还挂着。重试安全是因为每次尝试都新开 session：出错的 session 在 with 退出时关闭，
+# 没提交的部分跟着回滚，下一次从头重跑整个事务
+_RETRY_CODES = {1213: "deadlock", 1205: "lock_wait_timeout"}
+MAX_RETRIES = 3
+RETRY_BACKOFF_S = 0.01  # 第 n 次重试前等 RETRY_BACKOFF_S * 2**n
+
+# 查不到 key（刚好被 sweep 删掉）：不写进本地缓存
+_NOT_CACHED = object()
+
+def retry_reason(exc: OperationalError) -> str | None:
+    """可以重试的错误返回原因（deadlock / lock_wait_timeout / locked），否则 None。"""
+    orig = getattr(exc, "orig", None)
+    code = orig.args[0] if orig is not None and orig.args else None
+    if code in _RETRY_CODES:
+        return _RETRY_CODES[code]
+    if "database is locked" in str(orig):  # SQLite 等锁超时
+        return "locked"
+    return None
+
+def _renew_expired_stmt(key: str, now, expires_at):
+    # key 已存在但已过期：原地续期，相当于重新占用（NULL 表示永不过期，不会命中）
+    return (
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == key, IdempotencyKey.expires_at < now)
+        .values(expires_at=expires_at, created_at=func.now())
+    )
+
+def _recent_memory_stmt(scope: str, limit: int):
+    # 走 (scope, id) 索引倒序取最新 limit 条，调用方再翻回时间正序
+    return (
+        select(AgentMemoryEntry.role, AgentMemoryEntry.content)
+        .where(AgentMemoryEntry.scope == scope)
+        .order_by(AgentMemoryEntry.id.desc())
+        .limit(limit)
+    )
+
+def _expired_ids_stmt(now, batch_size: int):
+    return (
+        select(IdempotencyKey.id)
+        .where(IdempotencyKey.expires_at < now)
+        .order_by(IdempotencyKey.expires_at)
+        .limit(batch_size)
+    )
+
+def _event_user_ids_stmt(event: str, after: int, limit: int):
+    # keyset 分页：每次从上一批最大的 user_id 之后接着取，走 (user_id, created_at) 索引
+    return (
+        select(EventLog.user_id)
+        .where(EventLog.event == event, EventLog.user_id > after)
+        .group_by(EventLog.user_id)
+        .order_by(EventLog.user_id)
+        .limit(limit)
+    )
+
+def _count_event_users_stmt(event: str, after: int):
+    return select(func.count(func.distinct(EventLog.user_id))).where(EventLog.event == event, EventLog.user_id > after)
 
-from src.telegram_world_bot.db.models import IdempotencyKey, EventLog
+_CHECKPOINT_FIELDS = ("last_user_id", "sent", "failed", "blocked", "done")
+
+def _checkpoint_dict(row: BroadcastCheckpoint | None) -> dict | None:
+    if row is None:
+        return None
+    return {k: getattr(row, k) for k in _CHECKPOINT_FIELDS}
 
 class MySQLDAO:
-    def __init__(self, session_factory):
+    def __init__(
+        self,
+        session_factory,
+        idem_cache: IdempotencyCache | None = None,
+        idem_ttl: IdempotencyTTL | None = None,
+    ):
         self._session_factory = session_factory
+        self._idem_cache = idem_cache
+        self._idem_ttl = idem_ttl
+        self.retries: Counter = Counter()  # 原因 -> 次数；全局的在 bot_db_retries_total
+
+    def _retry(self, method: str, fn):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return fn()
+            except OperationalError as e:
+                reason = retry_reason(e)
+                if reason is None or attempt == MAX_RETRIES:
+                    raise
+                self.retries[reason] += 1
+                DB_RETRIES.labels(method, reason).inc()
+                time.sleep(RETRY_BACKOFF_S * 2 ** attempt)
 
     def try_acquire_idempotency(self, key: str) -> bool:
+        now = utcnow()
+        if self._idem_cache is not None and self._idem_cache.seen(key, now):
+            return False
+
+        expires_at = self._idem_ttl.expires_at(key, now) if self._idem_ttl else None
+        acquired, expires_at = self._retry(
+            "try_acquire_idempotency", lambda: self._acquire_once(key, now, expires_at)
+        )
+        if self._idem_cache is not None and expires_at is not _NOT_CACHED:
+            self._idem_cache.remember(key, expires_at)
+        return acquired
+
+    def _acquire_once(self, key: str, now, expires_at):
         with self._session_factory() as session:  # type: Session
-            session.add(IdempotencyKey(key=key))
+            session.add(IdempotencyKey(key=key, expires_at=expires_at))
             try:
                 session.commit()
-                return True
+                return True, expires_at
             except IntegrityError:
                 session.rollback()
-                return False
+                result = session.execute(_renew_expired_stmt(key, now, expires_at))
+                session.commit()
+                if result.rowcount:
+                    return True, expires_at
+                if self._idem_cache is None:
+                    return False, expires_at
+                row = session.execute(
+                    select(IdempotencyKey.expires_at).where(IdempotencyKey.key == key)
+                ).first()
+                return False, (_NOT_CACHED if row is None else row[0])
 
     def log_event(self, user_id: int, event: str, payload: str | None = None) -> None:
-        with self._session_factory() as session:  # type: Session
-            session.add(EventLog(user_id=user_id, event=event, payload=payload))
-            session.commit()
+        def once():
+            with self._session_factory() as session:  # type: Session
+                session.add(EventLog(user_id=user_id, event=event, payload=payload))
+                session.commit()
+
+        self._retry("log_event", once)
+
+    def log_events(self, rows: list[dict]) -> None:
+        # 一个事务、一条多行 INSERT；rows: [{"user_id", "event", "payload"}, ...]
+        if not rows:
+            return
+
+        def once():
+            with self._session_factory() as session:  # type: Session
+                session.execute(insert(EventLog), rows)
+                session.commit()
+
+        self._retry("log_events", once)
 
     def clear_idempotency_keys(self) -> int:
         with self._session_factory() as session:  # type: Session
             result = session.execute(delete(IdempotencyKey))
             session.commit()
-            return int(result.rowcount or 0)
\ No newline at end of file
+        if self._idem_cache is not None:
+            self._idem_cache.clear()
+        return int(result.rowcount or 0)
+
+    def sweep_expired_idempotency(self, batch_size: int = 1000) -> int:
+        """删一批已过期的 key（走 expires_at 索引），返回删除条数。"""
+        with self._session_factory() as session:  # type: Session
+            ids = session.scalars(_expired_ids_stmt(utcnow(), batch_size)).all()
+            if not ids:
+                return 0
+            result = session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+            session.commit()
+            return int(result.rowcount or 0)
+
+    def load_agent_memory(self, scope: str, limit: int) -> list[dict]:
+        with self._session_factory() as session:  # type: Session
+            rows = session.execute(_recent_memory_stmt(scope, limit)).all()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def append_agent_memories(self, rows: list[dict]) -> None:
+        # rows: [{"scope", "role", "content"}, ...]
+        if not rows:
+            return
+        with self._session_factory() as session:  # type: Session
+            session.execute(insert(AgentMemoryEntry), rows)
+            session.commit()
+
+    # ---------- 群发 ----------
+    def event_user_ids(self, event: str, after: int = 0, limit: int = 1000) -> list[int]:
+        with self._session_factory() as session:  # type: Session
+            return list(session.scalars(_event_user_ids_stmt(event, after, limit)).all())
+
+    def count_event_users(self, event: str, after: int = 0) -> int:
+        with self._session_factory() as session:  # type: Session
+            return int(session.scalar(_count_event_users_stmt(event, after)) or 0)
+
+    def load_broadcast_checkpoint(self, campaign: str) -> dict | None:
+        with self._session_factory() as session:  # type: Session
+            row = session.scalars(select(BroadcastCheckpoint).where(BroadcastCheckpoint.campaign == campaign)).first()
+            return _checkpoint_dict(row)
+
+    def save_broadcast_checkpoint(self, campaign: str, **values) -> None:
+        with self._session_factory() as session:  # type: Session
+            row = session.scalars(select(BroadcastCheckpoint).where(BroadcastCheckpoint.campaign == campaign)).first()
+            if row is None:
+                session.add(BroadcastCheckpoint(campaign=campaign, **values))
+            else:
+                for k, v in values.items():
+                    setattr(row, k, v)
+            session.commit()
+
+    def blocked_user_ids(self, user_ids: list[int]) -> set[int]:
+        if not user_ids:
+            return set()
+        with self._session_factory() as session:  # type: Session
+            return set(session.scalars(select(BlockedUser.user_id).where(BlockedUser.user_id.in_(user_ids))).all())
+
+    def mark_users_blocked(self, rows: list[dict]) -> None:
+        # rows: [{"user_id", "reason"}, ...]；已经记过的跳过
+        if not rows:
+            return
+        with self._session_factory() as session:  # type: Session
+            known = set(session.scalars(
+                select(BlockedUser.user_id).where(BlockedUser.user_id.in_([r["user_id"] for r in rows]))
+            ).all())
+            new_rows = [r for r in rows if r["user_id"] not in known]
+            if new_rows:
+                session.execute(insert(BlockedUser), new_rows)
+            session.commit()
+
+    def unblock_user(self, user_id: int) -> None:
+        # 用户又主动找 bot 了（/start）：说明已经解除拉黑，以后的群发照常发给他
+        with self._session_factory() as session:  # type: Session
+            session.execute(delete(BlockedUser).where(BlockedUser.user_id == user_id))
+            session.commit()
+
+class AsyncMySQLDAO:
+    """
+    MySQLDAO 的 async 版本：接口一致，只是每个方法都要 await。
+    给 PTB handler 用，DB 往返期间 event loop 可以继续处理别的 update。
+    """
+    def __init__(
+        self,
+        session_factory,
+        idem_cache: IdempotencyCache | None = None,
+        idem_ttl: IdempotencyTTL | None = None,
+    ):
+        self._session_factory = session_factory
+        self._idem_cache = idem_cache
+        self._idem_ttl = idem_ttl
+        self.retries: Counter = Counter()
+
+    async def _retry(self, method: str, fn):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return await fn()
+            except OperationalError as e:
+                reason = retry_reason(e)
+                if reason is None or attempt == MAX_RETRIES:
+                    raise
+                self.retries[reason] += 1
+                DB_RETRIES.labels(method, reason).inc()
+                await asyncio.sleep(RETRY_BACKOFF_S * 2 ** attempt)
+
+    async def try_acquire_idempotency(self, key: str) -> bool:
+        now = utcnow()
+        if self._idem_cache is not None and self._idem_cache.seen(key, now):
+            return False
+
+        expires_at = self._idem_ttl.expires_at(key, now) if self._idem_ttl else None
+        acquired, expires_at = await self._retry(
+            "try_acquire_idempotency", lambda: self._acquire_once(key, now, expires_at)
+        )
+        if self._idem_cache is not None and expires_at is not _NOT_CACHED:
+            self._idem_cache.remember(key, expires_at)
+        return acquired
+
+    async def _acquire_once(self, key: str, now, expires_at):
+        async with self._session_factory() as session:  # type: AsyncSession
+            session.add(IdempotencyKey(key=key, expires_at=expires_at))
+            try:
+                await session.commit()
+                return True, expires_at
+            except IntegrityError:
+                await session.rollback()
+                result = await session.execute(_renew_expired_stmt(key, now, expires_at))
+                await session.commit()
+                if result.rowcount:
+                    return True, expires_at
+                if self._idem_cache is None:
+                    return False, expires_at
+                row = (await session.execute(
+                    select(IdempotencyKey.expires_at).where(IdempotencyKey.key == key)
+                )).first()
+                return False, (_NOT_CACHED if row is None else row[0])
+
+    async def log_event(self, user_id: int, event: str, payload: str | None = None) -> None:
+        async def once():
+            async with self._session_factory() as session:  # type: AsyncSession
+                session.add(EventLog(user_id=user_id, event=event, payload=payload))
+                await session.commit()
+
+        await self._retry("log_event", once)
+
+    async def log_events(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+
+        async def once():
+            async with self._session_factory() as session:  # type: AsyncSession
+                await session.execute(insert(EventLog), rows)
+                await session.commit()
+
+        await self._retry("log_events", once)
+
+    async def clear_idempotency_keys(self) -> int:
+        async with self._session_factory() as session:  # type: AsyncSession
+            result = await session.execute(delete(IdempotencyKey))
+            await session.commit()
+        if self._idem_cache is not None:
+            self._idem_cache.clear()
+        return int(result.rowcount or 0)
+
+    async def sweep_expired_idempotency(self, batch_size: int = 1000) -> int:
+        async with self._session_factory() as session:  # type: AsyncSession
+            ids = (await session.scalars(_expired_ids_stmt(utcnow(), batch_size))).all()
+            if not ids:
+                return 0
+            result = await session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+            await session.commit()
+            return int(result.rowcount or 0)
+
+    async def load_agent_memory(self, scope: str, limit: int) -> list[dict]:
+        async with self._session_factory() as session:  # type: AsyncSession
+            rows = (await session.execute(_recent_memory_stmt(scope, limit))).all()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    async def append_agent_memories(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        async with self._session_factory() as session:  # type: AsyncSession
+            await session.execute(insert(AgentMemoryEntry), rows)
+            await session.commit()
+
+    # ---------- 群发 ----------
+    async def event_user_ids(self, event: str, after: int = 0, limit: int = 1000) -> list[int]:
+        async with self._session_factory() as session:  # type: AsyncSession
+            return list((await session.scalars(_event_user_ids_stmt(event, after, limit))).all())
+
+    async def count_event_users(self, event: str, after: int = 0) -> int:
+        async with self._session_factory() as session:  # type: AsyncSession
+            return int((await session.scalar(_count_event_users_stmt(event, after))) or 0)
+
+    async def load_broadcast_checkpoint(self, campaign: str) -> dict | None:
+        async with self._session_factory() as session:  # type: AsyncSession
+            row = (await session.scalars(
+                select(BroadcastCheckpoint).where(BroadcastCheckpoint.campaign == campaign)
+            )).first()
+            return _checkpoint_dict(row)
+
+    async def save_broadcast_checkpoint(self, campaign: str, **values) -> None:
+        async with self._session_factory() as session:  # type: AsyncSession
+            row = (await session.scalars(
+                select(BroadcastCheckpoint).where(BroadcastCheckpoint.campaign == campaign)
+            )).first()
+            if row is None:
+                session.add(BroadcastCheckpoint(campaign=campaign, **values))
+            else:
+                for k, v in values.items():
+                    setattr(row, k, v)
+            await session.commit()
+
+    async def blocked_user_ids(self, user_ids: list[int]) -> set[int]:
+        if not user_ids:
+            return set()
+        async with self._session_factory() as session:  # type: AsyncSession
+            return set((await session.scalars(
+                select(BlockedUser.user_id).where(BlockedUser.user_id.in_(user_ids))
+            )).all())
+
+    async def mark_users_blocked(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        async with self._session_factory() as session:  # type: AsyncSession
+            known = set((await session.scalars(
+                select(BlockedUser.user_id).where(BlockedUser.user_id.in_([r["user_id"] for r in rows]))
+            )).all())
+            new_rows = [r for r in rows if r["user_id"] not in known]
+            if new_rows:
+                await session.execute(insert(BlockedUser), new_rows)
+            await session.commit()
+
+    async def unblock_user(self, user_id: int) -> None:
+        async with self._session_factory() as session:  # type: AsyncSession
+            await session.execute(delete(BlockedUser).where(BlockedUser.user_id == user_id))
+            await session.commit()
+
+class LocalDAO(MySQLDAO):
+    """
+    SQLite 版本：测试 / 本地开发 / scripts.bench_dao 用。
+    SQL 和 MySQL 版完全一样，session factory 用 db.local.make_session_factory 创建。
+    """
+
+class AsyncLocalDAO(AsyncMySQLDAO):
+    """
+    SQLite(aiosqlite) 版本：测试 / 本地开发用。
+    SQL 和 MySQL 版完全一样，session factory 用 db.local.make_async_session_factory 创建。
+    """
@@ -0,0 +1,174 @@
+"""
+EventLog 的缓冲写入：事件先进内存队列，攒够 batch_size 或到了 flush_interval 再一次性多行 INSERT。
+队列有上限，满了之后按 overflow 策略处理：
+- block：log_event 等到队列有空位
+- drop_oldest：丢掉最老的一条
+- spill：写到本地 jsonl，下次 flush 时再补写进 DB
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List
+
+from src.telegram_world_bot.config import EventSinkConfig
+
+logger = logging.getLogger(__name__)
+
+class EventSink:
+    def __init__(self, dao, config: EventSinkConfig | None = None):
+        self._dao = dao
+        self._config = config or EventSinkConfig()
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._not_full = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        self._spill_path = Path(self._config.spill_path)
+
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    # ---------- 生命周期 ----------
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="event_sink_flush")
+
+    async def close(self) -> None:
+        """停掉后台 flush，并把队列 + spill 文件里剩下的事件全部写进 DB。
+        不 cancel 后台任务：它可能正在写一批已经出队的事件，cancel 掉这批就丢了；让它写完这一轮自己退出。"""
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    # ---------- 写入 ----------
+    async def log_event(self, user_id: int, event: str, payload: str | None = None) -> None:
+        row = {"user_id": user_id, "event": event, "payload": payload}
+        if self._closed:
+            # 关闭之后不再有人 flush：直接写，写不进去就落到 spill 文件，下次启动补写
+            if not await self._write([row]):
+                self._spill([row])
+            return
+
+        if len(self._queue) >= self._config.max_queue:
+            policy = self._config.overflow
+            if policy == "drop_oldest":
+                self._queue.popleft()
+                self.dropped += 1
+            elif policy == "spill":
+                self._spill([row])
+                return
+            else:
+                async with self._not_full:
+                    await self._not_full.wait_for(lambda: len(self._queue) < self._config.max_queue)
+
+        self._queue.append(row)
+        self.enqueued += 1
+        if len(self._queue) >= self._config.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """把当前队列写完（按 batch_size 分批），再补写 spill 文件。返回写入条数。"""
+        written = 0
+        async with self._flush_lock:
+            while self._queue:
+                n = min(len(self._queue), self._config.batch_size)
+                batch = [self._queue.popleft() for _ in range(n)]
+                async with self._not_full:
+                    self._not_full.notify_all()
+                if not await self._write(batch):
+                    # 写失败：放回队首，等下一轮
+                    self._queue.extendleft(reversed(batch))
+                    return written
+                written += n
+            written += await self._drain_spill()
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._queue),
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+        }
+
+    # ---------- 内部 ----------
+    async def _run(self) -> None:
+        interval = self._config.flush_interval_ms / 1000
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> bool:
+        t0 = time.perf_counter()
+        try:
+            await self._dao.log_events(rows)
+        except Exception:
+            self.flush_errors += 1
+            logger.exception("EventSink flush failed (%d events)", len(rows))
+            return False
+        ms = (time.perf_counter() - t0) * 1000
+        self.flush_count += 1
+        self.flushed += len(rows)
+        self.last_flush_ms = ms
+        self.max_flush_ms = max(self.max_flush_ms, ms)
+        self.total_flush_ms += ms
+        return True
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._spill_path.open("a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.spilled += len(rows)
+
+    async def _drain_spill(self) -> int:
+        if not self._spill_path.exists() or self._spill_path.stat().st_size == 0:
+            return 0
+
+        # 先改名再读：补写期间新溢出的事件会写进新的 spill 文件
+        draining = self._spill_path.with_name(self._spill_path.name + ".draining")
+        if not draining.exists():
+            os.replace(self._spill_path, draining)
+
+        rows: List[Dict[str, Any]] = []
+        with draining.open("r", encoding="utf-8") as f:
+            for raw in f:
+                raw = raw.strip()
+                if raw:
+                    rows.append(json.loads(raw))
+
+        size = self._config.batch_size
+        for i in range(0, len(rows), size):
+            if not await self._write(rows[i:i + size]):
+                # 剩下的写回 spill 文件，不丢
+                self._spill(rows[i:])
+                self.spilled -= len(rows) - i
+                draining.unlink()
+                return i
+        draining.unlink()
+        return len(rows)
@@ -0,0 +1,89 @@
+"""
+幂等 key 的 TTL 策略 + 进程内 LRU/TTL 前置缓存。
+热点重复提交直接在缓存里拒掉，不用再去 DB INSERT + rollback 一次。
+"""
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from telegram.ext import ContextTypes
+
+from src.telegram_world_bot.config import IdempotencyConfig
+
+logger = logging.getLogger(__name__)
+
+def utcnow() -> datetime:
+    # expires_at 统一存 naive UTC：MySQL DATETIME / SQLite 都不保存时区
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class IdempotencyTTL:
+    """按 key 前缀决定过期时间：'onboarding_submit:*' 这种写法，最长前缀优先。"""
+    def __init__(self, default_ttl_s: int, prefix_ttls: tuple[tuple[str, int], ...] = ()):
+        self.default_ttl_s = default_ttl_s
+        prefixes = [(p[:-1] if p.endswith("*") else p, ttl) for p, ttl in prefix_ttls]
+        self._prefixes = sorted(prefixes, key=lambda x: len(x[0]), reverse=True)
+
+    @classmethod
+    def from_config(cls, config: IdempotencyConfig) -> "IdempotencyTTL":
+        return cls(config.default_ttl_s, config.prefix_ttls)
+
+    def ttl_for(self, key: str) -> int:
+        for prefix, ttl in self._prefixes:
+            if key.startswith(prefix):
+                return ttl
+        return self.default_ttl_s
+
+    def expires_at(self, key: str, now: datetime) -> datetime:
+        return now + timedelta(seconds=self.ttl_for(key))
+
+class IdempotencyCache:
+    """
+    最近见过的 key -> expires_at。只缓存"已经被占用"的 key，所以命中即重复。
+    容量满了按 LRU 淘汰；淘汰只会让下一次多走一趟 DB，不影响正确性。
+    """
+    def __init__(self, max_size: int = 100_000):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, datetime | None]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def seen(self, key: str, now: datetime) -> bool:
+        if key not in self._items:
+            self.misses += 1
+            return False
+        expires_at = self._items[key]
+        if expires_at is not None and expires_at <= now:
+            del self._items[key]
+            self.misses += 1
+            return False
+        self._items.move_to_end(key)
+        self.hits += 1
+        return True
+
+    def remember(self, key: str, expires_at: datetime | None) -> None:
+        self._items[key] = expires_at
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+async def sweep_expired_idempotency_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue 定时任务：每轮最多删 sweep_max_batches 批过期 key，避免一次长事务锁表。"""
+    dao = context.application.bot_data["dao"]
+    config: IdempotencyConfig = context.application.bot_data["settings"].idempotency
+    total = 0
+    for _ in range(config.sweep_max_batches):
+        deleted = await dao.sweep_expired_idempotency(config.sweep_batch)
+        total += deleted
+        if deleted < config.sweep_batch:
+            break
+    if total:
+        logger.info("idempotency sweep: deleted %d expired keys", total)
@@ -0,0 +1,57 @@
+"""
+本地 SQLite 版本的 engine / session factory：测试和本地开发用，
+表结构与 MySQL 完全一致（同一个 Base）。同步版给 LocalDAO，async 版给 AsyncLocalDAO。
+"""
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.telegram_world_bot.db.models import Base
+
+def _engine_kwargs(url: str, kwargs: dict) -> dict:
+    if ":memory:" in url:
+        # 内存库每个连接都是独立的库：必须共用同一个连接。
+        # 代价是并发 session 会共享同一个事务，所以并发压测请用文件库
+        kwargs.setdefault("poolclass", StaticPool)
+        kwargs.setdefault("connect_args", {"check_same_thread": False})
+    return kwargs
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+def _with_pragmas(url: str, sync_engine: Engine) -> None:
+    # 文件库：WAL 让读不挡写；多个连接同时写时排队等锁，而不是直接报 database is locked
+    if ":memory:" not in url:
+        event.listen(sync_engine, "connect", _sqlite_pragmas)
+
+def create_local_engine(url: str = "sqlite:///:memory:", **kwargs) -> Engine:
+    """kwargs 原样传给 create_engine（pool_size 等，压测时用）。"""
+    engine = create_engine(url, echo=False, **_engine_kwargs(url, kwargs))
+    _with_pragmas(url, engine)
+    return engine
+
+def make_session_factory(url: str = "sqlite:///:memory:", **kwargs):
+    engine = create_local_engine(url, **kwargs)
+    factory = sessionmaker(bind=engine, class_=Session, autoflush=False, autocommit=False)
+    return factory, engine
+
+def init_local_db(engine: Engine) -> None:
+    Base.metadata.create_all(engine)
+
+def create_async_local_engine(url: str = "sqlite+aiosqlite:///:memory:", **kwargs) -> AsyncEngine:
+    engine = create_async_engine(url, echo=False, **_engine_kwargs(url, kwargs))
+    _with_pragmas(url, engine.sync_engine)
+    return engine
+
+def make_async_session_factory(url: str = "sqlite+aiosqlite:///:memory:", **kwargs):
+    engine = create_async_local_engine(url, **kwargs)
+    factory = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    return factory, engine
+
+async def init_local_db_async(engine: AsyncEngine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
@@ -0,0 +1,83 @@
+"""
+库结构版本管理：schema_version 表里只有一行，记录已经跑到第几个迁移。
+
+- 启动时只查这一行（check_schema / check_schema_async），版本不够就报错，不再每次 create_all
+- 迁移统一由 python -m scripts.init_db 执行（migrate），每个迁移都要能重复跑
+- 加表 / 加列：在 MIGRATIONS 末尾追加一项，SCHEMA_VERSION 自动跟着变
+"""
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Engine, inspect, select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from src.telegram_world_bot.db.models import Base, SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+def create_tables(conn) -> None:
+    # create_all 只建不存在的表，不改已有的表
+    Base.metadata.create_all(conn)
+
+def ensure_idempotency_expiry(conn) -> None:
+    # create_all 不会给已有表加列：老库补上 expires_at + 索引
+    columns = {c["name"] for c in inspect(conn).get_columns("idempotency_keys")}
+    if "expires_at" in columns:
+        return
+    conn.execute(text("ALTER TABLE idempotency_keys ADD COLUMN expires_at DATETIME NULL"))
+    conn.execute(text("CREATE INDEX idx_idem_expires_at ON idempotency_keys (expires_at)"))
+
+# (版本号, 说明, 迁移函数)；版本号从 1 连续递增
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "create tables", create_tables),
+    (2, "idempotency_keys.expires_at", ensure_idempotency_expiry),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def _current_version(conn) -> int:
+    # 没有 schema_version 表（从没跑过迁移的老库 / 空库）按 0 处理
+    try:
+        version = conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+    except (OperationalError, ProgrammingError):
+        conn.rollback()
+        return 0
+    return int(version or 0)
+
+def _require(version: int) -> int:
+    if version < SCHEMA_VERSION:
+        raise SchemaOutdated(
+            f"database schema is at version {version}, code needs {SCHEMA_VERSION}; "
+            f"run: python -m scripts.init_db"
+        )
+    return version
+
+def check_schema(engine: Engine) -> int:
+    with engine.connect() as conn:
+        return _require(_current_version(conn))
+
+async def check_schema_async(engine) -> int:
+    async with engine.connect() as conn:
+        return _require(await conn.run_sync(_current_version))
+
+def migrate(engine: Engine) -> List[str]:
+    """把库迁到 SCHEMA_VERSION，返回这次跑了哪些迁移。每个迁移单独一个事务，跑完就记版本。"""
+    with engine.connect() as conn:
+        current = _current_version(conn)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= current:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            # schema_version 表本身也可能还不存在
+            SchemaVersion.__table__.create(conn, checkfirst=True)
+            if conn.execute(select(SchemaVersion.id).where(SchemaVersion.id == 1)).first() is None:
+                conn.execute(SchemaVersion.__table__.insert().values(id=1, version=version))
+            else:
+                conn.execute(SchemaVersion.__table__.update().where(SchemaVersion.id == 1).values(version=version))
+        applied.append(f"{version}: {description}")
+        logger.info("schema migrated to version %d (%s)", version, description)
+    return applied
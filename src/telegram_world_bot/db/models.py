@@ -1,7 +1,7 @@
 # 作者：Alex
 # 2026/1/28 16:51
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, DateTime, Text, func, UniqueConstraint, Index
+from sqlalchemy import String, Integer, BigInteger, Boolean, DateTime, Text, func, UniqueConstraint, Index
 
 class Base(DeclarativeBase):
     pass
@@ -10,11 +10,14 @@ class IdempotencyKey(Base):
     __tablename__ = "idempotency_keys"
     __table_args__ = (
         UniqueConstraint("key", name="uq_idem_key"),
+        Index("idx_idem_expires_at", "expires_at"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     key: Mapped[str] = mapped_column(String(128), nullable=False)
     created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # UTC（naive）；NULL 表示永不过期（老数据）
+    expires_at: Mapped[str] = mapped_column(DateTime, nullable=True)
 
 class EventLog(Base):
     __tablename__ = "event_logs"
@@ -27,3 +30,48 @@ class EventLog(Base):
     event: Mapped[str] = mapped_column(String(64), nullable=False)
     payload: Mapped[str] = mapped_column(Text, nullable=True)
     created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class AgentMemoryEntry(Base):
+    __tablename__ = "agent_memories"
+    __table_args__ = (
+        Index("idx_agent_memories_scope_id", "scope", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # "<agent>:<user_id>"，见 services.memory_store.memory_scope
+    scope: Mapped[str] = mapped_column(String(128), nullable=False)
+    role: Mapped[str] = mapped_column(String(32), nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class BroadcastCheckpoint(Base):
+    __tablename__ = "broadcast_checkpoints"
+    __table_args__ = (
+        UniqueConstraint("campaign", name="uq_broadcast_campaign"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    campaign: Mapped[str] = mapped_column(String(64), nullable=False)
+    # 收件人按 user_id 升序发；这个 id 及之前的都处理过了
+    last_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    sent: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    done: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class BlockedUser(Base):
+    # 拉黑了 bot / 账号已注销 / chat 不存在：以后群发直接跳过
+    __tablename__ = "blocked_users"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    reason: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+class SchemaVersion(Base):
+    # 只有一行（id=1）：启动时查这一行判断库结构是不是最新，见 db.migrations
+    __tablename__ = "schema_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine, Engine
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from src.telegram_world_bot.config import DBConfig
 
 def create_mysql_engine(db: DBConfig) -> Engine:
@@ -16,3 +17,17 @@ def make_session_factory(db: DBConfig):
     engine = create_mysql_engine(db)
     factory = sessionmaker(bind=engine, class_=Session, autoflush=False, autocommit=False)
     return factory, engine
+
+def create_async_mysql_engine(db: DBConfig) -> AsyncEngine:
+    # 和同步版同样的连接池参数；driver 换成 aiomysql，commit 时不会卡住 event loop
+    return create_async_engine(
+        db.sqlalchemy_async_url(),
+        echo=False,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+    )
+
+def make_async_session_factory(db: DBConfig):
+    engine = create_async_mysql_engine(db)
+    factory = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    return factory, engine
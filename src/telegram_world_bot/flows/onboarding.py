@@ -1,3 +1,4 @@
+import logging
 from enum import IntEnum
 
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
@@ -9,6 +10,11 @@ from telegram.ext import (
     filters,
 )
 
+from src.telegram_world_bot.services.memory_store import memory_scope
+from src.telegram_world_bot.services.user_store import UserProfile
+
+logger = logging.getLogger(__name__)
+
 class S(IntEnum):
     CHOOSE_MODE = 1
     CONFIRM = 2
@@ -36,12 +42,23 @@ def _deps(context: ContextTypes.DEFAULT_TYPE):
 
 
 # ---------- /start ----------
+async def _unblock_if_blocked(dao, user_id: int) -> None:
+    """之前群发时被记成拉黑的用户又来 /start 了：解除，以后的群发照常发。
+    绝大多数人不在表里，只走一次主键查询，不写库；DB 出问题只记日志，/start 照常回复。"""
+    try:
+        if await dao.blocked_user_ids([user_id]):
+            await dao.unblock_user(user_id)
+    except Exception:
+        logger.warning("failed to unblock user %s", user_id, exc_info=True)
+
+
 async def entry_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if not update.effective_user or not update.message:
         return ConversationHandler.END
 
-    session_store, _, _, _ = _deps(context)
+    session_store, _, dao, _ = _deps(context)
     session_store.clear(update.effective_user.id)
+    await _unblock_if_blocked(dao, update.effective_user.id)
 
     await update.message.reply_text(
         "请选择模式：",
@@ -95,21 +112,29 @@ async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     session_store, user_store, dao, agents = _deps(context)
 
     mode = session_store.get_value(user.id, "mode")
+    if mode is None:
+        # session 已经被空闲 / LRU 淘汰，但 ConversationHandler 还停在 CONFIRM：让用户从头来
+        await msg.reply_text("会话已过期，请重新发送 /start。", reply_markup=ReplyKeyboardRemove())
+        return ConversationHandler.END
 
     # ---- 幂等 ----
     idem_key = f"onboarding_submit:{user.id}:{mode}"
-    if not dao.try_acquire_idempotency(idem_key):
+    if not await dao.try_acquire_idempotency(idem_key):
         await msg.reply_text("这个提交已处理过。", reply_markup=ReplyKeyboardRemove())
         session_store.clear(user.id)
         return ConversationHandler.END
 
     # ---- 日志 ----
-    dao.log_event(user.id, "onboarding_submit", payload=f"mode={mode}")
+    # 有 event_sink 就走缓冲批量写，否则直接写 DB
+    event_sink = context.application.bot_data.get("event_sink")
+    if event_sink is not None:
+        await event_sink.log_event(user.id, "onboarding_submit", payload=f"mode={mode}")
+    else:
+        await dao.log_event(user.id, "onboarding_submit", payload=f"mode={mode}")
 
     # ---- 写 user_store ----
     profile = user_store.get(user.id)
     if profile is None:
-        from telegram_world_bot.services.user_store import UserProfile
         profile = UserProfile(
             user_id=user.id,
             username=user.username,
@@ -121,10 +146,17 @@ async def confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     # ---- agent（可选）----
     agent_reply = None
     if agents:
+        memory_store = context.application.bot_data.get("memory_store")
         try:
-            agent = agents.get("onboarding")
-            result = await agent.run({"mode": mode})
+            agent = await agents.aget("onboarding")
+            scope = memory_scope(agent.name, user.id)
+            memory = await memory_store.get(scope) if memory_store is not None else None
+            result = await agent.run({"mode": mode, "memory": memory.last_n(10) if memory else []})
             agent_reply = result.get("reply")
+            if memory_store is not None:
+                await memory_store.add(scope, "user", f"mode={mode}")
+                if agent_reply:
+                    await memory_store.add(scope, "assistant", str(agent_reply))
         except Exception:
             pass
 
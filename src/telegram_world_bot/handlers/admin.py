@@ -0,0 +1,42 @@
+import time
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from src.telegram_world_bot.profiling import ProfilerBusy, SamplingProfiler
+
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /profile [秒数] —— 采样 N 秒，回两个文件：collapsed stacks（flamegraph.pl / speedscope）和 top-N 热点函数。
+    只对 ADMIN_USER_IDS 注册（build_app 里用 filters.User 限制）；handler 是 block=False，
+    采样期间其他 update 照常处理，采到的就是线上真实负载。
+    """
+    profiling = context.application.bot_data["settings"].profiling
+    seconds = 10
+    if context.args:
+        try:
+            seconds = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("用法：/profile [秒数]")
+            return
+    seconds = max(1, min(seconds, profiling.max_seconds))
+
+    await update.message.reply_text(f"采样 {seconds}s ...")
+    try:
+        result = await SamplingProfiler(profiling.interval_ms / 1000).run(seconds)
+    except ProfilerBusy:
+        await update.message.reply_text("已经有一个 /profile 在跑了")
+        return
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    report = result.report(profiling.top_n)
+    await update.message.reply_document(
+        document=result.collapsed().encode("utf-8"),
+        filename=f"profile-{stamp}.collapsed.txt",
+        caption="flamegraph.pl / speedscope.app 可直接打开",
+    )
+    await update.message.reply_document(
+        document=report.encode("utf-8"),
+        filename=f"profile-{stamp}.top.txt",
+        caption=report.splitlines()[0],
+    )
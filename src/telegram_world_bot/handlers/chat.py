@@ -0,0 +1,35 @@
+import logging
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from src.telegram_world_bot.services.memory_store import memory_scope
+
+logger = logging.getLogger(__name__)
+
+async def chat_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """普通文字消息（不在 onboarding 流程里）：审核 + 回复 agent 并发跑，见 agents/pipeline.py。"""
+    user = update.effective_user
+    msg = update.message
+    if not user or not msg or not msg.text:
+        return
+
+    bot_data = context.application.bot_data
+    pipeline = bot_data["pipeline"]
+    memory_store = bot_data.get("memory_store")
+
+    scope = memory_scope(pipeline.reply.agent, user.id)
+    memory = await memory_store.get(scope) if memory_store is not None else None
+    result = await pipeline.run({"user_message": msg.text, "memory": memory.last_n(10) if memory else []})
+    logger.debug("pipeline user=%s timings=%s fallbacks=%s", user.id, result.timings_ms, result.fallbacks)
+
+    if result.blocked:
+        await msg.reply_text("这条消息没有通过内容审核，换个说法试试。")
+        return
+
+    if memory_store is not None:
+        await memory_store.add(scope, "user", msg.text)
+        if result.reply:
+            await memory_store.add(scope, "assistant", str(result.reply))
+    if result.reply:
+        await msg.reply_text(str(result.reply))
@@ -0,0 +1,250 @@
+"""
+线上排查用的两个小工具，都只靠 sys._current_frames()，不依赖第三方 profiler：
+
+- SamplingProfiler：后台线程每隔 interval_s 抓一次所有线程（event loop + 线程池）的栈，
+  跑 N 秒后输出 collapsed stacks（flamegraph.pl / speedscope 直接能读）和 top-N 热点函数。
+  默认 5ms 一次，开销是采样线程自己抢 GIL 的那一点；不采样时没有任何开销。
+- SlowUpdateTracer：记录每个正在处理的 update 的开始时间，watchdog 线程发现某个 update
+  超过阈值还没处理完，就把 event loop 线程当前的栈和这个 update 所在 task 的 await 链打到日志里。
+  handler 里同步阻塞（loop 卡住）和 await 慢（loop 空闲）两种情况都能抓到。
+"""
+import asyncio
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from src.telegram_world_bot import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_UPDATES = metrics.counter("bot_slow_updates_total", "Updates that exceeded the slow-update threshold")
+
+# leaf 是这些函数的样本算空闲（loop 在 select 里等、线程池 worker 在等任务），top-N 里不计
+_IDLE_LEAVES = {("selectors", "select"), ("threading", "wait"), ("thread", "_worker"), ("queue", "get")}
+
+_frame_labels: Dict[Any, str] = {}
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages" + os.sep, "src" + os.sep):
+        i = filename.rfind(marker)
+        if i >= 0:
+            return filename[i + len(marker):]
+    return os.path.basename(filename)
+
+def _label(code) -> str:
+    # 按 code 对象缓存：同一个函数每次采样都会遇到
+    label = _frame_labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = _frame_labels[code] = f"{_short_path(code.co_filename)}:{name}".replace(";", ":").replace(" ", "_")
+    return label
+
+def _is_idle(code) -> bool:
+    stem = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return (stem, code.co_name) in _IDLE_LEAVES
+
+def _stack(frame) -> Tuple[Any, ...]:
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()  # root 在前
+    return tuple(codes)
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+@dataclass
+class ProfileResult:
+    seconds: float
+    interval_s: float
+    samples: int = 0  # 采样轮数
+    stacks: Counter = field(default_factory=Counter)  # (thread_name, code, code, ...) -> 次数
+
+    def collapsed(self) -> str:
+        """一行一个栈：thread;frame;frame count"""
+        lines = []
+        for (thread, *codes), n in self.stacks.most_common():
+            lines.append(";".join([thread.replace(" ", "_")] + [_label(c) for c in codes]) + f" {n}")
+        return "\n".join(lines) + "\n"
+
+    def top(self, n: int = 20) -> List[Tuple[str, int, int]]:
+        """[(函数, self 样本数, total 样本数)]，按 self 排序；空闲样本不计。"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for (thread, *codes), count in self.stacks.items():
+            if not codes or _is_idle(codes[-1]):
+                continue
+            own[codes[-1]] += count
+            for code in set(codes):  # 递归只算一次
+                total[code] += count
+        return [(_label(code), count, total[code]) for code, count in own.most_common(n)]
+
+    def busy_samples(self) -> int:
+        return sum(n for (thread, *codes), n in self.stacks.items() if codes and not _is_idle(codes[-1]))
+
+    def report(self, n: int = 20) -> str:
+        busy = self.busy_samples()
+        out = io.StringIO()
+        out.write(
+            f"{self.seconds:.1f}s @ {self.interval_s * 1000:.0f}ms, {self.samples} rounds, "
+            f"{busy} busy thread-samples\n\n"
+        )
+        out.write(f"{'self%':>6} {'total%':>7}  function\n")
+        for name, own, total in self.top(n):
+            out.write(f"{own / busy * 100 if busy else 0:6.1f} {total / busy * 100 if busy else 0:7.1f}  {name}\n")
+        return out.getvalue()
+
+class SamplingProfiler:
+    """同一时间只允许跑一个（两个同时采样只会互相干扰）。"""
+    _lock = threading.Lock()
+
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+
+    def sample(self, seconds: float) -> ProfileResult:
+        """阻塞当前线程 seconds 秒；在 event loop 里用 run()。"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running")
+        try:
+            return self._sample(seconds)
+        finally:
+            self._lock.release()
+
+    async def run(self, seconds: float) -> ProfileResult:
+        return await asyncio.to_thread(self.sample, seconds)
+
+    def _sample(self, seconds: float) -> ProfileResult:
+        result = ProfileResult(seconds=seconds, interval_s=self.interval_s)
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                name = names.get(ident)
+                if name is None:
+                    names.update((t.ident, t.name) for t in threading.enumerate())
+                    name = names.setdefault(ident, f"thread-{ident}")
+                result.stacks[(name,) + _stack(frame)] += 1
+            del frames
+            result.samples += 1
+            time.sleep(self.interval_s)
+        return result
+
+def _await_chain(task: asyncio.Task) -> List[Tuple[Any, int]]:
+    # Task.get_stack() 对挂起的协程只给最外层一帧；顺着 cr_await 往里走才能看到卡在哪
+    out = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        out.append((frame, frame.f_lineno))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return out
+
+@dataclass
+class _InFlight:
+    update_id: Any
+    key: Any
+    started: float
+    thread_id: int
+    task: Optional[asyncio.Task]
+    dumped: bool = False
+
+class SlowUpdateTracer:
+    """
+    begin()/end() 由 update processor 在每个 update 前后调用；watchdog 线程在 start()/stop() 之间运行。
+    最近的 dump 留在 recent 里（/profile 之外也能看）。
+    """
+    def __init__(self, threshold_s: float, check_interval_s: Optional[float] = None, keep: int = 20):
+        self.threshold_s = threshold_s
+        self.check_interval_s = check_interval_s or max(0.01, threshold_s / 2)
+        self.recent: Deque[str] = deque(maxlen=keep)
+        self.slow = 0
+        self._inflight: Dict[int, _InFlight] = {}
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="slow-update-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def begin(self, update_id: Any, key: Any = None) -> int:
+        self._seq += 1
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        self._inflight[self._seq] = _InFlight(update_id, key, time.perf_counter(), threading.get_ident(), task)
+        return self._seq
+
+    def end(self, token: int) -> None:
+        entry = self._inflight.pop(token, None)
+        if entry is None:
+            return
+        elapsed = time.perf_counter() - entry.started
+        if elapsed < self.threshold_s:
+            return
+        if entry.dumped:
+            logger.warning("slow update %s (%s) finished after %.0fms", entry.update_id, entry.key, elapsed * 1000)
+        else:
+            # 在两次检查之间就跑完了，来不及抓栈
+            self._record_slow()
+            logger.warning("slow update %s (%s) took %.0fms (no stack captured)", entry.update_id, entry.key, elapsed * 1000)
+
+    def _record_slow(self) -> None:
+        self.slow += 1
+        SLOW_UPDATES.inc()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.check_interval_s):
+            now = time.perf_counter()
+            for entry in list(self._inflight.values()):
+                if not entry.dumped and now - entry.started >= self.threshold_s:
+                    entry.dumped = True
+                    self._record_slow()
+                    try:
+                        dump = self._dump(entry, now - entry.started)
+                    except Exception:
+                        logger.exception("failed to capture slow update stack")
+                        continue
+                    self.recent.append(dump)
+                    logger.warning("%s", dump)
+
+    def _dump(self, entry: _InFlight, elapsed: float) -> str:
+        out = io.StringIO()
+        out.write(f"slow update {entry.update_id} ({entry.key}) still running after {elapsed * 1000:.0f}ms\n")
+        frame = sys._current_frames().get(entry.thread_id)
+        if frame is not None:
+            out.write("-- event loop thread:\n")
+            out.write("".join(traceback.format_stack(frame)))
+        if entry.task is not None and not entry.task.done():
+            # 从别的线程读 task 的 await 链：只读，最坏情况是这一刻的栈不完整
+            out.write("-- task await chain:\n")
+            out.write("".join(traceback.StackSummary.extract(_await_chain(entry.task)).format()))
+        return out.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"threshold_ms": self.threshold_s * 1000, "in_flight": len(self._inflight), "slow": self.slow}
@@ -0,0 +1,202 @@
+"""
+群发：给所有 onboarding 过的用户发同一条消息。
+
+- 收件人按 user_id 升序分批取（UserStoreRecipients / EventLogRecipients），不一次性全部载入
+- 发送走 bot 上挂的 OutboundRateLimiter，优先级 PRIORITY_BROADCAST，让路给实时回复
+- 收件人按 checkpoint_every 个一组发送，每组发完把进度（这组最后一个 user_id + 各项计数）写进 broadcast_checkpoints；
+  重启后从断点接着发，最坏情况是崩溃时那一组（默认 50 人）重发一遍
+- 拉黑 bot / 账号注销 / chat 不存在的用户记进 blocked_users，以后所有群发都跳过；用户再发 /start 时解除
+- 发送失败（其他错误）只计数，不重试；429 已经由限速器按 retry_after 重试过了
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, List, Optional
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+
+from src.telegram_world_bot.telegram.rate_limiter import PRIORITY_BROADCAST
+
+logger = logging.getLogger(__name__)
+
+# 这些 BadRequest 说明用户那边已经收不到了，和 Forbidden 一样处理
+_GONE_MARKERS = ("chat not found", "user is deactivated", "peer_id_invalid")
+
+class UserStoreRecipients:
+    def __init__(self, user_store, chunk_size: int = 1000):
+        self.user_store = user_store
+        self.chunk_size = chunk_size
+
+    async def remaining(self, after: int) -> Optional[int]:
+        return self.user_store.count_user_ids(after)
+
+    async def chunks(self, after: int) -> AsyncIterator[List[int]]:
+        for chunk in self.user_store.iter_user_ids(after, self.chunk_size):
+            yield chunk
+
+class EventLogRecipients:
+    """从 event_logs 里取触发过某个事件的用户（默认 onboarding_submit），keyset 分页。"""
+    def __init__(self, dao, event: str = "onboarding_submit", chunk_size: int = 1000):
+        self.dao = dao
+        self.event = event
+        self.chunk_size = chunk_size
+
+    async def remaining(self, after: int) -> Optional[int]:
+        return await self.dao.count_event_users(self.event, after)
+
+    async def chunks(self, after: int) -> AsyncIterator[List[int]]:
+        while True:
+            chunk = await self.dao.event_user_ids(self.event, after, self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+            after = chunk[-1]
+
+@dataclass
+class BroadcastProgress:
+    campaign: str
+    total: Optional[int]  # 这次启动时还没处理的收件人数
+    resumed_from: int = 0  # 断点的 user_id；0 表示从头开始
+    processed: int = 0
+    sent: int = 0
+    failed: int = 0
+    blocked: int = 0  # 这次新发现的
+    skipped: int = 0  # 之前就在 blocked_users 里的
+    started_at: float = field(default_factory=time.monotonic)
+
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def rate(self) -> float:
+        elapsed = self.elapsed_s()
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def eta_s(self) -> Optional[float]:
+        if self.total is None or not self.rate():
+            return None
+        return max(0, self.total - self.processed) / self.rate()
+
+    def summary(self) -> str:
+        eta = self.eta_s()
+        total = "?" if self.total is None else str(self.total)
+        return (
+            f"[{self.campaign}] {self.processed}/{total} processed "
+            f"(sent={self.sent} failed={self.failed} blocked={self.blocked} skipped={self.skipped}) "
+            f"{self.rate():.1f}/s elapsed={self.elapsed_s():.0f}s eta={'?' if eta is None else f'{eta:.0f}s'}"
+        )
+
+class Broadcaster:
+    def __init__(
+        self,
+        bot,
+        dao,
+        campaign: str,
+        text: str,
+        recipients,
+        concurrency: int = 32,
+        parse_mode: Optional[str] = None,
+        report_interval_s: float = 10.0,
+        on_progress: Optional[Callable[[BroadcastProgress], None]] = None,
+        checkpoint_every: int = 50,
+    ):
+        self.bot = bot
+        self.dao = dao
+        self.campaign = campaign
+        self.text = text
+        self.recipients = recipients
+        self.concurrency = concurrency
+        self.parse_mode = parse_mode
+        self.report_interval_s = report_interval_s
+        self.on_progress = on_progress
+        self.checkpoint_every = checkpoint_every
+        # PTB 不允许在没挂限速器的 bot 上传 rate_limit_args
+        self._send_kwargs = (
+            {"rate_limit_args": {"priority": PRIORITY_BROADCAST}} if getattr(bot, "rate_limiter", None) is not None else {}
+        )
+
+    async def _send_one(self, user_id: int, sem: asyncio.Semaphore) -> tuple[int, str, Optional[str]]:
+        async with sem:
+            try:
+                await self.bot.send_message(
+                    chat_id=user_id,
+                    text=self.text,
+                    parse_mode=self.parse_mode,
+                    **self._send_kwargs,
+                )
+                return user_id, "sent", None
+            except Forbidden as e:
+                return user_id, "blocked", e.message
+            except BadRequest as e:
+                if any(m in e.message.lower() for m in _GONE_MARKERS):
+                    return user_id, "blocked", e.message
+                logger.warning("broadcast %s: send to %s failed: %s", self.campaign, user_id, e)
+                return user_id, "failed", e.message
+            except TelegramError as e:
+                logger.warning("broadcast %s: send to %s failed: %s", self.campaign, user_id, e)
+                return user_id, "failed", e.message
+
+    def _report(self, progress: BroadcastProgress) -> None:
+        logger.info("broadcast progress: %s", progress.summary())
+        if self.on_progress is not None:
+            self.on_progress(progress)
+
+    async def run(self) -> BroadcastProgress:
+        checkpoint = await self.dao.load_broadcast_checkpoint(self.campaign) or {
+            "last_user_id": 0, "sent": 0, "failed": 0, "blocked": 0, "done": False,
+        }
+        if checkpoint["done"]:
+            logger.info("broadcast %s already finished, nothing to do", self.campaign)
+            return BroadcastProgress(self.campaign, total=0, resumed_from=checkpoint["last_user_id"])
+
+        after = checkpoint["last_user_id"]
+        progress = BroadcastProgress(self.campaign, total=await self.recipients.remaining(after), resumed_from=after)
+        if after:
+            logger.info("broadcast %s resuming after user_id=%s", self.campaign, after)
+
+        sem = asyncio.Semaphore(self.concurrency)
+        last_report = time.monotonic()
+        async for chunk in self.recipients.chunks(after):
+            # 按大块取收件人（少查几次库），按小组发送和存断点（崩溃时少重发）
+            for i in range(0, len(chunk), self.checkpoint_every):
+                group = chunk[i:i + self.checkpoint_every]
+                await self._send_group(group, sem, progress)
+                after = group[-1]
+                await self._save(checkpoint, progress, after, done=False)
+
+                if time.monotonic() - last_report >= self.report_interval_s:
+                    last_report = time.monotonic()
+                    self._report(progress)
+
+        await self._save(checkpoint, progress, after, done=True)
+        self._report(progress)
+        return progress
+
+    async def _send_group(self, group: List[int], sem: asyncio.Semaphore, progress: BroadcastProgress) -> None:
+        already_blocked = await self.dao.blocked_user_ids(group)
+        targets = [uid for uid in group if uid not in already_blocked]
+        progress.skipped += len(group) - len(targets)
+
+        results = await asyncio.gather(*(self._send_one(uid, sem) for uid in targets))
+        newly_blocked = []
+        for user_id, outcome, reason in results:
+            if outcome == "sent":
+                progress.sent += 1
+            elif outcome == "blocked":
+                progress.blocked += 1
+                newly_blocked.append({"user_id": user_id, "reason": (reason or "")[:255]})
+            else:
+                progress.failed += 1
+        await self.dao.mark_users_blocked(newly_blocked)
+        progress.processed += len(group)
+
+    async def _save(self, checkpoint: dict, progress: BroadcastProgress, after: int, done: bool) -> None:
+        # 计数 = 之前几次运行的累计 + 这次的
+        await self.dao.save_broadcast_checkpoint(
+            self.campaign,
+            last_user_id=after,
+            sent=checkpoint["sent"] + progress.sent,
+            failed=checkpoint["failed"] + progress.failed,
+            blocked=checkpoint["blocked"] + progress.blocked,
+            done=done,
+        )
@@ -0,0 +1,193 @@
+"""
+按 user / chat 划分的 AgentMemory 存储。
+
+- 内存里每个 scope 一个定长环形缓冲（AgentMemory），scope 数有上限（LRU），空闲超时由 sweep() 清理
+- 第一次访问某个 scope 时才从 agent_memories 表里加载最近 capacity 条
+- add() 只改内存并记一条待写行，后台任务每 flush_interval_ms 批量 INSERT（write-behind）
+- 被淘汰的 scope 重新加载时，DB 结果 + 还没写进去的行才是完整历史；查询和 flush 撞上了就拿着 flush 锁重查
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from telegram.ext import ContextTypes
+
+from src.telegram_world_bot.agents.memory import AgentMemory
+from src.telegram_world_bot.config import AgentMemoryConfig
+
+logger = logging.getLogger(__name__)
+
+def memory_scope(agent_name: str, user_id: int) -> str:
+    return f"{agent_name}:{user_id}"
+
+class MemoryStore:
+    def __init__(self, dao, config: AgentMemoryConfig | None = None):
+        self._dao = dao
+        self._config = config or AgentMemoryConfig()
+        self._memories: "OrderedDict[str, AgentMemory]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        # flush 开始和结束各 +1：奇数表示有一批正在写
+        self._flush_seq = 0
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+        self.loads = 0
+        self.hits = 0
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+        self.flushed = 0
+        self.flush_errors = 0
+
+    # ---------- 生命周期 ----------
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="memory_store_flush")
+
+    async def close(self) -> None:
+        # 不 cancel：flush 可能正在写已经从 _pending 取走的行，cancel 掉这些行就丢了
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        interval = self._config.flush_interval_ms / 1000
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    # ---------- 读写 ----------
+    async def get(self, scope: str) -> AgentMemory:
+        while True:
+            memory = self._memories.get(scope)
+            if memory is not None:
+                self.hits += 1
+                self._touch(scope)
+                return memory
+
+            # 同一个 scope 并发的第一次访问只查一次 DB
+            loading = self._loading.get(scope)
+            if loading is None:
+                break
+            # asyncio.wait 不会取消 loading，只有自己被取消时才抛 CancelledError
+            await asyncio.wait((loading,))
+            if not loading.cancelled():
+                return loading.result()
+            # 被取消的是发起加载的那个请求：回到开头，第一个回来的接着加载
+
+        loading = self._loading[scope] = asyncio.get_running_loop().create_future()
+        try:
+            memory = AgentMemory(capacity=self._config.capacity)
+            memory.extend(await self._load_rows(scope))
+            # 被淘汰后又马上被访问：还没 flush 的行 DB 里查不到，要补上
+            memory.extend(
+                {"role": r["role"], "content": r["content"]} for r in self._pending if r["scope"] == scope
+            )
+            self.loads += 1
+            self._memories[scope] = memory
+            self._touch(scope)
+            self._evict_lru()
+            loading.set_result(memory)
+            return memory
+        except asyncio.CancelledError:
+            loading.cancel()
+            raise
+        except Exception as e:
+            loading.set_exception(e)
+            loading.exception()  # 没人等的话也别报 "exception was never retrieved"
+            raise
+        finally:
+            self._loading.pop(scope, None)
+
+    async def _load_rows(self, scope: str) -> List[Dict[str, Any]]:
+        # 查询期间有一批正在写：它已经不在 _pending 里，查询又不一定看得到它，补行时会漏；
+        # 这种情况拿着 flush 锁重查一遍，这时 DB 里有的都已提交，没提交的都在 _pending
+        seq = self._flush_seq
+        rows = await self._dao.load_agent_memory(scope, self._config.capacity)
+        if seq == self._flush_seq and seq % 2 == 0:
+            return rows
+        async with self._flush_lock:
+            return await self._dao.load_agent_memory(scope, self._config.capacity)
+
+    async def add(self, scope: str, role: str, content: str) -> None:
+        memory = await self.get(scope)
+        memory.add(role, content)
+        self._pending.append({"scope": scope, "role": role, "content": content})
+        # 关闭之后没有后台 flush 了：直接写
+        if self._closed or len(self._pending) >= self._config.flush_batch:
+            await self.flush()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            self._flush_seq += 1
+            try:
+                await self._dao.append_agent_memories(rows)
+            except Exception:
+                # 放回去下次重试；内存里的 memory 不受影响
+                self._pending = rows + self._pending
+                self.flush_errors += 1
+                logger.exception("MemoryStore flush failed (%d rows pending)", len(self._pending))
+                return 0
+            finally:
+                self._flush_seq += 1
+            self.flushed += len(rows)
+            return len(rows)
+
+    # ---------- 淘汰 ----------
+    def _touch(self, scope: str) -> None:
+        self._memories.move_to_end(scope)
+        self._touched[scope] = time.monotonic()
+
+    def _evict_lru(self) -> None:
+        while len(self._memories) > self._config.max_scopes:
+            scope, _ = self._memories.popitem(last=False)
+            self._touched.pop(scope, None)
+            self.evicted_lru += 1
+
+    def sweep(self) -> int:
+        """从最久没访问的那头开始清理空闲 scope，碰到第一个还活跃的就停。"""
+        now = time.monotonic()
+        removed = 0
+        while self._memories:
+            scope = next(iter(self._memories))
+            if now - self._touched.get(scope, 0.0) <= self._config.idle_ttl_s:
+                break
+            del self._memories[scope]
+            self._touched.pop(scope, None)
+            removed += 1
+        self.evicted_idle += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "scopes": len(self._memories),
+            "max_scopes": self._config.max_scopes,
+            "pending": len(self._pending),
+            "loads": self.loads,
+            "hits": self.hits,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+        }
+
+    def __len__(self) -> int:
+        return len(self._memories)
+
+async def sweep_memory_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue 定时任务：清理空闲用户的 memory。"""
+    context.application.bot_data["memory_store"].sweep()
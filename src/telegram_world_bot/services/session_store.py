@@ -1,32 +1,102 @@
 # 作者：Alex
 # 2026/1/28 16:55
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-@dataclass
+from telegram.ext import ContextTypes
+
+@dataclass(slots=True)
 class Session:
     user_id: int
     data: Dict[str, Any] = field(default_factory=dict)
+    touched_at: float = 0.0
 
 class SessionStore:
     """
     短期会话：给 flows（ConversationHandler）用
     不建议拿它做 agent 长期 memory。
+
+    有容量上限（LRU 淘汰）+ 空闲 TTL（sweep() 定时清理）。
+    只有写操作会创建 Session，读不存在的用户不会分配任何东西。
     """
-    def __init__(self):
-        self._sessions: Dict[int, Session] = {}
+    def __init__(self, max_sessions: int = 100_000, idle_ttl_s: float = 3600):
+        self.max_sessions = max_sessions
+        self.idle_ttl_s = idle_ttl_s
+        self._sessions: "OrderedDict[int, Session]" = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_idle = 0
+
+    def get(self, user_id: int) -> Optional[Session]:
+        sess = self._sessions.get(user_id)
+        if sess is None:
+            return None
+        if self._is_idle(sess, time.monotonic()):
+            self._sessions.pop(user_id, None)
+            self.evicted_idle += 1
+            return None
+        return sess
 
-    def get(self, user_id: int) -> Session:
-        if user_id not in self._sessions:
-            self._sessions[user_id] = Session(user_id=user_id)
-        return self._sessions[user_id]
+    def get_or_create(self, user_id: int) -> Session:
+        now = time.monotonic()
+        sess = self.get(user_id)
+        if sess is None:
+            sess = Session(user_id=user_id)
+            self._sessions[user_id] = sess
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted_lru += 1
+        else:
+            self._sessions.move_to_end(user_id)
+        sess.touched_at = now
+        return sess
 
     def clear(self, user_id: int) -> None:
         self._sessions.pop(user_id, None)
 
     def set_value(self, user_id: int, key: str, value: Any) -> None:
-        sess = self.get(user_id)
+        sess = self.get_or_create(user_id)
         sess.data[key] = value
 
     def get_value(self, user_id: int, key: str, default: Any = None) -> Any:
-        return self.get(user_id).data.get(key, default)
+        sess = self.get(user_id)
+        if sess is None:
+            return default
+        return sess.data.get(key, default)
+
+    def sweep(self, max_items: int | None = None) -> int:
+        """
+        从最久没动过的那头开始清理空闲会话，碰到第一个还活跃的就停。
+        （touched_at 只在写时更新，LRU 顺序和 touched_at 顺序一致）
+        """
+        now = time.monotonic()
+        removed = 0
+        while self._sessions:
+            if max_items is not None and removed >= max_items:
+                break
+            user_id, sess = next(iter(self._sessions.items()))
+            if not self._is_idle(sess, now):
+                break
+            del self._sessions[user_id]
+            removed += 1
+        self.evicted_idle += removed
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evicted_lru": self.evicted_lru,
+            "evicted_idle": self.evicted_idle,
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _is_idle(self, sess: Session, now: float) -> bool:
+        return now - sess.touched_at > self.idle_ttl_s
+
+async def sweep_sessions_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue 定时任务：清理空闲会话。"""
+    context.application.bot_data["session_store"].sweep()
@@ -1,47 +1,213 @@
 # 作者：Alex
 # 2026/1/28 16:52
 from dataclasses import dataclass, asdict
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional
 import json
+import logging
+import os
+import threading
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 @dataclass
 class UserProfile:
     user_id: int
     username: str | None = None
     first_name: str | None = None
 
+def _atomic_write_text(path: Path, text: str) -> None:
+    # 先写临时文件 + fsync，再 os.replace：中途崩溃也不会把原文件写坏
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
 class UserStore:
     """
     本地轻量 user store（json）。主数据上 MySQL 时可替换掉。
+
+    journal=True 时 upsert 只往 <path>.journal 追加一行，启动时 snapshot + journal 重放；
+    journal 行数超过 max(compact_threshold, 用户数) 后，后台线程把 snapshot 原子重写一遍。
+    group_commit_ms=0 每次 upsert 都 fsync；>0 则由后台线程每 N ms fsync 一次。
     """
-    def __init__(self, path: str = "data/users.json"):
+    def __init__(
+        self,
+        path: str = "data/users.json",
+        journal: bool = False,
+        group_commit_ms: int = 0,
+        compact_threshold: int = 10000,
+    ):
         self.path = Path(path)
         self.path.parent.mkdir(parents=True, exist_ok=True)
         self._cache: Dict[int, UserProfile] = {}
+
+        self.journal = journal
+        self.journal_path = self.path.with_name(self.path.name + ".journal")
+        self._old_journal_path = self.path.with_name(self.path.name + ".journal.old")
+        self.group_commit_ms = group_commit_ms
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._journal_fp = None
+        self._journal_records = 0
+        self._dirty = False
+        self._compact_thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._group_thread: threading.Thread | None = None
+
         self._load()
+        if self.journal:
+            self._open_journal()
 
     def _load(self) -> None:
-        if not self.path.exists():
-            return
-        try:
-            raw = json.loads(self.path.read_text(encoding="utf-8"))
-            for k, v in raw.items():
-                self._cache[int(k)] = UserProfile(**v)
-        except Exception:
-            self._cache = {}
+        if self.path.exists():
+            try:
+                raw = json.loads(self.path.read_text(encoding="utf-8"))
+                for k, v in raw.items():
+                    self._cache[int(k)] = UserProfile(**v)
+            except Exception:
+                self._cache = {}
+
+        if self.journal:
+            self._replay(self._old_journal_path)
+            self._journal_records = self._replay(self.journal_path)
+
+    def _replay(self, fp: Path) -> int:
+        if not fp.exists():
+            return 0
+        n = 0
+        # 按字节读再逐行解码：崩溃可能把最后一个中文字符截成半个，文本模式会直接抛 UnicodeDecodeError
+        with fp.open("rb") as f:
+            for raw in f:
+                try:
+                    profile = UserProfile(**json.loads(raw.decode("utf-8")))
+                except (UnicodeDecodeError, json.JSONDecodeError, TypeError):
+                    # 崩溃时最后一行可能只写了一半（重启补过换行后它会留在中间，照样跳过）
+                    continue
+                self._cache[profile.user_id] = profile
+                n += 1
+        return n
+
+    def _open_journal(self) -> None:
+        if self._old_journal_path.exists():
+            # 上次 compaction 没做完：现在 cache 已经是完整数据，直接落一个新 snapshot
+            self._write_snapshot(dict(self._cache))
+            self._old_journal_path.unlink()
+            self.journal_path.write_text("", encoding="utf-8")
+            self._journal_records = 0
+
+        self._journal_fp = self.journal_path.open("a", encoding="utf-8")
+        if self.journal_path.stat().st_size > 0:
+            with self.journal_path.open("rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # 半截行后面补个换行，别让下一条记录跟它粘在一起
+                    self._journal_fp.write("\n")
+        if self.group_commit_ms > 0:
+            self._group_thread = threading.Thread(target=self._group_commit_loop, name="user_store_fsync", daemon=True)
+            self._group_thread.start()
 
     def _save(self) -> None:
         data = {str(k): asdict(v) for k, v in self._cache.items()}
-        self.path.write_text(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
+        _atomic_write_text(self.path, json.dumps(data, ensure_ascii=False, indent=2))
+
+    def _write_snapshot(self, cache: Dict[int, UserProfile]) -> None:
+        data = {str(k): asdict(v) for k, v in cache.items()}
+        _atomic_write_text(self.path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
 
     def upsert(self, profile: UserProfile) -> None:
-        self._cache[profile.user_id] = profile
-        self._save()
+        if not self.journal:
+            self._cache[profile.user_id] = profile
+            self._save()
+            return
+
+        line = json.dumps(asdict(profile), ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._cache[profile.user_id] = profile
+            self._journal_fp.write(line)
+            self._journal_fp.flush()
+            if self.group_commit_ms > 0:
+                self._dirty = True
+            else:
+                os.fsync(self._journal_fp.fileno())
+            self._journal_records += 1
+            if self._journal_records >= max(self.compact_threshold, len(self._cache)):
+                self._start_compaction()
 
     def get(self, user_id: int) -> Optional[UserProfile]:
         return self._cache.get(user_id)
 
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def count_user_ids(self, after: int = 0) -> int:
+        return sum(1 for uid in list(self._cache) if uid > after)
+
+    def iter_user_ids(self, after: int = 0, chunk_size: int = 1000) -> Iterator[List[int]]:
+        """按 user_id 升序分批返回 > after 的用户；开始时取一次快照，之后新加的用户不在里面。"""
+        ids = sorted(uid for uid in list(self._cache) if uid > after)
+        for i in range(0, len(ids), chunk_size):
+            yield ids[i:i + chunk_size]
+
+    # ---------- journal 后台任务 ----------
+    def _group_commit_loop(self) -> None:
+        interval = self.group_commit_ms / 1000
+        while not self._stop.wait(interval):
+            self._fsync_if_dirty()
+
+    def _fsync_if_dirty(self) -> None:
+        with self._lock:
+            if not self._dirty or self._journal_fp is None:
+                return
+            self._dirty = False
+            # dup 一份 fd，fsync 放到锁外面做，不挡 upsert
+            fd = os.dup(self._journal_fp.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _start_compaction(self) -> None:
+        # 调用方持有 self._lock
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return
+        if self._old_journal_path.exists():
+            # 上一次 compaction 失败了，journal.old 不能被覆盖；留给下次启动处理
+            return
+        snapshot = dict(self._cache)
+        self._journal_fp.flush()
+        os.fsync(self._journal_fp.fileno())
+        self._journal_fp.close()
+        os.replace(self.journal_path, self._old_journal_path)
+        self._journal_fp = self.journal_path.open("a", encoding="utf-8")
+        self._journal_records = 0
+        self._dirty = False
+
+        self._compact_thread = threading.Thread(
+            target=self._compact, args=(snapshot,), name="user_store_compact", daemon=True
+        )
+        self._compact_thread.start()
+
+    def _compact(self, snapshot: Dict[int, UserProfile]) -> None:
+        try:
+            self._write_snapshot(snapshot)
+            self._old_journal_path.unlink(missing_ok=True)
+        except Exception:
+            # journal.old 还在，下次启动会重放，不丢数据
+            logger.exception("UserStore compaction failed")
+
+    def close(self) -> None:
+        if not self.journal or self._journal_fp is None:
+            return
+        self._stop.set()
+        if self._group_thread is not None:
+            self._group_thread.join()
+        if self._compact_thread is not None:
+            self._compact_thread.join()
+        with self._lock:
+            self._journal_fp.flush()
+            os.fsync(self._journal_fp.fileno())
+            self._journal_fp.close()
+            self._journal_fp = None
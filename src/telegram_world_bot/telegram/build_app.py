@@ -1,56 +1,253 @@
 # 作者：Alex
 # 2026/1/31 20:09
-from telegram.ext import Application, CommandHandler
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict
 
-from src.telegram_world_bot.config import load_settings
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters
+from telegram.request import BaseRequest, HTTPXRequest
+
+from src.telegram_world_bot.config import Settings, load_settings
+from src.telegram_world_bot.metrics import MetricsServer
 from src.telegram_world_bot.logging_setup import setup_logging
+from src.telegram_world_bot.profiling import SlowUpdateTracer
 from src.telegram_world_bot.telegram.errors import on_error
+from src.telegram_world_bot.telegram.instrumentation import InstrumentedRequest, instrument_handlers, register_component_stats
+from src.telegram_world_bot.telegram.rate_limiter import OutboundRateLimiter
+from src.telegram_world_bot.telegram.recorder import RECORD_GROUP, UpdateRecorder
+from src.telegram_world_bot.telegram.update_processor import PerUserUpdateProcessor
 
-from src.telegram_world_bot.services.session_store import SessionStore
+from src.telegram_world_bot.services.session_store import SessionStore, sweep_sessions_job
 from src.telegram_world_bot.services.user_store import UserStore
-
-from src.telegram_world_bot.db.mysql import make_session_factory
-from src.telegram_world_bot.db.models import Base
-from src.telegram_world_bot.db.dao import MySQLDAO
+from src.telegram_world_bot.services.memory_store import MemoryStore, sweep_memory_job
 
 from src.telegram_world_bot.agents.registry import AgentRegistry
-from src.telegram_world_bot.agents.onboarding_agent import OnboardingAgent
-from src.telegram_world_bot.agents.control_agent import ControlAgent
-from src.telegram_world_bot.agents.moderation_agent import ModerationAgent
+from src.telegram_world_bot.agents.cache import CachePolicy
+from src.telegram_world_bot.agents.pipeline import AgentPipeline, Stage, MODERATION_FALLBACK, REPLY_FALLBACK
 
 from src.telegram_world_bot.handlers.help import help_cmd
+from src.telegram_world_bot.handlers.admin import profile_cmd
+from src.telegram_world_bot.handlers.chat import chat_message
 from src.telegram_world_bot.handlers.debug.echo import echo_cmd
 from src.telegram_world_bot.flows.onboarding import build_onboarding_conv
 
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _phase(timings: Dict[str, float], name: str):
+    # 启动各阶段耗时，main.py --profile-startup 会打印出来
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = (time.perf_counter() - t0) * 1000
+
+
+async def _post_init(app: Application) -> None:
+    timings = app.bot_data["startup_timings"]
+    with _phase(timings, "post_init.schema_check"):
+        # 只查 schema_version 一行；建表 / 迁移由 python -m scripts.init_db 负责
+        from src.telegram_world_bot.db.migrations import check_schema_async
+        await check_schema_async(app.bot_data["db_async_engine"])
+    await app.bot_data["event_sink"].start()
+    await app.bot_data["memory_store"].start()
+    metrics_server = app.bot_data.get("metrics_server")
+    if metrics_server is not None:
+        await metrics_server.start()
+    recorder = app.bot_data.get("update_recorder")
+    if recorder is not None:
+        await recorder.start()
+    if app.bot_data["settings"].agents_warmup:
+        # 不 await：polling 先跑起来，agent 在后台线程里慢慢 import
+        app.create_task(_warm_up_agents(app), name="agents_warm_up")
+
+
+async def _warm_up_agents(app: Application) -> None:
+    registry = app.bot_data["agents"]
+    await registry.warm_up()
+    for row in registry.load_report():
+        logger.info("agent load report: %s", row)
+
+
+async def _post_shutdown(app: Application) -> None:
+    metrics_server = app.bot_data.get("metrics_server")
+    if metrics_server is not None:
+        await metrics_server.stop()
+    # 先把缓冲的事件 / memory 写完，再关 engine
+    await app.bot_data["event_sink"].close()
+    await app.bot_data["memory_store"].close()
+    app.bot_data["user_store"].close()
+    recorder = app.bot_data.get("update_recorder")
+    if recorder is not None:
+        recorder.close()
 
-def build_app() -> Application:
-    settings = load_settings()
+    async_engine = app.bot_data.get("db_async_engine")
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+def _moderation_agent(settings):
+    # 工厂里再 import：保持 lazy
+    from src.telegram_world_bot.agents.moderation_agent import ModerationAgent
+    return ModerationAgent(settings.moderation.wordlist_path, settings.moderation.reload_interval_s)
+
+
+def _init_db(app: Application, settings: Settings, db_url: str | None = None) -> None:
+    # DB 相关模块（SQLAlchemy 等）在这里才 import
+    from src.telegram_world_bot.db.dao import AsyncMySQLDAO
+    from src.telegram_world_bot.db.event_sink import EventSink
+    from src.telegram_world_bot.db.idempotency import IdempotencyCache, IdempotencyTTL
+    from src.telegram_world_bot.db.instrumentation import instrument_engine
+
+    # 不再每次启动 create_all（每张表一次反射往返），也不再建同步 engine：
+    # 库结构在 post_init 里按 schema_version 检查一次
+    if db_url:
+        # 基准 / 本地调试：SQLite 等，表结构相同，DAO 照用
+        from src.telegram_world_bot.db.local import make_async_session_factory
+        async_session_factory, async_engine = make_async_session_factory(db_url)
+    else:
+        from src.telegram_world_bot.db.mysql import make_async_session_factory
+        async_session_factory, async_engine = make_async_session_factory(settings.db)
+    instrument_engine(async_engine)
+    dao = AsyncMySQLDAO(
+        async_session_factory,
+        idem_cache=IdempotencyCache(settings.idempotency.cache_size),
+        idem_ttl=IdempotencyTTL.from_config(settings.idempotency),
+    )
+    app.bot_data["dao"] = dao
+    app.bot_data["event_sink"] = EventSink(dao, settings.events)
+    app.bot_data["db_async_engine"] = async_engine
+
+
+def build_app(
+    settings: Settings | None = None,
+    request: BaseRequest | None = None,
+    db_url: str | None = None,
+) -> Application:
+    """
+    request / db_url 只给基准、回放和测试用（见 telegram/standin.py）：
+    request 替换发往 Bot API 的请求后端（例如 FakeRequest），db_url 用 SQLAlchemy URL 代替 settings.db。
+    """
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+    with _phase(timings, "load_settings"):
+        settings = settings or load_settings()
     setup_logging(settings.log_level)
 
-    app = Application.builder().token(settings.bot_token).build()
+    builder = (
+        Application.builder()
+        .token(settings.bot_token)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+    )
+    if settings.bot_api_base_url:
+        builder = builder.base_url(settings.bot_api_base_url)
+    # 所有出站 Bot API 请求都在请求层计时（和是否挂限速器无关）；默认后端和 PTB 自己建的一样
+    builder = builder.request(InstrumentedRequest(request or HTTPXRequest(connection_pool_size=256)))
+    if settings.rate_limit.enabled:
+        builder = builder.rate_limiter(OutboundRateLimiter.from_config(settings.rate_limit))
+    slow_tracer = SlowUpdateTracer(settings.profiling.slow_update_ms / 1000) if settings.profiling.slow_update_ms > 0 else None
+    if settings.concurrent_updates > 1 or slow_tracer is not None:
+        # 顺序处理时 max_pending=1：行为和 PTB 默认的 SimpleUpdateProcessor(1) 一样，只是挂上 tracer
+        max_pending = settings.max_pending_updates if settings.concurrent_updates > 1 else 1
+        builder = builder.concurrent_updates(
+            PerUserUpdateProcessor(settings.concurrent_updates, max_pending=max_pending, slow_tracer=slow_tracer)
+        )
+    with _phase(timings, "application"):
+        app = builder.build()
+    app.bot_data["settings"] = settings
+    app.bot_data["startup_timings"] = timings
 
     # --- MySQL ---
-    session_factory, engine = make_session_factory(settings.db)
-    Base.metadata.create_all(engine)
-    app.bot_data["dao"] = MySQLDAO(session_factory)
-    app.bot_data["db_engine"] = engine  # 如果你后面要做原生查询/健康检查用
+    with _phase(timings, "db"):
+        _init_db(app, settings, db_url)
 
     # --- Stores ---
-    app.bot_data["session_store"] = SessionStore()
-    app.bot_data["user_store"] = UserStore()  # 你接 MySQL 后可替换成 MySQLUserStore
+    with _phase(timings, "stores"):
+        app.bot_data["session_store"] = SessionStore(
+            max_sessions=settings.sessions.max_sessions,
+            idle_ttl_s=settings.sessions.idle_ttl_s,
+        )
+        app.bot_data["user_store"] = UserStore(  # 你接 MySQL 后可替换成 MySQLUserStore
+            settings.user_store.path,
+            journal=settings.user_store.journal,
+            group_commit_ms=settings.user_store.group_commit_ms,
+            compact_threshold=settings.user_store.compact_threshold,
+        )
+        app.bot_data["memory_store"] = MemoryStore(app.bot_data["dao"], settings.agent_memory)
+
+    # --- 定时任务（需要 python-telegram-bot[job-queue]）---
+    if app.job_queue is not None:
+        from src.telegram_world_bot.db.idempotency import sweep_expired_idempotency_job
+        app.job_queue.run_repeating(
+            sweep_expired_idempotency_job,
+            interval=settings.idempotency.sweep_interval_s,
+            first=settings.idempotency.sweep_interval_s,
+            name="idempotency_sweep",
+        )
+        app.job_queue.run_repeating(
+            sweep_sessions_job,
+            interval=settings.sessions.sweep_interval_s,
+            first=settings.sessions.sweep_interval_s,
+            name="session_sweep",
+        )
+        app.job_queue.run_repeating(
+            sweep_memory_job,
+            interval=settings.agent_memory.sweep_interval_s,
+            first=settings.agent_memory.sweep_interval_s,
+            name="agent_memory_sweep",
+        )
+    else:
+        logger.warning("JobQueue unavailable; expired idempotency keys / idle sessions / memories will not be swept")
 
     # --- Agents ---
-    registry = AgentRegistry()
-    registry.register(OnboardingAgent())
-    registry.register(ControlAgent())
-    registry.register(ModerationAgent())
-    app.bot_data["agents"] = registry
+    # 第一次 get() 才 import；插件包通过 entry point 声明的 agent 也一并登记
+    with _phase(timings, "agents"):
+        registry = AgentRegistry()
+        registry.register_lazy(
+            "onboarding",
+            "src.telegram_world_bot.agents.onboarding_agent:OnboardingAgent",
+            cache=CachePolicy(ttl_s=600, max_size=64, key_fields=("mode", "user_message")),
+        )
+        registry.register_lazy("control", "src.telegram_world_bot.agents.control_agent:ControlAgent")
+        registry.register_lazy("moderation", lambda: _moderation_agent(settings))
+        registry.discover_entry_points()
+        app.bot_data["agents"] = registry
+        app.bot_data["pipeline"] = AgentPipeline(
+            registry,
+            moderation=Stage("moderation", settings.pipeline.moderation_timeout_s, MODERATION_FALLBACK),
+            reply=Stage(settings.pipeline.reply_agent, settings.pipeline.reply_timeout_s, REPLY_FALLBACK),
+            fail_closed=settings.pipeline.fail_closed,
+        )
 
     # --- Flows / Handlers ---
+    if settings.recorder.enabled:
+        recorder = UpdateRecorder(settings.recorder.path, salt=settings.recorder.salt)
+        app.bot_data["update_recorder"] = recorder
+        app.add_handler(TypeHandler(Update, recorder.record), group=RECORD_GROUP)
     app.add_handler(build_onboarding_conv())
     app.add_handler(CommandHandler("help", help_cmd))
+    if settings.admin_user_ids:
+        # block=False：采样期间不占着 update 处理
+        app.add_handler(CommandHandler(
+            "profile", profile_cmd, filters=filters.User(user_id=settings.admin_user_ids), block=False
+        ))
     if settings.env != "prod":
         app.add_handler(CommandHandler("echo", echo_cmd))
+    if settings.pipeline.chat_enabled:
+        # 放在 onboarding 后面：流程中的消息由 ConversationHandler 处理，其余普通文字走 agent 流水线
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, chat_message))
 
     app.add_error_handler(on_error)
+
+    # --- Metrics ---
+    instrument_handlers(app)
+    register_component_stats(app)
+    if settings.metrics.enabled:
+        app.bot_data["metrics_server"] = MetricsServer(host=settings.metrics.host, port=settings.metrics.port)
+    timings["build_app"] = (time.perf_counter() - t0) * 1000
+    logger.info("build_app took %.1fms (agents: %s)", timings["build_app"], ", ".join(registry.names()))
     return app
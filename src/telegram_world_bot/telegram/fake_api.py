@@ -0,0 +1,223 @@
+"""
+本地假 Bot API：不连 Telegram，记录 bot 发出的每个请求并返回最小可用的结果。
+压测 / 回放 / dry-run 用。两种接法：
+- 进程外：BOT_API_BASE_URL 指到 FakeBotAPIServer
+- 进程内：Application.builder().request(FakeRequest(api))，不走网络
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from telegram.request import BaseRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {
+    "id": 1000000001,
+    "is_bot": True,
+    "first_name": "FakeBot",
+    "username": "fake_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+def _decode_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    # PTB 把对象字段（reply_markup 等）序列化成 JSON 字符串，数字字段是普通字符串
+    out: Dict[str, Any] = {}
+    for k, v in params.items():
+        if isinstance(v, str) and k not in ("text", "caption"):
+            try:
+                v = json.loads(v)
+            except ValueError:
+                pass
+        out[k] = v
+    return out
+
+class FakeBotAPI:
+    def __init__(self):
+        self.calls: List[Tuple[float, str, Dict[str, Any]]] = []
+        self._next_message_id = 1
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._failures: Deque[Tuple[str, Any, Dict[str, Any]]] = deque()
+
+    def add_listener(self, fn: Callable[[str, Dict[str, Any]], None]) -> None:
+        self._listeners.append(fn)
+
+    def sent_messages(self) -> List[Dict[str, Any]]:
+        return [params for _, method, params in self.calls if method == "sendMessage"]
+
+    def fail_next(
+        self,
+        method: str,
+        error_code: int = 429,
+        retry_after: int = 1,
+        description: str = "",
+        chat_id: Any = None,
+    ) -> None:
+        """
+        下一次调用 method（指定 chat_id 时只算发给这个 chat 的）返回错误，默认 429 flood wait；
+        可以连续排多次。例如 fail_next("sendMessage", 403, description="Forbidden: bot was blocked by the user")
+        """
+        payload: Dict[str, Any] = {
+            "ok": False,
+            "error_code": error_code,
+            "description": description or f"Too Many Requests: retry after {retry_after}",
+        }
+        if error_code == 429:
+            payload["parameters"] = {"retry_after": retry_after}
+        self._failures.append((method, chat_id, payload))
+
+    def respond(self, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """返回 (HTTP 状态码, 响应 JSON)。"""
+        for i, (failing, chat_id, payload) in enumerate(self._failures):
+            if failing != method:
+                continue
+            decoded = _decode_params(params)
+            if chat_id is not None and decoded.get("chat_id") != chat_id:
+                continue
+            del self._failures[i]
+            self.calls.append((time.perf_counter(), method, decoded))
+            return payload["error_code"], payload
+        return 200, {"ok": True, "result": self.handle(method, params)}
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        params = _decode_params(params)
+        self.calls.append((time.perf_counter(), method, params))
+        for fn in self._listeners:
+            fn(method, params)
+
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "sendDocument", "sendPhoto"):
+            return self._message(params)
+        if method == "editMessageText":
+            msg = self._message(params)
+            msg["message_id"] = params.get("message_id", msg["message_id"])
+            return msg
+        if method == "getUpdates":
+            return []
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        return True
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        chat_id = params.get("chat_id", 0)
+        msg: Dict[str, Any] = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "group"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            msg["text"] = str(params["text"])
+        return msg
+
+class FakeBotAPIServer:
+    """
+    极简 HTTP/1.1 server（支持 keep-alive），路径格式与官方一致：/bot<token>/<method>。
+    multipart 上传（sendDocument 等）只记录调用，不解析文件内容。
+    """
+    def __init__(self, api: FakeBotAPI, host: str = "127.0.0.1", port: int = 8081):
+        self.api = api
+        self.host = host
+        self.port = port
+        self._server: asyncio.base_events.Server | None = None
+        self._writers: set = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # keep-alive 连接要手动断开，否则 wait_closed 会一直等
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                method = path.rstrip("/").rsplit("/", 1)[-1].split("?", 1)[0]
+                ctype = headers.get("content-type", "")
+                if ctype.startswith("application/json"):
+                    params = json.loads(body or b"{}")
+                elif ctype.startswith("application/x-www-form-urlencoded"):
+                    params = dict(parse_qsl(body.decode("utf-8")))
+                else:
+                    params = {}
+
+                status, body_json = self.api.respond(method, params)
+                payload = json.dumps(body_json).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n".encode("latin-1")
+                    + b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except Exception:
+            logger.exception("FakeBotAPIServer request failed")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+class FakeRequest(BaseRequest):
+    """进程内的 PTB request 后端：请求直接交给 FakeBotAPI，不开 socket。测试 / dry-run 用。"""
+    def __init__(self, api: FakeBotAPI, latency_s: float = 0.0):
+        self.api = api
+        self.latency_s = latency_s
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> Tuple[int, bytes]:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        endpoint = url.rstrip("/").rsplit("/", 1)[-1]
+        params = request_data.json_parameters if request_data is not None else {}
+        status, payload = self.api.respond(endpoint, params)
+        return status, json.dumps(payload).encode("utf-8")
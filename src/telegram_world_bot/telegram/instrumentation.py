@@ -0,0 +1,118 @@
+"""
+把 metrics 挂到 Application 上（build_app 最后调用）：
+- 每个 handler 回调（包括 ConversationHandler 里的）的耗时和异常数，label 是回调的 __qualname__
+- 收到的 update 总数
+- 每个发往 Bot API 的请求（InstrumentedRequest 包在请求后端外面，不管有没有挂限速器）的耗时和错误数
+- 各组件已有的 stats() 注册成抓取时计算的 gauge
+"""
+import functools
+import time
+from typing import Any, Callable, Dict
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Application, BaseHandler, ConversationHandler, TypeHandler
+from telegram.request import BaseRequest, RequestData
+
+from src.telegram_world_bot import metrics
+
+HANDLER_SECONDS = metrics.histogram("bot_handler_duration_seconds", "Handler callback latency", ("handler",))
+HANDLER_ERRORS = metrics.counter("bot_handler_errors_total", "Handler callbacks that raised", ("handler",))
+UPDATES = metrics.counter("bot_updates_total", "Updates received")
+API_SECONDS = metrics.histogram("bot_api_request_duration_seconds", "Bot API call latency (per attempt)", ("endpoint",))
+API_ERRORS = metrics.counter("bot_api_errors_total", "Bot API calls that raised", ("endpoint", "error"))
+
+# 比所有业务 handler 都早，只计数
+COUNT_GROUP = -1000
+
+def _wrap(callback: Callable[..., Any]) -> Callable[..., Any]:
+    if getattr(callback, "__metrics_wrapped__", False):
+        return callback
+    name = getattr(callback, "__qualname__", type(callback).__name__)
+    seconds = HANDLER_SECONDS.labels(name)
+    errors = HANDLER_ERRORS.labels(name)
+
+    @functools.wraps(callback)
+    async def wrapped(update, context):
+        t0 = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - t0)
+
+    wrapped.__metrics_wrapped__ = True
+    return wrapped
+
+class InstrumentedRequest(BaseRequest):
+    """包一层请求后端：每次 post（包括限速器 429 之后的重试）计一次耗时，抛出的 TelegramError 按类型计数。"""
+
+    def __init__(self, inner: BaseRequest):
+        self.inner = inner
+        self._seconds: Dict[str, Any] = {}  # endpoint -> histogram child
+
+    @property
+    def read_timeout(self):
+        return self.inner.read_timeout
+
+    async def initialize(self) -> None:
+        await self.inner.initialize()
+
+    async def shutdown(self) -> None:
+        await self.inner.shutdown()
+
+    async def post(self, url: str, request_data: RequestData | None = None, *args, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        seconds = self._seconds.get(endpoint)
+        if seconds is None:
+            seconds = self._seconds[endpoint] = API_SECONDS.labels(endpoint)
+        t0 = time.perf_counter()
+        try:
+            return await self.inner.post(url, request_data, *args, **kwargs)
+        except TelegramError as e:
+            API_ERRORS.labels(endpoint, type(e).__name__).inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - t0)
+
+    async def do_request(self, *args, **kwargs):
+        # post 整个转给 inner，不会走到这里
+        return await self.inner.do_request(*args, **kwargs)
+
+def instrument_handler(handler: BaseHandler) -> None:
+    if isinstance(handler, ConversationHandler):
+        children = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            children.extend(state_handlers)
+        for child in children:
+            instrument_handler(child)
+        return
+    handler.callback = _wrap(handler.callback)
+
+async def _count_update(update: Update, context) -> None:
+    UPDATES.inc()
+
+def instrument_handlers(app: Application) -> None:
+    """所有 handler 都 add 完之后调用；重复调用不会包两层。"""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            if getattr(handler, "callback", None) is not _count_update:
+                instrument_handler(handler)
+    if not any(getattr(h, "callback", None) is _count_update for h in app.handlers.get(COUNT_GROUP, [])):
+        app.add_handler(TypeHandler(Update, _count_update), group=COUNT_GROUP)
+
+def register_component_stats(app: Application, registry: metrics.Registry = metrics.REGISTRY) -> None:
+    bot_data = app.bot_data
+    for key in ("event_sink", "session_store", "memory_store", "pipeline", "update_recorder"):
+        component = bot_data.get(key)
+        if component is not None and hasattr(component, "stats"):
+            registry.register_stats(f"bot_{key}", component.stats)
+    if "agents" in bot_data:
+        registry.register_stats("bot_agent_cache", bot_data["agents"].cache_stats)
+    rate_limiter = getattr(app.bot, "rate_limiter", None)
+    if rate_limiter is not None and hasattr(rate_limiter, "stats"):
+        registry.register_stats("bot_rate_limiter", rate_limiter.stats)
+    if hasattr(app.update_processor, "stats"):
+        registry.register_stats("bot_update_processor", app.update_processor.stats)
@@ -0,0 +1,285 @@
+"""
+出站限速：挂在 Application.builder().rate_limiter(...) 上，bot 发出的每个请求都先经过这里，
+handler 里照常 reply_text / send_message，不用改调用方式。
+
+- 全局令牌桶（默认 30 条/秒）+ 每个 chat 一个令牌桶（私聊 1 条/秒，群 / 频道 20 条/分钟）
+- 同一个 chat 的请求按 (priority, 到达顺序) 一个一个发：多段消息不会乱序，
+  高优先级（数字小）的插到同 chat 排队中的低优先级前面；全局令牌也按优先级发放
+- 收到 429：按 retry_after 暂停这个 chat（没有 chat_id 的请求暂停全局）再重试，最多 max_retries 次
+- 不带 chat_id 的请求（getUpdates、answerCallbackQuery 等）不限速
+
+调用方指定优先级：await bot.send_message(..., rate_limit_args={"priority": PRIORITY_BROADCAST})
+"""
+import asyncio
+import datetime as dt
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from src.telegram_world_bot import metrics
+from src.telegram_world_bot.metrics import LatencyStats
+from src.telegram_world_bot.config import RateLimitConfig
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_REPLY = 0  # 直接回复用户
+PRIORITY_DEFAULT = 5
+PRIORITY_BROADCAST = 10  # 群发 / 后台通知，让路给实时回复
+
+API_QUEUE_SECONDS = metrics.histogram("bot_api_queue_seconds", "Time a chat-bound request waited in the rate limiter")
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # 每秒补充的令牌数
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """还要等多少秒才有一个令牌；0 表示现在就有。"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class _Gate:
+    """
+    按 (priority, seq) 排队领令牌：只有队头能领，而且要等到桶里有令牌、也没在 429 暂停中。
+    exclusive=True（每个 chat 一个）时领到的人 release() 之前别人都不能领，保证同 chat 严格串行。
+    """
+    def __init__(self, bucket: TokenBucket, exclusive: bool):
+        self.bucket = bucket
+        self.exclusive = exclusive
+        self.waiting: List[Tuple[int, int]] = []  # 小顶堆
+        self.cond = asyncio.Condition()
+        self.busy = False
+        self.paused_until = 0.0
+
+    def delay(self, now: float) -> float:
+        return max(self.bucket.delay(now), self.paused_until - now)
+
+    def idle(self, now: float) -> bool:
+        return not self.busy and not self.waiting and self.paused_until <= now and self.bucket.full(now)
+
+    async def acquire(self, ticket: Tuple[int, int]) -> bool:
+        """返回这次是否被令牌桶 / 429 暂停挡过（排在别人后面不算）。"""
+        throttled = False
+        async with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    if self.busy or self.waiting[0] != ticket:
+                        await self.cond.wait()
+                        continue
+                    delay = self.delay(time.monotonic())
+                    if delay <= 0:
+                        break
+                    throttled = True
+                    try:
+                        # 等的过程中可能有更高优先级的排到队头，醒来重新检查
+                        await asyncio.wait_for(self.cond.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+                raise
+            heapq.heappop(self.waiting)
+            self.bucket.take(time.monotonic())
+            self.busy = self.exclusive
+            self.cond.notify_all()
+        return throttled
+
+    async def wait_pause(self) -> None:
+        """持有者（exclusive）在 429 之后原地等暂停结束再拿一个令牌，不让出位置。"""
+        delay = self.delay(time.monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.bucket.take(time.monotonic())
+
+    async def release(self) -> None:
+        async with self.cond:
+            self.busy = False
+            self.cond.notify_all()
+
+def _retry_after_s(value: Union[int, float, dt.timedelta]) -> float:
+    # PTB 22 的 RetryAfter.retry_after 可能是 int 也可能是 timedelta（看 PTB_TIMEDELTA 环境变量）
+    if isinstance(value, dt.timedelta):
+        return value.total_seconds()
+    return float(value)
+
+class OutboundRateLimiter(BaseRateLimiter[Dict[str, Any]]):
+    def __init__(
+        self,
+        global_rate: float = 30,
+        global_burst: float = 30,
+        private_rate: float = 1,
+        private_burst: float = 1,
+        group_rate: float = 20 / 60,
+        group_burst: float = 1,
+        max_retries: int = 3,
+        prune_every: int = 1000,
+        idle_ttl_s: float = 60,
+    ):
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.prune_every = prune_every
+        self.idle_ttl_s = idle_ttl_s
+
+        self._global = _Gate(TokenBucket(global_rate, global_burst), exclusive=False)
+        self._chats: Dict[Union[int, str], _Gate] = {}
+        self._last_used: Dict[Union[int, str], float] = {}
+        self._seq = itertools.count()
+        self._requests = 0
+
+        self._queue_latency = LatencyStats()
+        self.sent = 0
+        self.chat_waits = 0  # 被 chat 令牌桶挡住的次数
+        self.global_waits = 0  # 被全局令牌桶挡住的次数
+        self.retry_after = 0  # 收到的 429 次数
+        self.retry_after_s = 0.0
+        self.retries_exhausted = 0
+
+    @classmethod
+    def from_config(cls, config: RateLimitConfig) -> "OutboundRateLimiter":
+        return cls(
+            global_rate=config.global_per_s,
+            global_burst=config.global_per_s,
+            private_rate=config.private_per_s,
+            group_rate=config.group_per_min / 60,
+            max_retries=config.max_retries,
+        )
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _chat_gate(self, chat_id: Union[int, str]) -> _Gate:
+        gate = self._chats.get(chat_id)
+        if gate is None:
+            # 负数 id 是群 / 超级群 / 频道，@username 形式也只可能是群或频道
+            group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = (
+                TokenBucket(self.group_rate, self.group_burst)
+                if group
+                else TokenBucket(self.private_rate, self.private_burst)
+            )
+            gate = self._chats[chat_id] = _Gate(bucket, exclusive=True)
+        return gate
+
+    def _prune(self, now: float) -> None:
+        # 桶已经满、没人在排队的 chat 状态丢掉，下次重新建（结果一样）
+        for chat_id, gate in list(self._chats.items()):
+            if now - self._last_used.get(chat_id, 0.0) > self.idle_ttl_s and gate.idle(now):
+                del self._chats[chat_id]
+                self._last_used.pop(chat_id, None)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._send_unlimited(callback, args, kwargs, endpoint)
+
+        priority = int((rate_limit_args or {}).get("priority", PRIORITY_DEFAULT))
+        enqueued = time.monotonic()
+        self._requests += 1
+        if self._requests % self.prune_every == 0:
+            self._prune(enqueued)
+
+        gate = self._chat_gate(chat_id)
+        # 同 chat 按优先级排队；全局令牌在拿到 chat 之后再排，用同一个 ticket
+        ticket = (priority, next(self._seq))
+        if await gate.acquire(ticket):
+            self.chat_waits += 1
+        try:
+            attempt = 0
+            while True:
+                if await self._global.acquire(ticket):
+                    self.global_waits += 1
+                if attempt == 0:
+                    queued_s = time.monotonic() - enqueued
+                    self._queue_latency.add(queued_s * 1000)
+                    API_QUEUE_SECONDS.observe(queued_s)
+                try:
+                    result = await callback(*args, **kwargs)
+                except RetryAfter as e:
+                    attempt += 1
+                    wait_s = self._on_retry_after(e, endpoint, chat_id, attempt)
+                    gate.paused_until = max(gate.paused_until, time.monotonic() + wait_s)
+                    await gate.wait_pause()
+                    continue
+                self.sent += 1
+                return result
+        finally:
+            self._last_used[chat_id] = time.monotonic()
+            await gate.release()
+
+    async def _send_unlimited(self, callback, args, kwargs, endpoint: str):
+        attempt = 0
+        while True:
+            delay = self._global.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                attempt += 1
+                wait_s = self._on_retry_after(e, endpoint, None, attempt)
+                self._global.paused_until = max(self._global.paused_until, time.monotonic() + wait_s)
+
+    def _on_retry_after(self, e: RetryAfter, endpoint: str, chat_id, attempt: int) -> float:
+        wait_s = _retry_after_s(e.retry_after)
+        self.retry_after += 1
+        self.retry_after_s += wait_s
+        if attempt > self.max_retries:
+            self.retries_exhausted += 1
+            raise e
+        logger.warning(
+            "429 on %s (chat=%s): retry after %.1fs (attempt %d/%d)",
+            endpoint, chat_id, wait_s, attempt, self.max_retries,
+        )
+        return wait_s
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_latency": self._queue_latency.snapshot(),
+            "sent": self.sent,
+            "chat_waits": self.chat_waits,
+            "global_waits": self.global_waits,
+            "retry_after": self.retry_after,
+            "retry_after_s": round(self.retry_after_s, 3),
+            "retries_exhausted": self.retries_exhausted,
+            "chats": len(self._chats),
+            "queued_global": len(self._global.waiting),
+        }
@@ -0,0 +1,201 @@
+"""
+把线上收到的 update 脱敏后追加写进 gzip 文件（一行一个 JSON），给 scripts/replay_updates.py 回放做性能回归。
+
+- build_app 里按 RECORD_UPDATES 开关挂一个 TypeHandler（RECORD_GROUP，在业务 handler 之前），默认关闭
+- 文件只追加：每次启动追加一个新的 gzip member，gzip.open 能连续读出来；
+  后台任务（post_init 里 start()）每秒 Z_SYNC_FLUSH 一次，没有新 update 也照样 flush，进程被杀最多丢最后一秒；
+  读的时候跳过被截断的 member 的残尾
+- 脱敏：user / chat id 用带盐 HMAC 映射成稳定的假 id（同一次录制里同一个人还是同一个 id，回放时会话照样连得上）；
+  名字 / username 换成假名；命令和键盘按钮文字原样保留，其余文字替换成 x：
+  按 UTF-16 码元数替换（Telegram 的 entities 偏移按 UTF-16 算），emoji 之后的 entities 偏移也对得上；
+  entities 只留 type / offset / length（text_link 的 url、text_mention 的 user 都丢掉）；
+  message 里白名单以外的字段（联系人、位置、文件 id 等）全部丢掉
+"""
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# 在 metrics 计数（-1000）之后、所有业务 handler 之前
+RECORD_GROUP = -900
+
+# 流程里键盘上的按钮：回放要靠原文走 ConversationHandler 的分支
+KEEP_TEXTS = frozenset({"新用户模式", "老用户迁移", "确认提交", "取消"})
+
+_MESSAGE_KEYS = ("message_id", "date", "edit_date", "chat", "from", "text", "entities", "reply_to_message")
+_MESSAGE_UPDATE_KEYS = ("message", "edited_message")
+_ENTITY_KEYS = ("type", "offset", "length")
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+def _mask_text(text: str) -> str:
+    if text in KEEP_TEXTS:
+        return text
+    if text.startswith("/"):
+        # 命令本身保留，参数打码
+        command, sep, args = text.partition(" ")
+        return command + sep + "x" * _utf16_len(args)
+    return "x" * _utf16_len(text)
+
+class Anonymizer:
+    def __init__(self, salt: bytes):
+        self._salt = salt
+        self._ids: Dict[int, int] = {}
+
+    def id(self, real: int) -> int:
+        fake = self._ids.get(real)
+        if fake is None:
+            digest = hmac.new(self._salt, str(abs(real)).encode(), hashlib.sha256).digest()
+            # 40 位够用且不会和真实 id 撞上同一个数量级；群（负数 id）保留符号
+            fake = int.from_bytes(digest[:5], "big") | (1 << 40)
+            fake = self._ids[real] = -fake if real < 0 else fake
+        return fake
+
+    def _user(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        fake = self.id(user["id"])
+        return {"id": fake, "is_bot": user.get("is_bot", False), "first_name": f"u{fake}", "username": f"user{fake}"}
+
+    def _chat(self, chat: Dict[str, Any]) -> Dict[str, Any]:
+        fake = self.id(chat["id"])
+        return {"id": fake, "type": chat.get("type", "private")}
+
+    def message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for key in _MESSAGE_KEYS:
+            if key not in message:
+                continue
+            value = message[key]
+            if key == "chat":
+                value = self._chat(value)
+            elif key == "from":
+                value = self._user(value)
+            elif key == "text":
+                value = _mask_text(value)
+            elif key == "entities":
+                # text_link 的 url、text_mention 的 user、custom_emoji_id 等都可能带隐私：只留位置和类型
+                value = [{k: e[k] for k in _ENTITY_KEYS if k in e} for e in value]
+            elif key == "reply_to_message":
+                value = self.message(value)
+            out[key] = value
+        return out
+
+    def update(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"update_id": data["update_id"]}
+        for key in _MESSAGE_UPDATE_KEYS:
+            if key in data:
+                out[key] = self.message(data[key])
+        return out
+
+class UpdateRecorder:
+    def __init__(self, path: str, salt: str = "", flush_interval_s: float = 1.0):
+        self.path = Path(path)
+        # 不配盐就每次启动随机一个：跨重启同一个人会变成不同的假 id，换来更难反查
+        self.anonymizer = Anonymizer(salt.encode() if salt else os.urandom(16))
+        self.flush_interval_s = flush_interval_s
+        self.recorded = 0
+        self._fp: Optional[gzip.GzipFile] = None
+        self._last_flush = 0.0
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="update_recorder_flush")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            self.flush()
+
+    def _open(self) -> gzip.GzipFile:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._last_flush = time.monotonic()
+        return gzip.open(self.path, "ab")
+
+    async def record(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """TypeHandler 回调：只写文件，不影响后面 handler 的处理。"""
+        try:
+            self.write(update.to_dict())
+        except Exception:
+            logger.exception("failed to record update %s", getattr(update, "update_id", None))
+
+    def write(self, data: Dict[str, Any]) -> None:
+        if self._fp is None:
+            self._fp = self._open()
+        line = {"t": round(time.time(), 3), "update": self.anonymizer.update(data)}
+        self._fp.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        self.recorded += 1
+        self._dirty = True
+        # 连续来 update 时不用等定时任务
+        if time.monotonic() - self._last_flush >= self.flush_interval_s:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._fp is not None and self._dirty:
+            self._fp.flush(zlib.Z_SYNC_FLUSH)
+            self._dirty = False
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        # flush 是同步的，cancel 不会打断写到一半的数据
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+            logger.info("update recorder: %d updates written to %s", self.recorded, self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"recorded": self.recorded}
+
+_GZIP_MAGIC = b"\x1f\x8b\x08"
+
+def _members(data: bytes) -> Iterator[bytes]:
+    """逐个解压 gzip member。某个 member 被截断（进程被杀后重启又追加了新 member）时，
+    留下它已经 flush 出来的部分，从下一个 gzip 头继续。"""
+    pos = 0
+    while pos < len(data):
+        d = zlib.decompressobj(wbits=31)
+        try:
+            chunk = d.decompress(data[pos:])
+        except zlib.error:
+            chunk = None
+        if chunk is not None and d.eof:
+            yield chunk
+            pos = len(data) - len(d.unused_data)
+            continue
+        nxt = data.find(_GZIP_MAGIC, pos + 1)
+        if chunk is None:
+            # 后面追加的 member 头被当成了压缩数据：只解到下一个 gzip 头为止
+            d = zlib.decompressobj(wbits=31)
+            try:
+                chunk = d.decompress(data[pos:nxt if nxt >= 0 else len(data)])
+            except zlib.error:
+                chunk = b""
+        # 截断的 member：能解出多少算多少，最后一行不完整的丢掉
+        yield chunk[: chunk.rfind(b"\n") + 1]
+        logger.warning("recording: truncated gzip member at byte %d", pos)
+        if nxt < 0:
+            return
+        pos = nxt
+
+def read_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """按顺序读出 {"t": 时间戳, "update": {...}}。"""
+    for member in _members(Path(path).read_bytes()):
+        for raw in member.splitlines():
+            if raw:
+                yield json.loads(raw)
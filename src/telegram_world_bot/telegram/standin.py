@@ -0,0 +1,40 @@
+"""
+本地替身环境：真正的 build_app()，只把 Bot API 换成进程内的 FakeBotAPI、MySQL 换成 workdir 里的 SQLite。
+scripts.bench_onboarding / scripts.replay_updates 共用。
+"""
+import dataclasses
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from telegram.ext import Application
+
+from src.telegram_world_bot.config import MetricsConfig, RateLimitConfig, Settings, UserStoreConfig
+from src.telegram_world_bot.db.migrations import migrate
+from src.telegram_world_bot.telegram.build_app import build_app
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+
+def build_standin_app(workdir: Path, api: FakeBotAPI, **overrides) -> Application:
+    """overrides 直接覆盖 Settings 的字段，例如 concurrent_updates=16。"""
+    db_path = workdir / "standin.db"
+    migrate(create_engine(f"sqlite:///{db_path}"))
+    settings = Settings(
+        bot_token="123456:STANDIN",
+        log_level="WARNING",
+        user_store=UserStoreConfig(path=str(workdir / "users.json")),
+        # 出站限速（私聊 1 条/秒）和 /metrics 端口默认关掉，需要时用 overrides 打开
+        rate_limit=RateLimitConfig(enabled=False),
+        metrics=MetricsConfig(enabled=False),
+        agents_warmup=False,
+    )
+    settings = dataclasses.replace(settings, **overrides)
+    return build_app(settings, request=FakeRequest(api), db_url=f"sqlite+aiosqlite:///{db_path}")
+
+async def start_standin(app: Application) -> None:
+    # 不走 run_polling：手动做它启动时做的事，agent 在这里同步预热，不算进后面的计时
+    await app.initialize()
+    await app.post_init(app)
+    await app.bot_data["agents"].warm_up()
+
+async def stop_standin(app: Application) -> None:
+    await app.post_shutdown(app)
+    await app.shutdown()
@@ -0,0 +1,70 @@
+"""
+python main.py --profile-startup：按真实启动流程走一遍（import → build_app → initialize → post_init），
+打印每一步的耗时，然后关掉退出，不开始收 update。会真的调用 getMe 和连 DB。
+"""
+import asyncio
+import dataclasses
+import importlib
+import time
+from typing import List, Tuple
+
+# 按顺序逐个 import，每一项计到的是它新增的耗时（前面已经 import 过的模块不重复算）
+PROFILE_IMPORTS = (
+    "telegram.ext",
+    "src.telegram_world_bot.config",
+    "src.telegram_world_bot.telegram.build_app",
+    "sqlalchemy.ext.asyncio",
+    "src.telegram_world_bot.db.dao",
+)
+
+def _ms(t0: float) -> float:
+    return (time.perf_counter() - t0) * 1000
+
+async def _initialize(app, rows: List[Tuple[str, float]]) -> None:
+    t0 = time.perf_counter()
+    await app.initialize()
+    rows.append(("app.initialize (getMe)", _ms(t0)))
+
+    t0 = time.perf_counter()
+    await app.post_init(app)
+    rows.append(("post_init", _ms(t0)))
+    rows.append(("  schema_check", app.bot_data["startup_timings"]["post_init.schema_check"]))
+
+    # 正常启动时 agent 在后台预热，不挡第一条 update；这里单独列出来
+    registry = app.bot_data["agents"]
+    t0 = time.perf_counter()
+    await registry.warm_up()
+    rows.append(("agents warm-up (background)", _ms(t0)))
+    for row in registry.load_report():
+        rows.append((f"  agent {row['name']}", row["import_ms"] + row["init_ms"]))
+
+    await app.post_shutdown(app)
+    await app.shutdown()
+
+def profile_startup() -> None:
+    total_t0 = time.perf_counter()
+    rows: List[Tuple[str, float]] = []
+    for module in PROFILE_IMPORTS:
+        t0 = time.perf_counter()
+        importlib.import_module(module)
+        rows.append((f"import {module}", _ms(t0)))
+
+    from src.telegram_world_bot.config import load_settings
+    from src.telegram_world_bot.telegram.build_app import build_app
+    # post_init 不起后台预热任务：下面单独 await 一次计时，否则会预热两遍，关闭时那个任务还没跑完
+    settings = dataclasses.replace(load_settings(), agents_warmup=False)
+    t0 = time.perf_counter()
+    app = build_app(settings)
+    rows.append(("build_app", _ms(t0)))
+    for name, ms in app.bot_data["startup_timings"].items():
+        if name != "build_app":
+            rows.append((f"  {name}", ms))
+
+    asyncio.run(_initialize(app, rows))
+    # 后台预热不算在"能收 update 之前"的时间里
+    ready_ms = _ms(total_t0) - sum(ms for name, ms in rows if name.startswith("agents warm-up"))
+
+    print("startup profile:")
+    for name, ms in rows:
+        print(f"  {name:<48} {ms:9.1f}ms")
+    print(f"  {'ready to receive updates':<48} {ready_ms:9.1f}ms")
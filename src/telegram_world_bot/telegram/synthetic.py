@@ -0,0 +1,22 @@
+"""
+构造合成 update（Bot API 原始 JSON 结构），给 webhook 压测 / 吞吐基准用。
+"""
+import time
+from typing import Any, Dict
+
+def make_text_update(update_id: int, user_id: int, text: str, chat_id: int | None = None) -> Dict[str, Any]:
+    chat_id = user_id if chat_id is None else chat_id
+    message: Dict[str, Any] = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group", "first_name": f"u{user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}", "username": f"user{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split(" ", 1)[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+# 一个新用户走完 onboarding 的三条消息：(步骤名, 文本)
+ONBOARDING_STEPS = (("start", "/start"), ("mode", "新用户模式"), ("confirm", "确认提交"))
@@ -0,0 +1,133 @@
+"""
+并发处理 update，但同一个用户的 update 严格按到达顺序串行处理。
+ConversationHandler（flows/onboarding）依赖这个顺序：同一用户的状态迁移不能并发。
+"""
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Deque, Dict, Hashable, List, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.telegram_world_bot.profiling import SlowUpdateTracer
+
+@dataclass(slots=True)
+class _KeyState:
+    lock: asyncio.Lock
+    pending: int = 0
+
+def update_key(update: object) -> Hashable | None:
+    """按用户排队；没有用户（频道消息等）退化成按 chat 排队；都没有就不限制顺序。"""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return ("user", update.effective_user.id)
+        if update.effective_chat is not None:
+            return ("chat", update.effective_chat.id)
+    return None
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    max_concurrent_updates：真正同时在跑 handler 的 update 数。
+    max_pending：进入 processor（含排队中的）update 总数上限，交给 PTB 基类的信号量控制。
+    注意基类信号量在 per-user 锁外面，所以它必须比并发数大得多，
+    否则一个用户连发的消息会占满名额、把别的用户堵住。
+    slow_tracer：可选的 SlowUpdateTracer，每个 update 处理前后各调一次。
+    """
+    def __init__(
+        self,
+        max_concurrent_updates: int,
+        max_pending: int = 10_000,
+        wait_samples: int = 2048,
+        slow_tracer: SlowUpdateTracer | None = None,
+    ):
+        super().__init__(max(max_pending, max_concurrent_updates))
+        self.max_workers = max_concurrent_updates
+        self._workers = asyncio.Semaphore(max_concurrent_updates)
+        self._keys: Dict[Hashable, _KeyState] = {}
+        self._waits: Deque[float] = deque(maxlen=wait_samples)
+        self.slow_tracer = slow_tracer
+
+        self.processed = 0
+        self.running = 0
+        self.max_key_depth = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    async def initialize(self) -> None:
+        if self.slow_tracer is not None:
+            self.slow_tracer.start()
+
+    async def shutdown(self) -> None:
+        if self.slow_tracer is not None:
+            self.slow_tracer.stop()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        arrived = time.perf_counter()
+        key = update_key(update)
+        if key is None:
+            await self._run(arrived, coroutine, update, key)
+            return
+
+        # 这里到 lock.acquire 之间不能有 await，否则同一用户的到达顺序可能被打乱
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState(lock=asyncio.Lock())
+        state.pending += 1
+        self.max_key_depth = max(self.max_key_depth, state.pending)
+        try:
+            async with state.lock:
+                await self._run(arrived, coroutine, update, key)
+        finally:
+            state.pending -= 1
+            if state.pending == 0:
+                del self._keys[key]
+
+    async def _run(self, arrived: float, coroutine: Awaitable[Any], update: object, key: Hashable | None) -> None:
+        async with self._workers:
+            wait = time.perf_counter() - arrived
+            self._waits.append(wait)
+            self.total_wait_s += wait
+            self.max_wait_s = max(self.max_wait_s, wait)
+            self.running += 1
+            # 排队时间不算：从真正开始处理算起
+            token = self.slow_tracer.begin(getattr(update, "update_id", None), key) if self.slow_tracer else None
+            try:
+                await coroutine
+            finally:
+                if token is not None:
+                    self.slow_tracer.end(token)
+                self.running -= 1
+                self.processed += 1
+
+    # ---------- 指标 ----------
+    def key_depths(self, top: int = 10) -> List[Tuple[Hashable, int]]:
+        """当前排队最深的 key（含正在处理的那一条）。"""
+        depths = [(k, s.pending) for k, s in self._keys.items()]
+        depths.sort(key=lambda x: x[1], reverse=True)
+        return depths[:top]
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p / 100 * len(waits)))] * 1000
+
+        stats = {
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "pending": sum(s.pending for s in self._keys.values()),
+            "active_keys": len(self._keys),
+            "max_key_depth": self.max_key_depth,
+            "processed": self.processed,
+            "wait_ms_avg": round(self.total_wait_s / self.processed * 1000, 3) if self.processed else 0.0,
+            "wait_ms_p50": round(pct(50), 3),
+            "wait_ms_p99": round(pct(99), 3),
+            "wait_ms_max": round(self.max_wait_s * 1000, 3),
+        }
+        if self.slow_tracer is not None:
+            stats["slow_updates"] = self.slow_tracer.slow
+        return stats
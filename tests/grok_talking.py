@@ -2,12 +2,15 @@
 from __future__ import annotations
 
 import json
+import mmap
 import os
 import re
+import struct
+import threading
 from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
@@ -60,51 +63,317 @@ def build_llm() -> ChatXAI:
     return ChatXAI(model=model, api_key=api_key, temperature=0.3)
 
 
+# -----------------------
+# Offset index（N.idx）
+# 每条日志一条定长记录：<字节偏移 uint64><role 代码 uint8>，
+# 记录数 = 文件大小 / 9，续聊时只需要读最后 K 轮，不用解析整个 jsonl。
+# 记录在 index 里的位置就是它的 seq（编辑记录靠 seq 指向目标）。
+# -----------------------
+IDX_RECORD = struct.Struct("<QB")
+ROLE_CODES = {"meta": 1, "system": 2, "user": 3, "assistant": 4, "error": 5, "edit": 6}
+DEAD_FLAG = 0x80  # 被 delete 编辑记录删掉的行，role 代码上打这个标记
+EDIT_COMPACT_THRESHOLD = 100  # 编辑记录超过这么多条就整理一次文件
+_ROLE_RE = re.compile(rb'"role":\s*"(\w+)"')
+_INDEX_CHECKED: set = set()  # 本进程里已经校验过、由本进程维护的 index
+_LOG_LOCKS: Dict[Path, threading.RLock] = {}
+_LOG_LOCKS_GUARD = threading.Lock()
+
+
+def index_path(fp: Path) -> Path:
+    return fp.with_suffix(".idx")
+
+
+def log_lock(fp: Path) -> threading.RLock:
+    """同一个日志文件的写入 / compaction 互斥（compaction 在后台线程跑）。"""
+    key = fp.resolve()
+    with _LOG_LOCKS_GUARD:
+        lock = _LOG_LOCKS.get(key)
+        if lock is None:
+            lock = _LOG_LOCKS[key] = threading.RLock()
+        return lock
+
+
+def _role_code(role: str) -> int:
+    return ROLE_CODES.get(role, 0)
+
+
+def _is_live(code: int, role: str) -> bool:
+    return code == ROLE_CODES[role]
+
+
+def rebuild_index(fp: Path) -> None:
+    """用 mmap 扫描换行符重建 index；role 只用正则从行首截取，只有编辑记录才完整解析 JSON。"""
+    out = bytearray()
+    if fp.exists() and fp.stat().st_size > 0:
+        with fp.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos, size = 0, len(mm)
+            while pos < size:
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    end = size
+                if end > pos:
+                    m = _ROLE_RE.search(mm, pos, min(end, pos + 256))
+                    role = m.group(1).decode("ascii") if m else ""
+                    out += IDX_RECORD.pack(pos, _role_code(role))
+                    if role == "edit":
+                        _mark_dead_in(out, mm[pos:end])
+                pos = end + 1
+    tmp = index_path(fp).with_suffix(".idx.tmp")
+    tmp.write_bytes(bytes(out))
+    os.replace(tmp, index_path(fp))
+    _INDEX_CHECKED.add(fp.resolve())
+
+
+def _mark_dead_in(index: bytearray, raw: bytes) -> None:
+    try:
+        obj = json.loads(raw)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return
+    target = obj.get("target")
+    if obj.get("op") == "delete" and isinstance(target, int) and 0 <= target < len(index) // IDX_RECORD.size:
+        index[target * IDX_RECORD.size + 8] |= DEAD_FLAG
+
+
+def ensure_index(fp: Path) -> None:
+    """index 缺失或和 jsonl 对不上（比如被别的程序改过）就重建；每个文件每个进程只校验一次。"""
+    key = fp.resolve()
+    if key in _INDEX_CHECKED:
+        return
+    ip = index_path(fp)
+    ok = False
+    if ip.exists() and fp.exists():
+        isize = ip.stat().st_size
+        fsize = fp.stat().st_size
+        if isize % IDX_RECORD.size == 0:
+            if isize == 0:
+                ok = fsize == 0
+            else:
+                with ip.open("rb") as f:
+                    f.seek(isize - IDX_RECORD.size)
+                    last_offset, _ = IDX_RECORD.unpack(f.read(IDX_RECORD.size))
+                with fp.open("rb") as f:
+                    f.seek(last_offset)
+                    tail = f.read()
+                ok = tail.endswith(b"\n") and tail.count(b"\n") == 1
+    if ok:
+        _INDEX_CHECKED.add(key)
+    else:
+        if fp.exists() and fp.stat().st_size > 0:
+            with fp.open("r+b") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # 崩溃留下的半截行后面补个换行，别让下一条追加的记录跟它粘在一起
+                    f.write(b"\n")
+        rebuild_index(fp)
+
+
+def read_index(fp: Path) -> List[Tuple[int, int]]:
+    ensure_index(fp)
+    data = index_path(fp).read_bytes()
+    return list(IDX_RECORD.iter_unpack(data))
+
+
+def count_log_records(fp: Path) -> int:
+    """O(1)：直接由 index 文件大小算出日志条数（含编辑记录和已删除的行）。"""
+    ensure_index(fp)
+    return index_path(fp).stat().st_size // IDX_RECORD.size
+
+
+def _read_records(
+    fp: Path, records: List[Tuple[int, int]], first: int, stop: Optional[int] = None
+) -> Tuple[List[int], List[dict]]:
+    """按 index 读 first <= seq < stop 的行（一次 seek + read），跳过已删除的行，返回 (seqs, lines)。"""
+    stop = len(records) if stop is None else min(stop, len(records))
+    seqs: List[int] = []
+    out: List[dict] = []
+    if first >= stop:
+        return seqs, out
+    base = records[first][0]
+    with fp.open("rb") as f:
+        f.seek(base)
+        blob = f.read(records[stop][0] - base) if stop < len(records) else f.read()
+    for seq in range(first, stop):
+        offset, code = records[seq]
+        if code & DEAD_FLAG:
+            continue
+        end = records[seq + 1][0] if seq + 1 < len(records) else len(blob) + base
+        raw = blob[offset - base:end - base].strip()
+        if not raw:
+            continue
+        try:
+            out.append(json.loads(raw))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            # 崩溃时最后一行可能只写了一半（可能正好截断在一个中文字符中间）
+            continue
+        seqs.append(seq)
+    return seqs, out
+
+
+def read_tail_lines(fp: Path, turns: int) -> List[dict]:
+    """
+    只读续聊需要的部分：最后一条 system（系统提示词） + 最后 turns 个 user 开始到文件末尾。
+    返回的行已经应用过编辑记录。
+    """
+    if not fp.exists():
+        return []
+    with log_lock(fp):
+        records = read_index(fp)
+        if not records:
+            return []
+
+        start = 0
+        seen = 0
+        for i in range(len(records) - 1, -1, -1):
+            if _is_live(records[i][1], "user"):
+                seen += 1
+                if seen == turns:
+                    start = i
+                    break
+
+        system_seq = None
+        for i in range(start - 1, -1, -1):
+            if _is_live(records[i][1], "system"):
+                system_seq = i
+                break
+
+        out: List[dict] = []
+        if system_seq is not None:
+            _, head = _read_records(fp, records, system_seq, system_seq + 1)
+            out.extend(head)
+        seqs, lines = _read_records(fp, records, start)
+        out.extend(apply_edit_records(lines, seqs))
+        return out
+
+
+# -----------------------
+# Edit records
+# 刷新 / 重写消息 不再重写整个文件，而是追加一条 role=edit 的记录：
+#   {"role": "edit", "op": "replace", "target": seq, "content": 新内容}
+#   {"role": "edit", "op": "delete", "target": seq}
+# 读的时候由 apply_edit_records 应用；积累多了由 compact_log 整理掉。
+# -----------------------
+def apply_edit_records(lines: List[dict], seqs: Optional[List[int]] = None) -> List[dict]:
+    """应用编辑记录并去掉它们。seqs 为 None 时按行号当 seq；已经应用过的列表再调一次不变。"""
+    if seqs is None:
+        seqs = list(range(len(lines)))
+    replaced: Dict[int, dict] = {}
+    deleted: set = set()
+    for obj in lines:
+        if obj.get("role") != "edit":
+            continue
+        if obj.get("op") == "delete":
+            deleted.add(obj.get("target"))
+        elif obj.get("op") == "replace":
+            replaced[obj.get("target")] = obj
+
+    out: List[dict] = []
+    for seq, obj in zip(seqs, lines):
+        if obj.get("role") == "edit" or seq in deleted:
+            continue
+        edit = replaced.get(seq)
+        if edit is not None:
+            obj = {**obj, "ts_utc": edit.get("ts_utc", obj.get("ts_utc")), "content": edit.get("content", "")}
+        out.append(obj)
+    return out
+
+
+def _append_line(fp: Path, obj: dict) -> int:
+    """追加一行并写 index，返回新行的 seq。调用方持有 log_lock。"""
+    ensure_index(fp)
+    data = (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+    with fp.open("ab") as f:
+        offset = f.tell()
+        f.write(data)
+    ip = index_path(fp)
+    with ip.open("ab") as f:
+        f.write(IDX_RECORD.pack(offset, _role_code(obj.get("role", ""))))
+        return f.tell() // IDX_RECORD.size - 1
+
+
+def _append_edit(fp: Path, op: str, target: int, content: str = "") -> None:
+    _append_line(fp, {"ts_utc": utc_now_iso(), "role": "edit", "op": op, "target": target, "content": content})
+    if op == "delete":
+        # 原地给目标行的 role 代码打删除标记，tail 读取 / 找上一轮时直接跳过
+        with index_path(fp).open("r+b") as f:
+            f.seek(target * IDX_RECORD.size + 8)
+            code = f.read(1)[0]
+            f.seek(target * IDX_RECORD.size + 8)
+            f.write(bytes([code | DEAD_FLAG]))
+
+
+def _last_live(records: List[Tuple[int, int]], role: str, after: int = -1) -> Optional[int]:
+    for i in range(len(records) - 1, after, -1):
+        if _is_live(records[i][1], role):
+            return i
+    return None
+
+
+def count_edit_records(fp: Path) -> int:
+    return sum(1 for _, code in read_index(fp) if code == ROLE_CODES["edit"])
+
+
+def compact_log(fp: Path) -> int:
+    """把编辑记录应用进文件本身：原子重写 + 重建 index。返回去掉的行数。"""
+    with log_lock(fp):
+        records = read_index(fp)
+        seqs, lines = _read_records(fp, records, 0)
+        kept = apply_edit_records(lines, seqs)
+        write_log_lines(fp, kept)
+        return len(records) - len(kept)
+
+
+def maybe_compact_log(fp: Path, threshold: int = EDIT_COMPACT_THRESHOLD) -> int:
+    """编辑记录超过 threshold 才整理；适合丢到后台线程里跑（asyncio.to_thread）。"""
+    if not fp.exists() or count_edit_records(fp) < threshold:
+        return 0
+    return compact_log(fp)
+
+
 # -----------------------
 # Log file helpers
 # -----------------------
 def append_log(fp: Path, role: str, content: str) -> None:
     line = LogLine(ts_utc=utc_now_iso(), role=role, content=content)
-    with fp.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(asdict(line), ensure_ascii=False) + "\n")
+    with log_lock(fp):
+        _append_line(fp, asdict(line))
 
 
 def read_log_lines(fp: Path) -> List[dict]:
+    """整个会话（已应用编辑记录）。"""
     if not fp.exists():
         return []
-    out: List[dict] = []
-    with fp.open("r", encoding="utf-8") as f:
-        for raw in f:
-            raw = raw.strip()
-            if not raw:
-                continue
-            try:
-                out.append(json.loads(raw))
-            except json.JSONDecodeError:
-                continue
-    return out
+    with log_lock(fp):
+        seqs, lines = _read_records(fp, read_index(fp), 0)
+    return apply_edit_records(lines, seqs)
 
 
 def write_log_lines(fp: Path, lines: List[dict]) -> None:
-    with fp.open("w", encoding="utf-8") as f:
-        for obj in lines:
-            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+    tmp = fp.with_name(fp.name + ".tmp")
+    with log_lock(fp):
+        with tmp.open("w", encoding="utf-8") as f:
+            for obj in lines:
+                f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, fp)
+        rebuild_index(fp)
 
 
 def replace_last_assistant_log(fp: Path, new_content: str) -> None:
-    lines = read_log_lines(fp)
-    for i in range(len(lines) - 1, -1, -1):
-        if lines[i].get("role") == "assistant":
-            lines[i]["ts_utc"] = utc_now_iso()
-            lines[i]["content"] = new_content
-            write_log_lines(fp, lines)
+    with log_lock(fp):
+        target = _last_live(read_index(fp), "assistant")
+        if target is None:
+            append_log(fp, "assistant", new_content)
             return
-    append_log(fp, "assistant", new_content)
+        _append_edit(fp, "replace", target, new_content)
 
 
 def clear_all_logs(fp: Path) -> None:
     fp.parent.mkdir(parents=True, exist_ok=True)
-    fp.write_text("", encoding="utf-8")
+    with log_lock(fp):
+        fp.write_text("", encoding="utf-8")
+        index_path(fp).write_bytes(b"")
+        _INDEX_CHECKED.add(fp.resolve())
 
 
 def write_session_header(fp: Path, system_prompt: str) -> None:
@@ -117,34 +386,20 @@ def delete_last_turn_from_log(fp: Path) -> bool:
     删除“上一轮对话”：最后出现的 user 以及其后的最后一个 assistant（如果存在）。
     返回是否成功删除。
     """
-    lines = read_log_lines(fp)
-    if not lines:
-        return False
-
-    # 找最后一个 user 的位置
-    last_user_idx = None
-    for i in range(len(lines) - 1, -1, -1):
-        if lines[i].get("role") == "user":
-            last_user_idx = i
-            break
-    if last_user_idx is None:
+    if not fp.exists():
         return False
+    with log_lock(fp):
+        records = read_index(fp)
+        last_user = _last_live(records, "user")
+        if last_user is None:
+            return False
+        # 在 last_user 之后找最后一个 assistant（一般紧跟着，但容错处理）
+        last_assistant = _last_live(records, "assistant", after=last_user)
 
-    # 在 last_user_idx 之后，找最后一个 assistant（一般紧跟着，但容错处理）
-    last_assistant_idx = None
-    for j in range(len(lines) - 1, last_user_idx, -1):
-        if lines[j].get("role") == "assistant":
-            last_assistant_idx = j
-            break
-
-    # 只删 user + assistant（若 assistant 不存在，就只删 user）
-    to_remove = {last_user_idx}
-    if last_assistant_idx is not None:
-        to_remove.add(last_assistant_idx)
-
-    new_lines = [ln for k, ln in enumerate(lines) if k not in to_remove]
-    write_log_lines(fp, new_lines)
-    return True
+        _append_edit(fp, "delete", last_user)
+        if last_assistant is not None:
+            _append_edit(fp, "delete", last_assistant)
+        return True
 
 
 # -----------------------
@@ -210,7 +465,7 @@ def extract_system_prompt(lines: List[dict]) -> str:
 
 def rebuild_messages_from_logs(lines: List[dict], system_prompt: str) -> List[BaseMessage]:
     msgs: List[BaseMessage] = [SystemMessage(content=system_prompt)]
-    for obj in lines:
+    for obj in apply_edit_records(lines):
         role = obj.get("role")
         content = obj.get("content")
         if not isinstance(content, str):
@@ -229,7 +484,7 @@ def print_full_chat(lines: List[dict]) -> None:
         print("=========================\n")
         return
 
-    for obj in lines:
+    for obj in apply_edit_records(lines):
         role = obj.get("role", "unknown")
         content = obj.get("content", "")
         if role in ("meta", "error"):
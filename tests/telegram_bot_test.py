@@ -1,16 +1,21 @@
 # 作者：Alex
 # 2026/2/2 00:11
 # tests/grok_talking_telegram_bot.py
+# 在仓库根目录以模块方式运行：python -m tests.telegram_bot_test
 from __future__ import annotations
 
+import asyncio
 import os
-from dataclasses import dataclass
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Awaitable, Callable, Dict, List, Tuple, Optional
 
 from dotenv import load_dotenv
-from telegram import Update
+from telegram import Message, Update
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -19,15 +24,16 @@ from telegram.ext import (
     filters,
 )
 
-# 复用你现有逻辑：不改 grok_talking.py
-from grok_talking import (  # 注意：同目录 import，必要时改成 tests.grok_talking
+# 复用 grok_talking.py 的日志 / 会话逻辑
+from tests.grok_talking import (
     SYSTEM_DEFAULT,
     DATA_DIR,
     ENV_PATH,
     ensure_dirs,
     load_env,
     build_llm,
-    read_log_lines,
+    read_tail_lines,
+    count_log_records,
     extract_system_prompt,
     rebuild_messages_from_logs,
     write_session_header,
@@ -36,11 +42,25 @@ from grok_talking import (  # 注意：同目录 import，必要时改成 tests.
     replace_last_assistant_log,
     delete_last_turn_from_log,
     append_log,
+    apply_edit_records,
+    maybe_compact_log,
 )
 
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
 
+from src.telegram_world_bot.agents.context import ContextBuilder, ContextWindow, RollingSummary, summary_path
+from src.telegram_world_bot.telegram.rate_limiter import OutboundRateLimiter
+
 TELEGRAM_MAX = 3900
+LLM_CONCURRENCY_DEFAULT = 8
+LLM_TIMEOUT_S_DEFAULT = 120.0
+STREAM_EDIT_INTERVAL_S_DEFAULT = 1.0  # 同一条消息的 edit 频率，别撞 Bot API 的 flood limit
+RESUME_TURNS_DEFAULT = 50  # 续聊时只从日志尾部读最近这么多轮
+CONTEXT_TOKEN_BUDGET_DEFAULT = 6000  # 每次发给 LLM 的上下文 token 上限（估算值）
+SUMMARY_SYSTEM_PROMPT = (
+    "你负责维护一段对话的滚动摘要。给你旧摘要和新增的对话，输出合并后的新摘要："
+    "保留事实、用户偏好、未完成的问题和约定，省略寒暄。只输出摘要正文。"
+)
 
 # -----------------------
 # Per-chat state (in-memory)
@@ -50,10 +70,294 @@ class ChatState:
     log_fp: Path
     system_prompt: str
     messages: List[BaseMessage]
+    inflight: Optional[asyncio.Task] = None  # 正在生成中的 LLM 调用
+    generation: int = 0  # 每来一条新消息 +1；LLM 返回后对不上说明期间有新消息插进来
+    summary: RollingSummary = field(default_factory=RollingSummary)  # 掉出 token 窗口的旧轮次
+    folding: Optional[asyncio.Task] = None  # 后台正在更新摘要
+    last_window: Optional[ContextWindow] = None
 
 
 STATE: Dict[int, ChatState] = {}
 
+# 没有 ainvoke 的 llm 才会用到；大小和并发上限一致
+_LLM_POOL: Optional[ThreadPoolExecutor] = None
+
+
+# -----------------------
+# LLM 调用（不阻塞 event loop）
+# -----------------------
+async def _consume_stream(
+    llm,
+    messages: List[BaseMessage],
+    on_delta: Callable[[str], Awaitable[None]],
+) -> str:
+    text = ""
+    async for chunk in llm.astream(messages):
+        piece = getattr(chunk, "content", "")
+        if not isinstance(piece, str) or not piece:
+            continue
+        text += piece
+        await on_delta(text)
+    return text
+
+
+async def call_llm(
+    llm,
+    messages: List[BaseMessage],
+    bot_data: dict,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """
+    全局信号量限制同时在飞的 LLM 请求数，单次请求有超时。
+    优先走 llm.ainvoke；没有异步接口时丢到有界线程池里跑 llm.invoke。
+    传了 on_delta 且 llm 支持 astream 时走流式，每来一段就用"目前为止的全文"回调一次。
+    线程池兜底超时后，已经在跑的 llm.invoke 没法中断，线程会一直跑到它自己返回：
+    这期间它继续占着信号量名额，所以同时在跑的 invoke 线程永远不超过 llm_concurrency 个。
+    """
+    global _LLM_POOL
+    semaphore = bot_data["llm_semaphore"]
+    timeout = bot_data["llm_timeout_s"]
+    await semaphore.acquire()
+    release = True
+    try:
+        if on_delta is not None and hasattr(llm, "astream"):
+            return await asyncio.wait_for(_consume_stream(llm, messages, on_delta), timeout=timeout)
+        if hasattr(llm, "ainvoke"):
+            resp = await asyncio.wait_for(llm.ainvoke(messages), timeout=timeout)
+        else:
+            if _LLM_POOL is None:
+                _LLM_POOL = ThreadPoolExecutor(max_workers=bot_data["llm_concurrency"], thread_name_prefix="llm")
+            job = _LLM_POOL.submit(llm.invoke, messages)
+            result = asyncio.wrap_future(job)
+            try:
+                resp = await asyncio.wait_for(asyncio.shield(result), timeout=timeout)
+            except BaseException:
+                # 超时 / 被取消：还在排队就直接撤掉；已经在跑的停不下来，跑完再归还名额
+                result.add_done_callback(lambda f: f.cancelled() or f.exception())
+                if not job.cancel():
+                    release = False
+                    loop = asyncio.get_running_loop()
+                    job.add_done_callback(lambda _: loop.call_soon_threadsafe(semaphore.release))
+                raise
+    finally:
+        if release:
+            semaphore.release()
+    return getattr(resp, "content", str(resp))
+
+
+class StreamingReply:
+    """
+    流式回复：先发占位消息，token 到达后按 edit_interval_s 节流 edit_message_text；
+    当前消息超过 TELEGRAM_MAX 就定稿，剩下的滚到新消息里继续编辑。
+    """
+    PLACEHOLDER = "…"
+
+    def __init__(self, source: Message, edit_interval_s: float):
+        self._source = source
+        self._interval = edit_interval_s
+        self._current: Optional[Message] = None  # None：还没发占位消息，或上一条刚定稿
+        self._started = False
+        self._committed = 0  # 已经定稿在前面消息里的字符数
+        self._shown = ""  # 当前消息上正在显示的内容
+        self._text = ""
+        self._last_edit = 0.0
+        self.started_at = time.perf_counter()
+        self.first_visible_at: Optional[float] = None
+        self.edits = 0
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        """time-to-first-visible-token：从收到消息到第一段回复真正显示出来。"""
+        if self.first_visible_at is None:
+            return None
+        return (self.first_visible_at - self.started_at) * 1000
+
+    async def start(self) -> None:
+        self._current = await self._source.reply_text(self.PLACEHOLDER)
+        self._started = True
+
+    async def push(self, text_so_far: str) -> None:
+        self._text = text_so_far
+        if time.perf_counter() - self._last_edit >= self._interval:
+            await self._sync()
+
+    async def finish(self, text: str) -> None:
+        self._text = text
+        await self._sync()
+
+    async def abort(self, note: str) -> None:
+        self._text = f"{self._text}\n\n{note}" if self._text else note
+        await self._sync()
+
+    async def _sync(self) -> None:
+        pending = self._text[self._committed:]
+        while len(pending) > TELEGRAM_MAX:
+            await self._edit(pending[:TELEGRAM_MAX])
+            self._committed += TELEGRAM_MAX
+            pending = pending[TELEGRAM_MAX:]
+            # 前一条定稿；剩下的等有非空白内容了再发新消息（Telegram 不收空白消息）
+            self._current = None
+            self._shown = ""
+        await self._edit(pending)
+        self._last_edit = time.perf_counter()
+
+    async def _edit(self, text: str) -> None:
+        if not text.strip() or text == self._shown or not self._started:
+            return
+        if self._current is None:
+            self._current = await self._source.reply_text(text.strip())
+            self._shown = text
+            return
+        try:
+            await self._current.edit_text(text)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self._shown = text
+        self.edits += 1
+        if self.first_visible_at is None:
+            self.first_visible_at = time.perf_counter()
+
+
+def cancel_inflight(st: ChatState) -> None:
+    """同一个 chat 发来新消息时，上一条还没生成完的回复直接作废。"""
+    st.generation += 1
+    if st.inflight is not None and not st.inflight.done():
+        st.inflight.cancel()
+    st.inflight = None
+
+
+async def run_llm_turn(
+    st: ChatState,
+    llm,
+    bot_data: dict,
+    messages: Optional[List[BaseMessage]] = None,
+    stream: Optional[StreamingReply] = None,
+) -> Optional[str]:
+    """
+    在独立 task 里调 LLM，并登记到 st.inflight 方便被新消息取消。
+    messages 默认用 st.messages 的快照。被取消返回 None；LLM 报错 / 超时照常抛异常。
+    LLM task 已经结束、但这里还没恢复执行的空档里也可能有新消息进来（它看到 done() 就不会取消），
+    所以恢复之后再核对一次 generation，对不上同样按被取消处理。
+    """
+    msgs = list(st.messages if messages is None else messages)
+    generation = st.generation
+
+    async def _turn() -> str:
+        # 占位消息也放在 task 里发：st.inflight 必须在第一个 await 之前登记好
+        if stream is None:
+            return await call_llm(llm, msgs, bot_data)
+        await stream.start()
+        return await call_llm(llm, msgs, bot_data, on_delta=stream.push)
+
+    task = asyncio.create_task(_turn())
+    st.inflight = task
+    try:
+        await asyncio.wait({task})
+    except asyncio.CancelledError:
+        # handler 自己被取消（比如进程退出）：连带取消 LLM 请求
+        task.cancel()
+        raise
+    finally:
+        if st.inflight is task:
+            st.inflight = None
+    if task.cancelled():
+        return None
+    text = task.result()
+    if st.generation != generation:
+        return None
+    return text
+
+
+async def generate_reply(
+    update: Update,
+    st: ChatState,
+    llm,
+    bot_data: dict,
+    messages: Optional[List[BaseMessage]] = None,
+    cancel_meta: str = "cancelled_by_newer_message",
+) -> Tuple[Optional[str], Optional[StreamingReply]]:
+    """
+    调 LLM 生成一条回复（流式模式下会先发占位消息）。
+    出错 / 被新消息打断时在这里收尾（写日志、改占位消息），返回的文本为 None。
+    """
+    window = bot_data["context_builder"].build(st.messages if messages is None else messages, st.summary)
+    st.last_window = window
+    append_log(
+        st.log_fp, "meta",
+        f"context prompt_tokens={window.prompt_tokens} full_tokens={window.full_tokens} "
+        f"summarized={st.summary.upto - 1} unsummarized={window.unsummarized}",
+    )
+
+    stream = None
+    if bot_data["stream_replies"]:
+        stream = StreamingReply(update.message, bot_data["stream_edit_interval_s"])
+    try:
+        text = await run_llm_turn(st, llm, bot_data, messages=window.messages, stream=stream)
+    except Exception as e:
+        err = f"[ERROR] {type(e).__name__}: {e}"
+        append_log(st.log_fp, "error", err)
+        if stream is not None:
+            await stream.abort(err)
+        else:
+            await update.message.reply_text(err)
+        return None, stream
+    if text is None:
+        # 被同一 chat 的新消息取代：不回复，新消息那边会带着完整上下文重新生成
+        append_log(st.log_fp, "meta", cancel_meta)
+        if stream is not None:
+            await stream.abort("(已被新消息打断)")
+    elif window.needs_fold:
+        schedule_summary_fold(st, llm, bot_data)
+    return text, stream
+
+
+def schedule_summary_fold(st: ChatState, llm, bot_data: dict) -> None:
+    """在后台把掉出窗口的旧轮次折叠进摘要；同一个 chat 同时只跑一个。"""
+    if st.folding is not None and not st.folding.done():
+        return
+
+    async def _summarize(old: str, transcript: str) -> str:
+        prompt = [
+            SystemMessage(content=SUMMARY_SYSTEM_PROMPT),
+            HumanMessage(content=f"旧摘要：\n{old or '(无)'}\n\n新增对话：\n{transcript}"),
+        ]
+        return await call_llm(llm, prompt, bot_data)
+
+    async def _fold() -> None:
+        snapshot = list(st.messages)
+        before = st.summary
+        try:
+            summary = await bot_data["context_builder"].fold(snapshot, before, _summarize)
+        except Exception as e:
+            append_log(st.log_fp, "error", f"[ERROR] summary {type(e).__name__}: {e}")
+            return
+        # 摘要生成期间消息被撤回 / 重置过：这次结果作废，下一轮再折叠
+        if st.summary is not before or not summary.valid_for(st.messages):
+            return
+        st.summary = summary
+        await asyncio.to_thread(summary.save, summary_path(st.log_fp))
+        append_log(st.log_fp, "meta", f"summary folded={summary.folded} tokens={summary.tokens}")
+
+    st.folding = asyncio.create_task(_fold())
+
+
+def reset_summary(st: ChatState) -> None:
+    if st.folding is not None and not st.folding.done():
+        st.folding.cancel()
+    st.folding = None
+    st.summary = RollingSummary()
+    summary_path(st.log_fp).unlink(missing_ok=True)
+
+
+async def deliver_reply(update: Update, st: ChatState, stream: Optional[StreamingReply], text: str) -> None:
+    if stream is None:
+        await update.message.reply_text(text)
+        return
+    await stream.finish(text)
+    ttft = f"{stream.ttft_ms:.0f}" if stream.ttft_ms is not None else "n/a"
+    append_log(st.log_fp, "meta", f"stream ttft_ms={ttft} edits={stream.edits}")
+
 def format_full_chat(lines: List[dict]) -> str:
     """
     复刻你 grok_talking.py 里的 print_full_chat 输出风格，但返回字符串。
@@ -65,7 +369,7 @@ def format_full_chat(lines: List[dict]) -> str:
         out.append("=========================")
         return "\n".join(out)
 
-    for obj in lines:
+    for obj in apply_edit_records(lines):
         role = obj.get("role", "unknown")
         content = obj.get("content", "")
         if role in ("meta", "error"):
@@ -111,6 +415,37 @@ def list_session_files() -> List[Path]:
     return [p for _, p in files]
 
 
+def resume_turns() -> int:
+    return int(os.getenv("GROK_RESUME_TURNS", str(RESUME_TURNS_DEFAULT)))
+
+
+def load_session(log_fp: Path) -> Tuple[ChatState, List[dict]]:
+    """按 offset index 只读最近 resume_turns() 轮，摘要从 N.summary.json 找回；返回 (state, 读到的日志行)。"""
+    lines = read_tail_lines(log_fp, resume_turns())
+    system_prompt = extract_system_prompt(lines) if lines else SYSTEM_DEFAULT
+    if not lines:
+        write_session_header(log_fp, system_prompt)
+    messages = rebuild_messages_from_logs(lines, system_prompt)
+    summary = RollingSummary.load(summary_path(log_fp))
+    summary.resolve(messages)
+    return ChatState(log_fp=log_fp, system_prompt=system_prompt, messages=messages, summary=summary), lines
+
+
+def describe_session(log_fp: Path) -> str:
+    size_kb = log_fp.stat().st_size / 1024 if log_fp.exists() else 0.0
+    return f"{log_fp.stem}  ({count_log_records(log_fp)} 条, {size_kb:.1f} KB)"
+
+
+def describe_context(st: ChatState) -> str:
+    w = st.last_window
+    if w is None:
+        return "上下文：还没有发过请求"
+    return (
+        f"上下文：上一轮 prompt {w.prompt_tokens} tokens（不裁剪需要 {w.full_tokens}），"
+        f"摘要覆盖 {st.summary.folded} 条 / {st.summary.tokens} tokens"
+    )
+
+
 def get_or_init_state(chat_id: int) -> ChatState:
     """
     Telegram 环境下没有阻塞式 choose_session_file。
@@ -125,19 +460,13 @@ def get_or_init_state(chat_id: int) -> ChatState:
 
     existing = list_session_files()
     if existing:
-        log_fp = existing[-1]
-        lines = read_log_lines(log_fp)
-        system_prompt = extract_system_prompt(lines) if lines else SYSTEM_DEFAULT
-        if not lines:
-            write_session_header(log_fp, system_prompt)
-        messages = rebuild_messages_from_logs(lines, system_prompt)
+        st, _ = load_session(existing[-1])
     else:
         log_fp = next_session_file()
         system_prompt = SYSTEM_DEFAULT
         write_session_header(log_fp, system_prompt)
-        messages = [SystemMessage(content=system_prompt)]
+        st = ChatState(log_fp=log_fp, system_prompt=system_prompt, messages=[SystemMessage(content=system_prompt)])
 
-    st = ChatState(log_fp=log_fp, system_prompt=system_prompt, messages=messages)
     STATE[chat_id] = st
     return st
 
@@ -188,7 +517,7 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def cmd_where(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     st = get_or_init_state(update.effective_chat.id)
-    await update.message.reply_text(f"当前会话文件：{st.log_fp}")
+    await update.message.reply_text(f"当前会话文件：{st.log_fp}\n{describe_session(st.log_fp)}\n{describe_context(st)}")
 
 
 async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -197,12 +526,13 @@ async def cmd_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not files:
         await update.message.reply_text("(暂无历史记录)")
         return
-    nums = [p.stem for p in files]
-    await update.message.reply_text("历史会话：\n" + "\n".join(nums))
+    await update.message.reply_text("历史会话：\n" + "\n".join(describe_session(p) for p in files))
 
 
 async def cmd_new(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
+    if chat_id in STATE:
+        cancel_inflight(STATE[chat_id])
     ensure_dirs()
     log_fp = next_session_file()
     system_prompt = SYSTEM_DEFAULT
@@ -226,14 +556,12 @@ async def cmd_use(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("没有这个编号的记录文件。先 /list 看看有哪些。")
         return
 
-    lines = read_log_lines(log_fp)
-    system_prompt = extract_system_prompt(lines) if lines else SYSTEM_DEFAULT
-    if not lines:
-        write_session_header(log_fp, system_prompt)
-    messages = rebuild_messages_from_logs(lines, system_prompt)
+    st, lines = load_session(log_fp)
 
-    STATE[chat_id] = ChatState(log_fp=log_fp, system_prompt=system_prompt, messages=messages)
-    await update.message.reply_text(f"已切换到：{log_fp.name}\n下面是该会话完整记录：")
+    if chat_id in STATE:
+        cancel_inflight(STATE[chat_id])
+    STATE[chat_id] = st
+    await update.message.reply_text(f"已切换到：{log_fp.name}\n下面是最近 {resume_turns()} 轮记录：")
 
     full = format_full_chat(lines)
     await send_long_text(update, full)
@@ -255,11 +583,15 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
     llm = context.bot_data["llm"]
 
+    # 新消息（包括指令）一到，上一条还在生成的回复就取消掉
+    cancel_inflight(st)
+
     # -----------------------
     # 指令：重置
     # -----------------------
     if user_in == "重置":
         clear_all_logs(st.log_fp)
+        reset_summary(st)
         st.messages = [SystemMessage(content=st.system_prompt)]
         write_session_header(st.log_fp, st.system_prompt)
         await update.message.reply_text("(已清空该会话文件的所有聊天记录与上下文)")
@@ -276,22 +608,22 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             await update.message.reply_text("(上一条不是 assistant 回复，无法刷新)")
             return
 
-        st.messages.pop()  # 去掉最后一条 assistant
-
-        try:
-            resp = llm.invoke(st.messages)
-        except Exception as e:
-            err = f"[ERROR] {type(e).__name__}: {e}"
-            append_log(st.log_fp, "error", err)
-            await update.message.reply_text(err)
+        # 先不 pop 最后一条 assistant：生成期间可能被新消息取消，内存上下文要保持原样
+        assistant_text, stream = await generate_reply(
+            update, st, llm, context.bot_data,
+            messages=st.messages[:-1],
+            cancel_meta="regenerate_cancelled_by_newer_message",
+        )
+        if assistant_text is None:
             return
 
-        assistant_text = getattr(resp, "content", str(resp))
-        st.messages.append(AIMessage(content=assistant_text))
+        # 返回了文本说明 generation 没变：期间没有新消息插进来，最后一条仍是旧的 assistant
+        st.messages[-1] = AIMessage(content=assistant_text)
         replace_last_assistant_log(st.log_fp, assistant_text)
         append_log(st.log_fp, "meta", "regenerate_last_assistant")
+        context.application.create_task(asyncio.to_thread(maybe_compact_log, st.log_fp))
 
-        await update.message.reply_text(assistant_text)
+        await deliver_reply(update, st, stream, assistant_text)
         return
 
     # -----------------------
@@ -308,6 +640,10 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
             removed_mem = True or removed_mem
 
         removed_file = delete_last_turn_from_log(st.log_fp)
+        if not st.summary.valid_for(st.messages):
+            reset_summary(st)
+        if removed_file:
+            context.application.create_task(asyncio.to_thread(maybe_compact_log, st.log_fp))
 
         if removed_mem or removed_file:
             await update.message.reply_text("(已删除上一轮对话，你可以重新输入这一轮内容)")
@@ -321,19 +657,14 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     st.messages.append(HumanMessage(content=user_in))
     append_log(st.log_fp, "user", user_in)
 
-    try:
-        resp = llm.invoke(st.messages)
-    except Exception as e:
-        err = f"[ERROR] {type(e).__name__}: {e}"
-        append_log(st.log_fp, "error", err)
-        await update.message.reply_text(err)
+    assistant_text, stream = await generate_reply(update, st, llm, context.bot_data)
+    if assistant_text is None:
         return
 
-    assistant_text = getattr(resp, "content", str(resp))
     st.messages.append(AIMessage(content=assistant_text))
     append_log(st.log_fp, "assistant", assistant_text)
 
-    await update.message.reply_text(assistant_text)
+    await deliver_reply(update, st, stream, assistant_text)
 
 
 def main() -> None:
@@ -349,8 +680,20 @@ def main() -> None:
 
     llm = build_llm()
 
-    app = Application.builder().token(bot_token).build()
+    # 出站限速：多段消息 / 流式编辑在同一个 chat 里按顺序、按 Telegram 限额发，429 自动按 retry_after 重试
+    app = Application.builder().token(bot_token).rate_limiter(OutboundRateLimiter()).build()
     app.bot_data["llm"] = llm
+    app.bot_data["llm_concurrency"] = int(os.getenv("LLM_CONCURRENCY", str(LLM_CONCURRENCY_DEFAULT)))
+    app.bot_data["llm_timeout_s"] = float(os.getenv("LLM_TIMEOUT_S", str(LLM_TIMEOUT_S_DEFAULT)))
+    app.bot_data["llm_semaphore"] = asyncio.Semaphore(app.bot_data["llm_concurrency"])
+    app.bot_data["stream_replies"] = os.getenv("GROK_STREAM", "1").strip().lower() in ("1", "true", "yes")
+    app.bot_data["stream_edit_interval_s"] = float(
+        os.getenv("GROK_STREAM_EDIT_INTERVAL_S", str(STREAM_EDIT_INTERVAL_S_DEFAULT))
+    )
+    app.bot_data["context_builder"] = ContextBuilder(
+        budget_tokens=int(os.getenv("GROK_CONTEXT_TOKENS", str(CONTEXT_TOKEN_BUDGET_DEFAULT))),
+        make_message=lambda role, content: SystemMessage(content=content),
+    )
 
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("where", cmd_where))
@@ -358,7 +701,8 @@ def main() -> None:
     app.add_handler(CommandHandler("new", cmd_new))
     app.add_handler(CommandHandler("use", cmd_use))
     app.add_handler(CommandHandler("help", cmd_help))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+    # block=False：handle_text 在后台 task 里跑，等 LLM 时不挡别的 chat，也能收到同 chat 的新消息去取消旧请求
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text, block=False))
 
     app.run_polling()
 
@@ -0,0 +1,59 @@
+import asyncio
+
+from src.telegram_world_bot.agents.context import ContextBuilder, RollingSummary, count_tokens
+from src.telegram_world_bot.agents.memory import AgentMemory
+
+def _chat(turns: int, first: int = 0) -> list:
+    msgs = [{"role": "system", "content": "sys"}]
+    for i in range(first, first + turns):
+        msgs.append({"role": "user", "content": f"问题{i} " * 10})
+        msgs.append({"role": "assistant", "content": f"answer {i} " * 20})
+    return msgs
+
+def test_count_tokens_cjk_and_ascii():
+    assert count_tokens("") == 0
+    assert count_tokens("你好") == 2
+    assert count_tokens("abcdefgh") == 2
+
+def test_build_keeps_newest_whole_turns_within_budget():
+    msgs = _chat(20)
+    window = ContextBuilder(budget_tokens=300).build(msgs, RollingSummary())
+    assert window.prompt_tokens <= 300 < window.full_tokens
+    assert window.messages[0] == msgs[0]
+    assert window.messages[1]["role"] == "user"
+    assert window.messages[-1] == msgs[-1]
+    assert window.needs_fold
+
+def test_fold_is_incremental_and_resolves_after_reload(tmp_path):
+    msgs = _chat(20)
+    builder = ContextBuilder(budget_tokens=300)
+    seen = []
+
+    async def summarize(old: str, transcript: str) -> str:
+        seen.append(old)
+        return old + "|" + str(transcript.count("user:"))
+
+    summary = asyncio.run(builder.fold(msgs, RollingSummary(), summarize))
+    assert summary.upto > 1 and summary.folded == summary.upto - 1
+    assert not builder.build(msgs, summary).needs_fold
+
+    msgs += _chat(5, first=20)[1:]
+    summary2 = asyncio.run(builder.fold(msgs, summary, summarize))
+    assert seen[-1] == summary.text
+    assert summary2.upto > summary.upto
+
+    path = tmp_path / "1.summary.json"
+    summary2.save(path)
+    loaded = RollingSummary.load(path)
+    loaded.resolve(msgs)
+    assert loaded.upto == summary2.upto and loaded.text == summary2.text
+
+    # 撤回到摘要边界之内：摘要作废
+    assert not summary2.valid_for(msgs[: summary2.upto - 1])
+
+def test_agent_memory_last_tokens():
+    mem = AgentMemory()
+    for i in range(10):
+        mem.add("user", "x" * 40)
+    assert len(mem.last_tokens(50)) == 3
+    assert len(mem.last_tokens(0)) == 1
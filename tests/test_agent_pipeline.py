@@ -0,0 +1,71 @@
+import asyncio
+
+from src.telegram_world_bot.agents.base import BaseAgent
+from src.telegram_world_bot.agents.pipeline import AgentPipeline, Stage, MODERATION_FALLBACK, REPLY_FALLBACK
+from src.telegram_world_bot.agents.registry import AgentRegistry
+
+class _Moderation(BaseAgent):
+    name = "moderation"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def run(self, input):
+        await asyncio.sleep(self.delay)
+        blocked = "bad" in input["text"]
+        return {"blocked": blocked, "reason": "keyword" if blocked else None}
+
+class _Reply(BaseAgent):
+    name = "reply"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.finished = 0
+
+    async def run(self, input):
+        await asyncio.sleep(self.delay)
+        self.finished += 1
+        return {"reply": "echo " + input["user_message"]}
+
+def _pipeline(mod_delay: float, reply_delay: float, reply_timeout: float = 1.0, **kw):
+    reg = AgentRegistry()
+    reply = _Reply(reply_delay)
+    reg.register(_Moderation(mod_delay))
+    reg.register(reply)
+    pipeline = AgentPipeline(
+        reg,
+        moderation=Stage("moderation", 0.5, MODERATION_FALLBACK),
+        reply=Stage("reply", reply_timeout, REPLY_FALLBACK),
+        **kw,
+    )
+    return pipeline, reply
+
+def test_pipeline_runs_stages_concurrently():
+    async def scenario():
+        pipeline, _ = _pipeline(0.05, 0.05)
+        result = await pipeline.run({"user_message": "hi"})
+        assert result.reply == "echo hi" and not result.blocked
+        # 并发：总耗时小于两个阶段相加（不卡绝对时间，CI 机器慢也不会误报）
+        assert result.timings_ms["total"] < result.timings_ms["moderation"] + result.timings_ms["reply"]
+
+    asyncio.run(scenario())
+
+def test_pipeline_block_cancels_reply_and_timeouts_fall_back():
+    async def scenario():
+        pipeline, reply = _pipeline(0.01, 0.2)
+        result = await pipeline.run({"user_message": "bad words"})
+        assert result.blocked and result.reply is None and result.reason == "keyword"
+        await asyncio.sleep(0.25)
+        assert reply.finished == 0
+
+        pipeline, _ = _pipeline(0.01, 0.2, reply_timeout=0.05)
+        result = await pipeline.run({"user_message": "hi"})
+        assert result.reply == REPLY_FALLBACK["reply"] and result.fallbacks == ("reply",)
+
+        pipeline, _ = _pipeline(1.0, 0.01, fail_closed=True)
+        result = await pipeline.run({"user_message": "hi"})
+        assert result.blocked and result.fallbacks == ("moderation",)
+        stats = pipeline.stats()
+        assert stats["timeouts"]["moderation"] == 1 and stats["suppressed"] == 1
+
+    asyncio.run(scenario())
@@ -1,6 +1,12 @@
 # 作者：Alex
 # 2026/1/31 21:38
+import asyncio
+import sys
+import time
+
 import pytest
+from src.telegram_world_bot.agents.base import BaseAgent
+from src.telegram_world_bot.agents.cache import CachePolicy
 from src.telegram_world_bot.agents.registry import AgentRegistry
 from src.telegram_world_bot.agents.onboarding_agent import OnboardingAgent
 
@@ -14,3 +20,125 @@ def test_registry_missing():
     reg = AgentRegistry()
     with pytest.raises(KeyError):
         reg.get("missing")
+
+def test_registry_cached_agent_single_flight_and_ttl():
+    class SlowAgent(BaseAgent):
+        name = "slow"
+        calls = 0
+
+        async def run(self, input):
+            SlowAgent.calls += 1
+            await asyncio.sleep(0.01)
+            return {"reply": input["mode"]}
+
+    async def scenario():
+        reg = AgentRegistry()
+        reg.register(SlowAgent(), cache=CachePolicy(ttl_s=60, max_size=1, key_fields=("mode",)))
+        agent = reg.get("slow")
+
+        # 并发的相同请求只算一次；memory 不参与 key
+        results = await asyncio.gather(*(agent.run({"mode": "a", "memory": [i]}) for i in range(5)))
+        assert [r["reply"] for r in results] == ["a"] * 5
+        assert SlowAgent.calls == 1
+
+        await agent.run({"mode": "a"})
+        await agent.run({"mode": "b"})  # max_size=1：挤掉 a
+        await agent.run({"mode": "a"})
+        stats = reg.cache_stats()["slow"]
+        assert stats["hits"] == 1 and stats["coalesced"] == 4
+        assert stats["misses"] == 3 and stats["evictions"] == 2
+
+    asyncio.run(scenario())
+
+def test_registry_lazy_import_and_warm_up(monkeypatch):
+    monkeypatch.delitem(sys.modules, "src.telegram_world_bot.agents.control_agent", raising=False)
+    reg = AgentRegistry()
+    reg.register_lazy("control", "src.telegram_world_bot.agents.control_agent:ControlAgent")
+    reg.register_lazy("onboarding", OnboardingAgent)
+    assert reg.names() == ["control", "onboarding"]
+    assert "src.telegram_world_bot.agents.control_agent" not in sys.modules
+
+    assert reg.get("control").name == "control"
+    asyncio.run(reg.warm_up())
+    report = {r["name"]: r for r in reg.load_report()}
+    assert report["control"]["loaded"] and report["onboarding"]["loaded"]
+    assert reg.get("onboarding") is reg.get("onboarding")
+
+def test_registry_aget_waits_for_warm_up_without_blocking_loop():
+    def slow_factory():
+        time.sleep(0.2)  # 模拟很重的 import
+        return OnboardingAgent()
+
+    async def scenario():
+        reg = AgentRegistry()
+        reg.register_lazy("onboarding", slow_factory)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        warm = asyncio.create_task(reg.warm_up())
+        await asyncio.sleep(0.02)
+        agent = await reg.aget("onboarding")  # 合并到 warm_up 正在进行的加载上
+        await warm
+        tick_task.cancel()
+        return reg, agent, ticks
+
+    reg, agent, ticks = asyncio.run(scenario())
+    assert agent is reg.get("onboarding")
+    assert ticks >= 10  # 加载期间 loop 一直在转
+    with pytest.raises(KeyError):
+        asyncio.run(reg.aget("missing"))
+
+def test_cached_agent_leader_cancelled_waiter_takes_over():
+    class GatedAgent(BaseAgent):
+        name = "gated"
+        calls = 0
+
+        async def run(self, input):
+            GatedAgent.calls += 1
+            await asyncio.sleep(0.02)
+            return {"reply": GatedAgent.calls}
+
+    async def scenario():
+        reg = AgentRegistry()
+        reg.register(GatedAgent(), cache=CachePolicy(ttl_s=60))
+        agent = reg.get("gated")
+        leader = asyncio.create_task(agent.run({"mode": "a"}))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(agent.run({"mode": "a"})) for _ in range(3)]
+        await asyncio.sleep(0.005)
+        leader.cancel()  # 比如审核拦下了这条消息
+        results = await asyncio.gather(*waiters)
+        assert leader.cancelled()
+        # 等待者里只有一个重新算了一次，其余继续合并
+        assert [r["reply"] for r in results] == [2, 2, 2] and GatedAgent.calls == 2
+
+    asyncio.run(scenario())
+
+def test_cached_agent_cancelled_waiter_does_not_cancel_leader():
+    class SlowAgent(BaseAgent):
+        name = "slow"
+
+        async def run(self, input):
+            await asyncio.sleep(0.02)
+            return {"reply": "ok"}
+
+    async def scenario():
+        reg = AgentRegistry()
+        reg.register(SlowAgent(), cache=CachePolicy(ttl_s=60))
+        agent = reg.get("slow")
+        leader = asyncio.create_task(agent.run({"mode": "a"}))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(agent.run({"mode": "a"}))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert (await leader)["reply"] == "ok"
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+import asyncio
+
+from src.telegram_world_bot.db.local import make_async_session_factory, init_local_db_async
+from src.telegram_world_bot.db.dao import AsyncLocalDAO
+from src.telegram_world_bot.db.idempotency import IdempotencyCache, IdempotencyTTL
+
+def test_async_idempotency():
+    async def scenario():
+        session_factory, engine = make_async_session_factory()
+        await init_local_db_async(engine)
+
+        dao = AsyncLocalDAO(session_factory)
+        assert await dao.try_acquire_idempotency("k1") is True
+        assert await dao.try_acquire_idempotency("k1") is False
+        await dao.log_event(1, "onboarding_submit", payload="mode=x")
+        assert await dao.clear_idempotency_keys() == 1
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+def test_idempotency_cache_ttl_and_sweep():
+    async def scenario():
+        session_factory, engine = make_async_session_factory()
+        await init_local_db_async(engine)
+
+        cache = IdempotencyCache(max_size=10)
+        ttl = IdempotencyTTL(default_ttl_s=3600, prefix_ttls=(("short:*", 0),))
+        dao = AsyncLocalDAO(session_factory, idem_cache=cache, idem_ttl=ttl)
+
+        assert await dao.try_acquire_idempotency("onboarding_submit:1:x") is True
+        assert await dao.try_acquire_idempotency("onboarding_submit:1:x") is False
+        assert cache.stats()["hits"] == 1  # 重复提交没有碰 DB
+
+        # ttl=0：立刻过期，可以重新占用，也会被 sweep 掉
+        assert await dao.try_acquire_idempotency("short:1") is True
+        assert await dao.try_acquire_idempotency("short:1") is True
+        assert await dao.sweep_expired_idempotency(100) == 1
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+def test_idempotency_ttl_longest_prefix():
+    ttl = IdempotencyTTL(60, (("a:*", 10), ("a:b:*", 20)))
+    assert ttl.ttl_for("a:b:c") == 20
+    assert ttl.ttl_for("a:x") == 10
+    assert ttl.ttl_for("z") == 60
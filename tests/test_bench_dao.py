@@ -0,0 +1,29 @@
+import argparse
+
+from scripts.bench_dao import run_benchmark
+
+def _args(**overrides):
+    args = dict(
+        db_url="", mode="threads", workers=8, workload="all", idem_ops=200, dup_ratio=0.5, idem_cache=False,
+        event_ops=300, batch_size=10, pool_size=4, max_overflow=4, pool_timeout=30.0, seed=1,
+    )
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+def test_dao_benchmark_threads_contention():
+    result = run_benchmark(_args())
+    rounds = {r["workload"]: r for r in result["rounds"]}
+    assert set(rounds) == {"idem", "events", "mixed"}
+    for r in rounds.values():
+        assert r["errors"] == {} and r["commit_ms"]["n"] > 0 and r["pool_wait_ms"]["n"] > 0
+    # 一半是重复 key，并发撞上也只能抢到一次
+    assert rounds["idem"]["idempotency"] == {"distinct": 100, "acquired": 100, "ok": True}
+    assert rounds["mixed"]["idempotency"]["ok"]
+    assert rounds["events"]["ops"]["log_events"]["latency_ms"]["n"] == 30
+    assert rounds["events"]["events_rows_s"] > 0
+
+def test_dao_benchmark_tasks():
+    result = run_benchmark(_args(mode="tasks", workload="mixed", batch_size=1, idem_cache=True))
+    (r,) = result["rounds"]
+    assert r["errors"] == {} and r["idempotency"]["ok"]
+    assert r["ops"]["log_event"]["latency_ms"]["n"] == 300
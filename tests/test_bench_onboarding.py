@@ -0,0 +1,16 @@
+import argparse
+
+from scripts.bench_onboarding import run_benchmark
+
+def test_onboarding_benchmark_small_run():
+    args = argparse.Namespace(
+        users=20, warmup=2, concurrency=4, alloc_users=5, rate_limit=False, user_store_journal=False,
+    )
+    result = run_benchmark(args)
+    # 整个流程真的走完了（每人收到"已完成设置"），不是在测出错路径
+    assert result["completed_users"] == 20 and result["errors"] == 0
+    assert result["updates"] == 60 and result["throughput_ups"] > 0
+    assert set(result["latency_ms_by_step"]) == {"start", "mode", "confirm"}
+    assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+    assert result["alloc"]["updates"] == 15
+    assert result["bot_api_calls"]["sendMessage"] == (20 + 2 + 5) * 3
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from telegram.ext import ExtBot
+
+from src.telegram_world_bot.db.dao import AsyncLocalDAO
+from src.telegram_world_bot.db.local import make_async_session_factory, init_local_db_async
+from src.telegram_world_bot.services.broadcast import Broadcaster, EventLogRecipients, UserStoreRecipients
+from src.telegram_world_bot.services.user_store import UserStore, UserProfile
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+from src.telegram_world_bot.telegram.rate_limiter import OutboundRateLimiter
+
+class _Crashing(UserStoreRecipients):
+    # 发完 n 批之后模拟进程崩溃
+    def __init__(self, user_store, chunk_size: int, crash_after: int):
+        super().__init__(user_store, chunk_size)
+        self.crash_after = crash_after
+
+    async def chunks(self, after):
+        n = 0
+        async for chunk in super().chunks(after):
+            if n == self.crash_after:
+                raise RuntimeError("crash")
+            n += 1
+            yield chunk
+
+def test_broadcast_resumes_and_skips_blocked(tmp_path):
+    async def main():
+        session_factory, engine = make_async_session_factory()
+        await init_local_db_async(engine)
+        dao = AsyncLocalDAO(session_factory)
+        store = UserStore(str(tmp_path / "users.json"))
+        for uid in range(1, 11):
+            store.upsert(UserProfile(user_id=uid))
+
+        api = FakeBotAPI()
+        api.fail_next("sendMessage", 403, description="Forbidden: bot was blocked by the user", chat_id=3)
+        bot = ExtBot("123:TEST", request=FakeRequest(api), rate_limiter=OutboundRateLimiter(global_rate=1000))
+        async with bot:
+            with pytest.raises(RuntimeError):
+                await Broadcaster(bot, dao, "news", "hi", _Crashing(store, 4, crash_after=2)).run()
+            checkpoint = await dao.load_broadcast_checkpoint("news")
+            assert checkpoint == {"last_user_id": 8, "sent": 7, "failed": 0, "blocked": 1, "done": False}
+
+            progress = await Broadcaster(bot, dao, "news", "hi", UserStoreRecipients(store, 4)).run()
+            assert progress.total == 2 and progress.sent == 2
+            assert sorted(m["chat_id"] for m in api.sent_messages()) == list(range(1, 11))
+            assert (await dao.load_broadcast_checkpoint("news"))["done"] is True
+
+            # 已完成的活动不会再发；新的活动跳过拉黑的用户
+            api.calls.clear()
+            await Broadcaster(bot, dao, "news", "hi", UserStoreRecipients(store, 4)).run()
+            assert api.sent_messages() == []
+            progress = await Broadcaster(bot, dao, "news2", "hello", UserStoreRecipients(store, 4)).run()
+            assert progress.skipped == 1 and progress.sent == 9
+            assert 3 not in {m["chat_id"] for m in api.sent_messages()}
+
+            # 用户又来 /start 之后解除拉黑
+            await dao.unblock_user(3)
+            api.calls.clear()
+            progress = await Broadcaster(bot, dao, "news3", "hello", UserStoreRecipients(store, 4)).run()
+            assert progress.skipped == 0 and progress.sent == 10
+
+        await dao.log_events([{"user_id": uid, "event": "onboarding_submit"} for uid in (5, 2, 2, 9)])
+        recipients = EventLogRecipients(dao, chunk_size=2)
+        assert await recipients.remaining(0) == 3
+        assert [c async for c in recipients.chunks(0)] == [[2, 5], [9]]
+        await engine.dispose()
+
+    asyncio.run(main())
+
+class _CrashOn:
+    # send_message 到某个用户时进程"崩溃"（不是 TelegramError，会一路抛出去）
+    def __init__(self, crash_on: int):
+        self.crash_on = crash_on
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if chat_id == self.crash_on:
+            raise RuntimeError("crash")
+        self.sent.append(chat_id)
+
+def test_broadcast_checkpoints_within_chunk(tmp_path):
+    async def main():
+        session_factory, engine = make_async_session_factory()
+        await init_local_db_async(engine)
+        dao = AsyncLocalDAO(session_factory)
+        store = UserStore(str(tmp_path / "users.json"))
+        for uid in range(1, 11):
+            store.upsert(UserProfile(user_id=uid))
+
+        recipients = UserStoreRecipients(store, chunk_size=10)
+        with pytest.raises(RuntimeError):
+            await Broadcaster(_CrashOn(7), dao, "news", "hi", recipients, checkpoint_every=2).run()
+        # 一次取了 10 个收件人，但每 2 个就存一次断点
+        assert (await dao.load_broadcast_checkpoint("news"))["last_user_id"] == 6
+
+        bot = _CrashOn(0)
+        progress = await Broadcaster(bot, dao, "news", "hi", recipients, checkpoint_every=2).run()
+        assert bot.sent == [7, 8, 9, 10] and progress.sent == 4
+        await engine.dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+import asyncio
+
+from sqlalchemy import select, func
+
+from src.telegram_world_bot.config import EventSinkConfig
+from src.telegram_world_bot.db.local import make_async_session_factory, init_local_db_async
+from src.telegram_world_bot.db.dao import AsyncLocalDAO
+from src.telegram_world_bot.db.event_sink import EventSink
+from src.telegram_world_bot.db.models import EventLog
+
+async def _count(session_factory) -> int:
+    async with session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(EventLog))).scalar_one()
+
+def test_event_sink_batches_and_flushes_on_close():
+    async def scenario():
+        session_factory, engine = make_async_session_factory()
+        await init_local_db_async(engine)
+        sink = EventSink(AsyncLocalDAO(session_factory), EventSinkConfig(batch_size=10, flush_interval_ms=60_000))
+        await sink.start()
+
+        for i in range(25):
+            await sink.log_event(i, "e")
+        await asyncio.sleep(0.05)  # 攒满 batch_size 会唤醒后台 flush
+        assert await _count(session_factory) >= 20
+
+        await sink.close()
+        assert await _count(session_factory) == 25
+        assert sink.stats()["queue_depth"] == 0
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+def test_event_sink_drop_oldest_and_spill(tmp_path):
+    async def scenario():
+        session_factory, engine = make_async_session_factory()
+        await init_local_db_async(engine)
+        dao = AsyncLocalDAO(session_factory)
+
+        drop = EventSink(dao, EventSinkConfig(max_queue=3, overflow="drop_oldest"))
+        for i in range(5):
+            await drop.log_event(i, "e")
+        assert drop.stats()["dropped"] == 2
+        assert await drop.flush() == 3
+
+        spill = EventSink(dao, EventSinkConfig(max_queue=3, overflow="spill", spill_path=str(tmp_path / "spill.jsonl")))
+        for i in range(5):
+            await spill.log_event(i, "e")
+        assert spill.stats()["spilled"] == 2
+        assert await spill.flush() == 5
+        assert await _count(session_factory) == 8
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+class _SlowDAO:
+    def __init__(self):
+        self.rows = []
+
+    async def log_events(self, rows):
+        await asyncio.sleep(0.05)
+        self.rows.extend(rows)
+
+def test_event_sink_close_keeps_inflight_batch():
+    async def scenario():
+        dao = _SlowDAO()
+        sink = EventSink(dao, EventSinkConfig(batch_size=5, flush_interval_ms=60_000))
+        await sink.start()
+        for i in range(10):
+            await sink.log_event(i, "e")
+        await asyncio.sleep(0.01)  # 后台 flush 正在写第一批
+        await sink.close()
+        assert len(dao.rows) == 10
+
+        await sink.log_event(99, "late")  # 关闭之后直接写
+        return dao
+
+    dao = asyncio.run(scenario())
+    assert len(dao.rows) == 11 and dao.rows[-1]["user_id"] == 99
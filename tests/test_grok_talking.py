@@ -0,0 +1,171 @@
+from tests import grok_talking
+from tests.grok_talking import (
+    DEAD_FLAG,
+    EDIT_COMPACT_THRESHOLD,
+    IDX_RECORD,
+    ROLE_CODES,
+    append_log,
+    compact_log,
+    count_edit_records,
+    count_log_records,
+    delete_last_turn_from_log,
+    index_path,
+    maybe_compact_log,
+    read_index,
+    read_log_lines,
+    read_tail_lines,
+    replace_last_assistant_log,
+    write_session_header,
+)
+
+def _session(tmp_path, turns=6):
+    fp = tmp_path / "1.jsonl"
+    write_session_header(fp, "你是助手")
+    for i in range(turns):
+        append_log(fp, "user", f"问题{i}")
+        append_log(fp, "assistant", f"回答{i}")
+    return fp
+
+def _new_process(monkeypatch):
+    # index 每个进程只校验一次：换一个空集合，相当于重启之后第一次打开
+    monkeypatch.setattr(grok_talking, "_INDEX_CHECKED", set())
+
+def _expected_tail(full, turns):
+    users = [i for i, line in enumerate(full) if line["role"] == "user"]
+    start = users[-turns] if len(users) >= turns else 0
+    system = [line for line in full[:start] if line["role"] == "system"][-1:]
+    return system + full[start:]
+
+def test_tail_read_matches_full_read(tmp_path):
+    fp = _session(tmp_path)
+    full = read_log_lines(fp)
+    assert count_log_records(fp) == len(full) == 14
+    for turns in (1, 3, 6, 10):
+        assert read_tail_lines(fp, turns) == _expected_tail(full, turns)
+    assert [line["content"] for line in read_tail_lines(fp, 2)] == ["你是助手", "问题4", "回答4", "问题5", "回答5"]
+
+def test_index_rebuilt_after_log_changed_outside(tmp_path, monkeypatch):
+    fp = _session(tmp_path, turns=2)
+    before = index_path(fp).read_bytes()
+    # 别的程序直接往 jsonl 里追加了一行，index 没跟着更新
+    with fp.open("a", encoding="utf-8") as f:
+        f.write('{"ts_utc": "t", "role": "user", "content": "外部追加"}\n')
+    _new_process(monkeypatch)
+    assert count_log_records(fp) == 7
+    assert index_path(fp).read_bytes().startswith(before)
+    assert read_tail_lines(fp, 1)[-1]["content"] == "外部追加"
+
+    # index 整个丢了也一样
+    index_path(fp).unlink()
+    _new_process(monkeypatch)
+    assert read_log_lines(fp)[-1]["content"] == "外部追加"
+    assert len(read_index(fp)) == 7
+
+def test_torn_final_record_is_skipped(tmp_path, monkeypatch):
+    fp = _session(tmp_path, turns=2)
+    with fp.open("ab") as f:
+        f.write('{"ts_utc": "t", "role": "assistant", "content": "写了一半'.encode("utf-8")[:-1])
+    _new_process(monkeypatch)
+    assert [line["content"] for line in read_tail_lines(fp, 1)] == ["你是助手", "问题1", "回答1"]
+
+    # 残尾之后接着写，新行不会和它粘在一起；重启之后重建 index 也读得到
+    append_log(fp, "user", "问题2")
+    assert read_log_lines(fp)[-1]["content"] == "问题2"
+    _new_process(monkeypatch)
+    index_path(fp).unlink()
+    assert read_log_lines(fp)[-1]["content"] == "问题2"
+    assert read_tail_lines(fp, 1)[-1]["content"] == "问题2"
+
+def test_dead_flagged_entries_are_skipped(tmp_path, monkeypatch):
+    fp = _session(tmp_path, turns=3)
+    assert delete_last_turn_from_log(fp)
+    dead = [seq for seq, (_, code) in enumerate(read_index(fp)) if code & DEAD_FLAG]
+    assert dead == [6, 7]
+    expected = ["你是助手", "问题1", "回答1"]
+    assert [line["content"] for line in read_tail_lines(fp, 1)] == expected
+
+    # 重建 index 时从编辑记录里把删除标记找回来
+    _new_process(monkeypatch)
+    index_path(fp).unlink()
+    assert [seq for seq, (_, code) in enumerate(read_index(fp)) if code & DEAD_FLAG] == dead
+    assert [line["content"] for line in read_tail_lines(fp, 1)] == expected
+    assert len(index_path(fp).read_bytes()) == 10 * IDX_RECORD.size
+
+# 改成追加编辑记录之前的做法：读出整个会话，改完整个重写
+def _rewrite_replace_last_assistant(lines, content):
+    for line in reversed(lines):
+        if line["role"] == "assistant":
+            line["content"] = content
+            return
+    lines.append({"role": "assistant", "content": content})
+
+def _rewrite_delete_last_turn(lines):
+    users = [i for i, line in enumerate(lines) if line["role"] == "user"]
+    if not users:
+        return False
+    remove = {users[-1]}
+    assistants = [j for j in range(users[-1] + 1, len(lines)) if lines[j]["role"] == "assistant"]
+    if assistants:
+        remove.add(assistants[-1])
+    lines[:] = [line for i, line in enumerate(lines) if i not in remove]
+    return True
+
+def _strip(lines):
+    return [{"role": line["role"], "content": line["content"]} for line in lines]
+
+def _edited_session(tmp_path):
+    fp = _session(tmp_path, turns=4)
+    expected = _strip(read_log_lines(fp))
+    for op in ("replace", "delete", "replace", "replace", "delete", "append", "replace", "delete", "delete"):
+        if op == "replace":
+            content = f"重写{len(expected)}"
+            replace_last_assistant_log(fp, content)
+            _rewrite_replace_last_assistant(expected, content)
+        elif op == "delete":
+            assert delete_last_turn_from_log(fp) == _rewrite_delete_last_turn(expected)
+        else:
+            append_log(fp, "user", "追问")
+            expected.append({"role": "user", "content": "追问"})
+    return fp, expected
+
+def test_edit_records_replay_like_rewrite(tmp_path):
+    fp, expected = _edited_session(tmp_path)
+    assert count_edit_records(fp) == 11  # 4 次 replace + 删轮次 2 + 2 + 1（追问后面没有回答）+ 2
+    assert _strip(read_log_lines(fp)) == expected
+    assert _strip(read_tail_lines(fp, 1)) == _strip(_expected_tail(read_log_lines(fp), 1))
+
+def test_compact_log_keeps_content_and_rebuilds_index(tmp_path, monkeypatch):
+    fp, expected = _edited_session(tmp_path)
+    before = read_log_lines(fp)
+    records = count_log_records(fp)
+    assert compact_log(fp) == records - len(before)
+    assert read_log_lines(fp) == before
+    assert _strip(read_tail_lines(fp, 2)) == _strip(_expected_tail(before, 2))
+
+    # index 跟着重建：一行一条记录，没有编辑记录也没有删除标记
+    index = read_index(fp)
+    assert len(index) == len(before) == len(fp.read_bytes().splitlines())
+    assert all(code != ROLE_CODES["edit"] and not code & DEAD_FLAG for _, code in index)
+    _new_process(monkeypatch)
+    assert read_index(fp) == index
+
+    # 整理之后照常追加 / 编辑
+    append_log(fp, "user", "新问题")
+    replace_last_assistant_log(fp, "最后的回答")
+    assert _strip(read_log_lines(fp))[-2:] == [
+        {"role": "assistant", "content": "最后的回答"},
+        {"role": "user", "content": "新问题"},
+    ]
+
+def test_maybe_compact_log_threshold(tmp_path):
+    fp = _session(tmp_path, turns=1)
+    for i in range(EDIT_COMPACT_THRESHOLD - 1):
+        replace_last_assistant_log(fp, f"回答{i}")
+    size = fp.stat().st_size
+    assert maybe_compact_log(fp) == 0 and fp.stat().st_size == size
+
+    replace_last_assistant_log(fp, "最终回答")
+    before = read_log_lines(fp)
+    assert maybe_compact_log(fp) == EDIT_COMPACT_THRESHOLD
+    assert count_edit_records(fp) == 0 and read_log_lines(fp) == before
+    assert maybe_compact_log(tmp_path / "missing.jsonl") == 0
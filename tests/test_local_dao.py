@@ -1,6 +1,10 @@
 # 作者：Alex
 # 2026/1/28 16:59
-from src.telegram_world_bot.db.local import make_session_factory, init_local_db
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.telegram_world_bot.db.local import create_local_engine, make_session_factory, init_local_db
 from src.telegram_world_bot.db.dao import LocalDAO
 
 def test_idempotency():
@@ -10,3 +14,38 @@ def test_idempotency():
     dao = LocalDAO(session_factory)
     assert dao.try_acquire_idempotency("k1") is True
     assert dao.try_acquire_idempotency("k1") is False
+
+def test_retry_on_deadlock():
+    failures = {"left": 2}
+
+    class DeadlockOnce(Session):
+        # 模拟 MySQL 1213：前两次 commit 失败，事务整个回滚
+        def commit(self):
+            if failures["left"]:
+                failures["left"] -= 1
+                self.rollback()
+                raise OperationalError("COMMIT", {}, Exception(1213, "Deadlock found when trying to get lock"))
+            super().commit()
+
+    engine = create_local_engine()
+    init_local_db(engine)
+    dao = LocalDAO(sessionmaker(bind=engine, class_=DeadlockOnce, autoflush=False))
+    assert dao.try_acquire_idempotency("k1") is True
+    assert dao.retries == {"deadlock": 2}
+    assert dao.try_acquire_idempotency("k1") is False
+
+    failures["left"] = 1
+    dao.log_events([{"user_id": 1, "event": "e", "payload": None}] * 3)
+    assert dao.retries == {"deadlock": 3}
+
+def test_no_retry_on_other_errors():
+    class Broken(Session):
+        def commit(self):
+            raise OperationalError("COMMIT", {}, Exception(2006, "MySQL server has gone away"))
+
+    engine = create_local_engine()
+    init_local_db(engine)
+    dao = LocalDAO(sessionmaker(bind=engine, class_=Broken, autoflush=False))
+    with pytest.raises(OperationalError):
+        dao.log_event(1, "e")
+    assert not dao.retries
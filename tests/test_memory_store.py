@@ -0,0 +1,124 @@
+import asyncio
+
+from src.telegram_world_bot.config import AgentMemoryConfig
+from src.telegram_world_bot.db.local import make_async_session_factory, init_local_db_async
+from src.telegram_world_bot.db.dao import AsyncLocalDAO
+from src.telegram_world_bot.services.memory_store import MemoryStore, memory_scope
+
+def test_memory_store_write_behind_and_lazy_load():
+    async def scenario():
+        session_factory, engine = make_async_session_factory()
+        await init_local_db_async(engine)
+        dao = AsyncLocalDAO(session_factory)
+        config = AgentMemoryConfig(capacity=3, max_scopes=1, idle_ttl_s=0, flush_batch=1000)
+
+        store = MemoryStore(dao, config)
+        scope = memory_scope("onboarding", 1)
+        for i in range(5):
+            await store.add(scope, "user", f"m{i}")
+        memory = await store.get(scope)
+        assert [h["content"] for h in memory.history] == ["m2", "m3", "m4"]
+        assert store.stats()["pending"] == 5
+
+        # 被 LRU 挤掉后、flush 之前再访问：待写的行也能找回来
+        await store.get(memory_scope("onboarding", 2))
+        assert store.stats()["evicted_lru"] == 1
+        memory = await store.get(scope)
+        assert [h["content"] for h in memory.history] == ["m2", "m3", "m4"]
+
+        assert await store.flush() == 5
+        assert store.sweep() == 1  # idle_ttl_s=0：全部都算空闲
+        assert len(store) == 0
+
+        # 新实例（相当于重启）只从 DB 懒加载最近 capacity 条
+        store2 = MemoryStore(dao, config)
+        memory = await store2.get(scope)
+        assert [h["content"] for h in memory.history] == ["m2", "m3", "m4"]
+        assert store2.stats()["loads"] == 1
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+class _SlowDAO:
+    def __init__(self):
+        self.rows = []
+
+    async def load_agent_memory(self, scope, limit):
+        return []
+
+    async def append_agent_memories(self, rows):
+        await asyncio.sleep(0.05)
+        self.rows.extend(rows)
+
+def test_memory_store_close_waits_for_inflight_flush():
+    async def scenario():
+        dao = _SlowDAO()
+        store = MemoryStore(dao, AgentMemoryConfig(flush_interval_ms=10, flush_batch=1000))
+        await store.start()
+        scope = memory_scope("onboarding", 1)
+        for i in range(3):
+            await store.add(scope, "user", f"m{i}")
+        await asyncio.sleep(0.03)  # 后台 flush 已经取走这 3 行，正在写
+        await store.add(scope, "user", "m3")
+        await store.close()
+        assert [r["content"] for r in dao.rows] == ["m0", "m1", "m2", "m3"]
+
+        await store.add(scope, "user", "late")  # 关闭之后直接写
+        assert dao.rows[-1]["content"] == "late" and store.stats()["pending"] == 0
+
+    asyncio.run(scenario())
+
+class _GatedDAO:
+    """load 要等 release 才返回；append 要等 commit 才算写进去。"""
+    def __init__(self):
+        self.rows = []
+        self.loads = 0
+        self.release = asyncio.Event()
+        self.commit = asyncio.Event()
+
+    async def load_agent_memory(self, scope, limit):
+        self.loads += 1
+        await self.release.wait()
+        return [{"role": r["role"], "content": r["content"]} for r in self.rows if r["scope"] == scope][-limit:]
+
+    async def append_agent_memories(self, rows):
+        await self.commit.wait()
+        self.rows.extend(rows)
+
+def test_memory_store_waiter_takes_over_cancelled_load():
+    async def scenario():
+        dao = _GatedDAO()
+        store = MemoryStore(dao, AgentMemoryConfig())
+        scope = memory_scope("onboarding", 1)
+        leader = asyncio.create_task(store.get(scope))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(store.get(scope))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        dao.release.set()
+        memory = await asyncio.wait_for(waiter, 1)
+        assert leader.cancelled()
+        assert memory is await store.get(scope) and dao.loads == 2
+
+    asyncio.run(scenario())
+
+def test_memory_store_reload_during_flush_keeps_rows():
+    async def scenario():
+        dao = _GatedDAO()
+        dao.release.set()
+        store = MemoryStore(dao, AgentMemoryConfig(max_scopes=1, flush_batch=1000))
+        scope = memory_scope("onboarding", 1)
+        for i in range(3):
+            await store.add(scope, "user", f"m{i}")
+        await store.get(memory_scope("onboarding", 2))  # 把 scope 挤出去
+        flushing = asyncio.create_task(store.flush())
+        await asyncio.sleep(0)  # 3 行已经取出 _pending，还没提交
+        reload = asyncio.create_task(store.get(scope))
+        await asyncio.sleep(0.01)
+        dao.commit.set()
+        assert await flushing == 3
+        memory = await asyncio.wait_for(reload, 1)
+        assert [h["content"] for h in memory.history] == ["m0", "m1", "m2"]
+
+    asyncio.run(scenario())
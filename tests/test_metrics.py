@@ -0,0 +1,110 @@
+import asyncio
+
+from sqlalchemy import text
+import pytest
+from telegram import Update
+from telegram.error import Forbidden
+from telegram.ext import Application, CommandHandler
+
+from src.telegram_world_bot.db.instrumentation import QUERY_SECONDS, instrument_engine
+from src.telegram_world_bot.db.local import create_async_local_engine
+from src.telegram_world_bot.metrics import MetricsServer, Registry
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+from src.telegram_world_bot.telegram.instrumentation import (
+    API_ERRORS, API_SECONDS, HANDLER_ERRORS, HANDLER_SECONDS, instrument_handlers,
+)
+from src.telegram_world_bot.telegram.standin import build_standin_app
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+
+def test_render_prometheus_text():
+    reg = Registry()
+    reg.counter("jobs_total", "Jobs", ("kind",)).labels("a").inc(2)
+    reg.gauge("queue_depth", "Depth").set_function(lambda: 7)
+    hist = reg.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3):
+        hist.observe(v)
+    reg.register_stats("bot_sink", lambda: {"queue": 3, "latency": {"p50_ms": 1.5}, "name": "x"})
+
+    out = reg.render()
+    assert 'jobs_total{kind="a"} 2' in out
+    assert "queue_depth 7" in out
+    # le 是 <=：0.1 算进 0.1 这个桶
+    assert 'latency_seconds_bucket{le="0.1"} 2' in out
+    assert 'latency_seconds_bucket{le="1"} 3' in out
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in out
+    assert "latency_seconds_count 4" in out and "latency_seconds_sum 3.65" in out
+    assert "bot_sink_queue 3" in out and "bot_sink_latency_p50_ms 1.5" in out
+    assert "bot_sink_name" not in out
+
+    # 插件 agent 名之类的 key 里有非法字符
+    reg.register_stats("bot_agent_cache", lambda: {"my-agent.v2": {"hits": 1}})
+    assert "bot_agent_cache_my_agent_v2_hits 1" in reg.render()
+
+def test_handler_and_engine_instrumentation():
+    async def main():
+        async def ok(update, context):
+            await asyncio.sleep(0.01)
+
+        async def boom(update, context):
+            raise RuntimeError("x")
+
+        app = Application.builder().token("123:TEST").request(FakeRequest(FakeBotAPI())).build()
+        app.add_handler(CommandHandler("ok", ok))
+        app.add_handler(CommandHandler("boom", boom))
+        instrument_handlers(app)
+        instrument_handlers(app)  # 不会包两层
+        async with app:
+            for i, cmd in enumerate(("/ok", "/ok", "/boom")):
+                await app.process_update(Update.de_json(make_text_update(i, 1, cmd), app.bot))
+        ok_hist = HANDLER_SECONDS.labels(ok.__qualname__)
+        assert sum(ok_hist.counts) == 2 and ok_hist.sum >= 0.02
+        assert HANDLER_ERRORS.labels(boom.__qualname__).value == 1
+
+        engine = create_async_local_engine()
+        instrument_engine(engine)
+        async with engine.connect() as conn:
+            await conn.execute(text("CREATE TABLE t (id INTEGER)"))
+            await conn.execute(text("INSERT INTO t VALUES (1)"))
+            await conn.execute(text("SELECT id FROM t"))
+        assert sum(QUERY_SECONDS.labels("SELECT", "t").counts) == 1
+        assert sum(QUERY_SECONDS.labels("INSERT", "t").counts) == 1
+        await engine.dispose()
+
+    asyncio.run(main())
+
+def test_metrics_server():
+    async def main():
+        reg = Registry()
+        reg.counter("hits_total", "Hits").inc()
+        server = MetricsServer(reg, port=0)
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n")
+            await writer.drain()
+            response = (await reader.read()).decode()
+            writer.close()
+        finally:
+            await server.stop()
+        assert response.startswith("HTTP/1.1 200")
+        assert "hits_total 1" in response
+
+    asyncio.run(main())
+
+def test_bot_api_calls_instrumented_without_rate_limiter(tmp_path):
+    async def main():
+        api = FakeBotAPI()
+        app = build_standin_app(tmp_path, api)  # 出站限速默认关着
+        sent = API_SECONDS.labels("sendMessage")
+        before = sum(sent.counts)
+        forbidden = API_ERRORS.labels("sendMessage", "Forbidden")
+        errors_before = forbidden.value
+        async with app:
+            await app.bot.send_message(chat_id=1, text="hi")
+            api.fail_next("sendMessage", 403, description="Forbidden: bot was blocked by the user")
+            with pytest.raises(Forbidden):
+                await app.bot.send_message(chat_id=1, text="hi")
+        assert sum(sent.counts) == before + 2
+        assert forbidden.value == errors_before + 1
+
+    asyncio.run(main())
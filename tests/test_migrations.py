@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from src.telegram_world_bot.db.local import create_async_local_engine
+from src.telegram_world_bot.db.migrations import SCHEMA_VERSION, SchemaOutdated, check_schema, check_schema_async, migrate
+
+def test_migrate_old_database(tmp_path):
+    db = tmp_path / "bot.db"
+    engine = create_engine(f"sqlite:///{db}")
+    # 老库：只有没有 expires_at 的 idempotency_keys，也没有 schema_version
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE idempotency_keys (id INTEGER PRIMARY KEY, key VARCHAR(128), created_at DATETIME)"))
+
+    with pytest.raises(SchemaOutdated):
+        check_schema(engine)
+
+    assert len(migrate(engine)) == SCHEMA_VERSION
+    assert check_schema(engine) == SCHEMA_VERSION
+    columns = {c["name"] for c in inspect(engine).get_columns("idempotency_keys")}
+    assert "expires_at" in columns
+    assert "broadcast_checkpoints" in inspect(engine).get_table_names()
+    assert migrate(engine) == []  # 再跑一次什么都不做
+
+    async def check():
+        async_engine = create_async_local_engine(f"sqlite+aiosqlite:///{db}")
+        try:
+            return await check_schema_async(async_engine)
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(check()) == SCHEMA_VERSION
+    engine.dispose()
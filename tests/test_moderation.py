@@ -0,0 +1,55 @@
+import asyncio
+import os
+import threading
+import time
+
+from src.telegram_world_bot.agents.moderation_agent import ModerationAgent
+from src.telegram_world_bot.agents.pipeline import AgentPipeline, Stage, MODERATION_FALLBACK
+from src.telegram_world_bot.agents.registry import AgentRegistry
+from src.telegram_world_bot.agents.wordfilter import KeywordMatcher
+
+def test_matcher_overlapping_and_normalized():
+    matcher = KeywordMatcher(["he", "she", "hers", "敏感词", "賭博", "ＢＡＤ"])
+    words = sorted(m.word for m in matcher.search("ushers"))
+    assert words == ["he", "hers", "she"]
+
+    # 全角 / 大小写 / 繁简 / 插入分隔符
+    text = "这里有 敏-感 詞，还有 赌·博 和 bad"
+    hits = {m.word: text[m.start:m.end] for m in matcher.search(text)}
+    assert hits == {"敏感词": "敏-感 詞", "賭博": "赌·博", "ＢＡＤ": "bad"}
+    assert matcher.first("完全正常的一句话") is None
+
+def test_moderation_agent_hot_reload(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("# comment\n违禁\n", encoding="utf-8")
+    agent = ModerationAgent(str(path), reload_interval_s=0)
+
+    result = asyncio.run(agent.run({"text": "这是违 禁内容"}))
+    assert result["blocked"] and result["reason"] == "keyword:违禁"
+    assert not asyncio.run(agent.run({"text": "新词"}))["blocked"]
+
+    path.write_text("违禁\n新词\n", encoding="utf-8")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+    agent.matcher.current()
+    agent.matcher._reloading.join()
+    assert asyncio.run(agent.run({"text": "新词"}))["blocked"]
+
+def test_moderation_agent_built_off_event_loop(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("\n".join(f"词{i}" for i in range(20_000)), encoding="utf-8")
+    built_in = []
+
+    def factory():
+        built_in.append(threading.current_thread())
+        return ModerationAgent(str(path))
+
+    async def scenario():
+        reg = AgentRegistry()
+        reg.register_lazy("moderation", factory)
+        pipeline = AgentPipeline(reg, moderation=Stage("moderation", 5.0, MODERATION_FALLBACK))
+        # 第一条消息触发懒加载：自动机在线程里建，不占 event loop
+        return await pipeline._run_stage("moderation", pipeline.moderation, {"text": "含有词42的消息"})
+
+    result, fallback, _ = asyncio.run(scenario())
+    assert result["blocked"] and not fallback
+    assert built_in and built_in[0] is not threading.main_thread()
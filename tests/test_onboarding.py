@@ -0,0 +1,72 @@
+import asyncio
+
+from sqlalchemy.exc import OperationalError
+
+from telegram import Update
+
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI
+from src.telegram_world_bot.telegram.standin import build_standin_app, start_standin, stop_standin
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+
+def test_confirm_after_session_evicted_restarts(tmp_path):
+    async def scenario():
+        api = FakeBotAPI()
+        app = build_standin_app(tmp_path, api)
+        await start_standin(app)
+        try:
+            for i, text in enumerate(("/start", "新用户模式")):
+                await app.process_update(Update.de_json(make_text_update(i, 7, text), app.bot))
+            app.bot_data["session_store"].clear(7)  # 模拟空闲淘汰
+            await app.process_update(Update.de_json(make_text_update(2, 7, "确认提交"), app.bot))
+            # 过期之后重新走一遍，幂等 key 没被 mode=None 占掉
+            for i, text in enumerate(("/start", "新用户模式", "确认提交"), start=3):
+                await app.process_update(Update.de_json(make_text_update(i, 7, text), app.bot))
+        finally:
+            await stop_standin(app)
+        return [m["text"] for m in api.sent_messages()]
+
+    texts = asyncio.run(scenario())
+    assert texts[2].startswith("会话已过期")
+    assert texts[-1].startswith("✅")
+
+def test_start_unblocks_user(tmp_path):
+    async def scenario():
+        api = FakeBotAPI()
+        app = build_standin_app(tmp_path, api)
+        await start_standin(app)
+        dao = app.bot_data["dao"]
+        try:
+            await dao.mark_users_blocked([{"user_id": 7, "reason": "Forbidden: bot was blocked by the user"}])
+            await app.process_update(Update.de_json(make_text_update(1, 7, "/start"), app.bot))
+            return await dao.blocked_user_ids([7])
+        finally:
+            await stop_standin(app)
+
+    assert asyncio.run(scenario()) == set()
+
+def test_start_skips_unblock_for_unblocked_user_and_survives_db_errors(tmp_path):
+    async def scenario():
+        api = FakeBotAPI()
+        app = build_standin_app(tmp_path, api)
+        await start_standin(app)
+        dao = app.bot_data["dao"]
+        deletes = []
+
+        async def unblock_user(user_id):
+            deletes.append(user_id)
+
+        async def broken(user_ids):
+            raise OperationalError("SELECT", {}, Exception(2006, "MySQL server has gone away"))
+
+        try:
+            dao.unblock_user = unblock_user
+            await app.process_update(Update.de_json(make_text_update(1, 7, "/start"), app.bot))
+            dao.blocked_user_ids = broken
+            await app.process_update(Update.de_json(make_text_update(2, 8, "/start"), app.bot))
+        finally:
+            await stop_standin(app)
+        return deletes, [m["text"] for m in api.sent_messages()]
+
+    deletes, texts = asyncio.run(scenario())
+    assert deletes == []
+    assert texts == ["请选择模式：", "请选择模式："]
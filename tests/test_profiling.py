@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+from telegram import Update
+from telegram.ext import Application, CommandHandler, filters
+
+from src.telegram_world_bot.config import ProfilingConfig, Settings
+from src.telegram_world_bot.handlers.admin import profile_cmd
+from src.telegram_world_bot.profiling import SamplingProfiler, SlowUpdateTracer
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+from src.telegram_world_bot.telegram.update_processor import PerUserUpdateProcessor
+
+def _spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_sampling_profiler_finds_hot_function():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name="spinner")
+    worker.start()
+    try:
+        result = asyncio.run(SamplingProfiler(interval_s=0.002).run(0.3))
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = result.collapsed().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("spinner;") and "_spin" in line for line in lines)
+    assert "_spin" in result.top(5)[0][0]
+    assert "_spin" in result.report(5)
+
+def test_slow_update_tracer_dumps_stack():
+    async def slow_await(update):
+        await asyncio.sleep(0.25)
+
+    async def slow_blocking(update):
+        time.sleep(0.25)  # 把 loop 卡住：只能靠 watchdog 线程抓栈
+
+    async def scenario():
+        tracer = SlowUpdateTracer(threshold_s=0.05)
+        proc = PerUserUpdateProcessor(1, max_pending=1, slow_tracer=tracer)
+        await proc.initialize()
+        try:
+            for i, fn in enumerate((slow_await, slow_blocking)):
+                update = Update.de_json(make_text_update(i, 7, "hi"), None)
+                await proc.process_update(update, fn(update))
+            fast = Update.de_json(make_text_update(9, 7, "hi"), None)
+            await proc.process_update(fast, asyncio.sleep(0))
+        finally:
+            await proc.shutdown()
+        return tracer, proc
+
+    tracer, proc = asyncio.run(scenario())
+    assert tracer.slow == 2 and proc.stats()["slow_updates"] == 2
+    dumps = list(tracer.recent)
+    assert "slow update 0" in dumps[0] and "in slow_await" in dumps[0]
+    assert "slow update 1" in dumps[1] and "in slow_blocking" in dumps[1]
+
+def test_profile_command_sends_documents():
+    async def scenario():
+        api = FakeBotAPI()
+        app = Application.builder().token("123:TEST").request(FakeRequest(api)).build()
+        app.bot_data["settings"] = Settings(
+            bot_token="x", admin_user_ids=(1,), profiling=ProfilingConfig(interval_ms=2, max_seconds=1)
+        )
+        app.add_handler(CommandHandler("profile", profile_cmd, filters=filters.User(user_id=[1])))
+        async with app:
+            await app.process_update(Update.de_json(make_text_update(1, 1, "/profile 5"), app.bot))
+            await app.process_update(Update.de_json(make_text_update(2, 2, "/profile"), app.bot))  # 不是管理员
+        return api
+
+    api = asyncio.run(scenario())
+    docs = [params for _, method, params in api.calls if method == "sendDocument"]
+    assert len(docs) == 2 and all(d["chat_id"] == 1 for d in docs)
+    assert docs[1]["caption"].startswith("1.0s @ 2ms")
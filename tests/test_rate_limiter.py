@@ -0,0 +1,89 @@
+import asyncio
+import subprocess
+import sys
+
+from telegram.ext import ExtBot
+
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+from src.telegram_world_bot.telegram.rate_limiter import OutboundRateLimiter, PRIORITY_BROADCAST, PRIORITY_REPLY
+
+def _bot(api: FakeBotAPI, limiter: OutboundRateLimiter) -> ExtBot:
+    return ExtBot("123:TEST", request=FakeRequest(api), get_updates_request=FakeRequest(api), rate_limiter=limiter)
+
+def _send_times(api: FakeBotAPI, chat_id=None):
+    return [
+        t for t, method, params in api.calls
+        if method == "sendMessage" and (chat_id is None or params["chat_id"] == chat_id)
+    ]
+
+def test_per_chat_and_global_limits():
+    async def main():
+        api = FakeBotAPI()
+        limiter = OutboundRateLimiter(global_rate=20, global_burst=1, private_rate=10, private_burst=1)
+        bot = _bot(api, limiter)
+        async with bot:
+            # 同一个 chat 5 条：间隔 >= 1/10 s
+            await asyncio.gather(*(bot.send_message(1, f"m{i}") for i in range(5)))
+            times = _send_times(api, 1)
+            assert all(b - a >= 0.09 for a, b in zip(times, times[1:]))
+
+            # 10 个不同 chat 各 1 条：只受全局 20/s 限制
+            api.calls.clear()
+            await asyncio.gather(*(bot.send_message(100 + i, "x") for i in range(10)))
+            times = _send_times(api)
+            assert len(times) == 10
+            assert times[-1] - times[0] >= 9 / 20 * 0.9
+        stats = limiter.stats()
+        assert stats["sent"] == 15
+        assert stats["chat_waits"] >= 4 and stats["global_waits"] >= 1
+        assert stats["queue_latency"]["count"] == 15
+
+    asyncio.run(main())
+
+def test_chat_order_and_priority():
+    async def main():
+        api = FakeBotAPI()
+        limiter = OutboundRateLimiter(private_rate=50, private_burst=1)
+        bot = _bot(api, limiter)
+        async with bot:
+            # 第一条占住 chat；后面排队的按 (priority, 到达顺序) 发
+            tasks = [asyncio.create_task(bot.send_message(7, "first"))]
+            await asyncio.sleep(0)
+            for i in range(3):
+                tasks.append(asyncio.create_task(
+                    bot.send_message(7, f"bulk{i}", rate_limit_args={"priority": PRIORITY_BROADCAST})
+                ))
+            for i in range(3):
+                tasks.append(asyncio.create_task(
+                    bot.send_message(7, f"part{i}", rate_limit_args={"priority": PRIORITY_REPLY})
+                ))
+            await asyncio.gather(*tasks)
+        texts = [m["text"] for m in api.sent_messages()]
+        assert texts == ["first", "part0", "part1", "part2", "bulk0", "bulk1", "bulk2"]
+
+    asyncio.run(main())
+
+def test_retry_after_is_honored():
+    async def main():
+        api = FakeBotAPI()
+        limiter = OutboundRateLimiter(max_retries=1)
+        bot = _bot(api, limiter)
+        async with bot:
+            api.fail_next("sendMessage", retry_after=1)
+            msg = await bot.send_message(5, "hello")
+            assert msg.text == "hello"
+        attempts = _send_times(api, 5)
+        assert len(attempts) == 2 and attempts[1] - attempts[0] >= 0.95
+        stats = limiter.stats()
+        assert stats["retry_after"] == 1 and stats["retry_after_s"] == 1.0 and stats["sent"] == 1
+
+    asyncio.run(main())
+
+def test_rate_limiter_does_not_import_agents():
+    # 只要限流器的脚本（scripts/broadcast.py 等）不该把整套 agent 拉进来
+    code = (
+        "import sys; import scripts.broadcast; "
+        "print(any(m.startswith('src.telegram_world_bot.agents') for m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "False"
@@ -1,5 +1,7 @@
 # 作者：Alex
 # 2026/1/28 16:59
+import time
+
 from src.telegram_world_bot.services.session_store import SessionStore
 
 def test_session_store_basic():
@@ -8,3 +10,21 @@ def test_session_store_basic():
     assert store.get_value(1, "foo") == "bar"
     store.clear(1)
     assert store.get_value(1, "foo") is None
+
+def test_session_store_read_does_not_allocate():
+    store = SessionStore()
+    assert store.get_value(42, "foo") is None
+    assert store.get(42) is None
+    assert len(store) == 0
+
+def test_session_store_lru_and_idle_eviction():
+    store = SessionStore(max_sessions=2, idle_ttl_s=0)
+    for uid in (1, 2, 3):
+        store.set_value(uid, "k", uid)
+    assert store.get(1) is None
+    assert store.stats()["evicted_lru"] == 1
+
+    # idle_ttl_s=0：全部都算空闲
+    time.sleep(0.01)
+    assert store.sweep() == 2
+    assert store.stats()["size"] == 0
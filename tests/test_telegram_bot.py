@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessage, SystemMessage
+from telegram import Update
+from telegram.ext import ExtBot
+
+from src.telegram_world_bot.agents.context import ContextBuilder
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI, FakeRequest
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+from tests import telegram_bot_test
+from tests.grok_talking import read_log_lines
+from tests.telegram_bot_test import TELEGRAM_MAX, ChatState, StreamingReply, call_llm, cancel_inflight, handle_text
+
+def _bot_data(llm, concurrency=2, timeout_s=1.0):
+    return {
+        "llm": llm,
+        "llm_concurrency": concurrency,
+        "llm_timeout_s": timeout_s,
+        "llm_semaphore": asyncio.Semaphore(concurrency),
+        "stream_replies": False,
+        "stream_edit_interval_s": 0.0,
+        "context_builder": ContextBuilder(make_message=lambda role, content: SystemMessage(content=content)),
+    }
+
+@pytest.fixture
+def llm_pool(monkeypatch):
+    monkeypatch.setattr(telegram_bot_test, "_LLM_POOL", None)
+    yield
+    if telegram_bot_test._LLM_POOL is not None:
+        telegram_bot_test._LLM_POOL.shutdown(wait=True)
+
+class _SyncLLM:
+    """只有 invoke：走线程池兜底。"""
+    def __init__(self, seconds=0.0, gate: threading.Event | None = None):
+        self.seconds = seconds
+        self.gate = gate
+
+    def invoke(self, messages):
+        if self.gate is not None:
+            self.gate.wait(5)
+        time.sleep(self.seconds)
+        return AIMessage(content=f"sync:{len(messages)}")
+
+class _SlowAsyncLLM:
+    async def ainvoke(self, messages):
+        await asyncio.sleep(5)
+        return AIMessage(content="too late")
+
+def test_call_llm_sync_fallback_does_not_block_loop(llm_pool):
+    async def scenario():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker = asyncio.create_task(tick())
+        text = await call_llm(_SyncLLM(seconds=0.1), [SystemMessage(content="s")], _bot_data(None))
+        ticker.cancel()
+        return text, ticks
+
+    text, ticks = asyncio.run(scenario())
+    assert text == "sync:1"
+    assert ticks >= 5  # invoke 在线程里睡的时候 loop 一直在转
+
+def test_call_llm_timeout_releases_slot():
+    async def scenario():
+        bot_data = _bot_data(None, concurrency=1, timeout_s=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await call_llm(_SlowAsyncLLM(), [], bot_data)
+        return bot_data["llm_semaphore"].locked()
+
+    assert asyncio.run(scenario()) is False
+
+def test_thread_fallback_timeout_holds_slot_until_worker_returns(llm_pool):
+    async def scenario():
+        gate = threading.Event()
+        bot_data = _bot_data(None, concurrency=1, timeout_s=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await call_llm(_SyncLLM(gate=gate), [], bot_data)
+        # 超时了但线程还在跑：名额不还，线程数不会超过 llm_concurrency
+        held = bot_data["llm_semaphore"].locked()
+        gate.set()
+        for _ in range(100):
+            if not bot_data["llm_semaphore"].locked():
+                break
+            await asyncio.sleep(0.01)
+        return held, bot_data["llm_semaphore"].locked()
+
+    assert asyncio.run(scenario()) == (True, False)
+
+class _OvertakenLLM:
+    """第一次调用：结果已经算完、handler 还没恢复执行的空档里，同一个 chat 来了新消息。"""
+    def __init__(self, st, on_newer):
+        self.st = st
+        self.on_newer = on_newer
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        if self.calls > 1:
+            return AIMessage(content="新回复")
+
+        def newer_message(_):
+            # 这时 LLM task 已经 done，新消息的 cancel_inflight 取消不了它，只能靠 generation 对不上
+            cancel_inflight(self.st)
+            self.on_newer()
+
+        self.st.inflight.add_done_callback(newer_message)
+        return AIMessage(content="旧回复")
+
+def test_stale_generation_is_never_sent_or_logged(tmp_path, monkeypatch):
+    api = FakeBotAPI()
+    st = ChatState(log_fp=tmp_path / "1.jsonl", system_prompt="sys", messages=[SystemMessage(content="sys")])
+    monkeypatch.setitem(telegram_bot_test.STATE, 7, st)
+
+    async def scenario():
+        bot = ExtBot("123:TEST", request=FakeRequest(api), get_updates_request=FakeRequest(api))
+        async with bot:
+            newer = []
+            llm = _OvertakenLLM(st, lambda: newer.append(asyncio.ensure_future(handle_text(second, context))))
+            context = SimpleNamespace(bot_data=_bot_data(llm), application=None)
+            first = Update.de_json(make_text_update(1, 7, "第一条"), bot)
+            second = Update.de_json(make_text_update(2, 7, "第二条"), bot)
+            await handle_text(first, context)
+            await asyncio.gather(*newer)
+
+    asyncio.run(scenario())
+    assert [m["text"] for m in api.sent_messages()] == ["新回复"]
+    lines = read_log_lines(st.log_fp)
+    assert [line["content"] for line in lines if line["role"] == "assistant"] == ["新回复"]
+    assert any(line["role"] == "meta" and line["content"] == "cancelled_by_newer_message" for line in lines)
+    assert [m.content for m in st.messages[1:]] == ["第一条", "第二条", "新回复"]
+
+def _stream_scenario(api, body):
+    async def scenario():
+        bot = ExtBot("123:TEST", request=FakeRequest(api), get_updates_request=FakeRequest(api))
+        async with bot:
+            source = Update.de_json(make_text_update(1, 7, "hi"), bot).message
+            return await body(source)
+
+    return asyncio.run(scenario())
+
+def _final_texts(api):
+    """每条消息最后显示的内容，按发送顺序（edit 只会改最新的那条）。"""
+    texts = []
+    for _, method, params in api.calls:
+        if method == "sendMessage":
+            texts.append(params["text"])
+        elif method == "editMessageText":
+            texts[-1] = params["text"]
+    return texts
+
+def test_streaming_reply_throttles_edits():
+    api = FakeBotAPI()
+
+    async def body(source):
+        stream = StreamingReply(source, edit_interval_s=0.05)
+        await stream.start()
+        text = ""
+        started = time.perf_counter()
+        for i in range(100):
+            text += f"片段{i} "
+            await stream.push(text)
+            await asyncio.sleep(0.002)
+        elapsed = time.perf_counter() - started
+        await stream.finish(text)
+        return stream, text, elapsed
+
+    stream, text, elapsed = _stream_scenario(api, body)
+    edits = [params for _, method, params in api.calls if method == "editMessageText"]
+    assert len(edits) == stream.edits
+    assert 2 <= len(edits) <= elapsed / 0.05 + 2  # 节流内的 + finish 的最后一次
+    assert _final_texts(api) == [text]
+    assert stream.ttft_ms is not None
+
+def test_streaming_reply_rolls_over_without_blank_messages():
+    api = FakeBotAPI()
+    text = "a" * TELEGRAM_MAX + "b" * TELEGRAM_MAX + "c" * 100
+
+    async def body(source):
+        stream = StreamingReply(source, edit_interval_s=0.0)
+        await stream.start()
+        for end in range(0, len(text) + 1, 500):
+            await stream.push(text[:end])
+        await stream.finish(text)
+
+    _stream_scenario(api, body)
+    assert _final_texts(api) == ["a" * TELEGRAM_MAX, "b" * TELEGRAM_MAX, "c" * 100]
+    sent = [params["text"] for _, method, params in api.calls if method in ("sendMessage", "editMessageText")]
+    assert all(t.strip() for t in sent) and all(len(t) <= TELEGRAM_MAX for t in sent)
+
+def test_streaming_reply_whitespace_after_limit_sends_nothing():
+    api = FakeBotAPI()
+    text = "a" * TELEGRAM_MAX + " \n\n "
+
+    async def body(source):
+        stream = StreamingReply(source, edit_interval_s=0.0)
+        await stream.start()
+        await stream.push(text[:10])
+        await stream.finish(text)
+
+    _stream_scenario(api, body)
+    # 超出部分只有空白：不会为它单独发一条空消息
+    assert _final_texts(api) == ["a" * TELEGRAM_MAX]
+    assert all(params["text"].strip() for params in api.sent_messages())
@@ -0,0 +1,36 @@
+import asyncio
+
+from telegram import Update
+
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+from src.telegram_world_bot.telegram.update_processor import PerUserUpdateProcessor
+
+def test_per_user_order_with_cross_user_concurrency():
+    async def scenario():
+        proc = PerUserUpdateProcessor(max_concurrent_updates=8)
+        log = []
+        running = set()
+        overlap = []
+
+        async def handle(user_id: int, seq: int, delay: float):
+            running.add(user_id)
+            overlap.append(len(running))
+            await asyncio.sleep(delay)
+            log.append((user_id, seq))
+            running.discard(user_id)
+
+        tasks = []
+        for seq in range(5):
+            for user_id, delay in ((1, 0.02 - seq * 0.004), (2, 0.001)):
+                update = Update.de_json(make_text_update(seq * 10 + user_id, user_id, "hi"), None)
+                tasks.append(asyncio.create_task(proc.process_update(update, handle(user_id, seq, delay))))
+        await asyncio.gather(*tasks)
+
+        assert [s for u, s in log if u == 1] == list(range(5))
+        assert [s for u, s in log if u == 2] == list(range(5))
+        assert max(overlap) == 2  # 两个用户并发，同一用户从不并发
+        stats = proc.stats()
+        assert stats["processed"] == 10 and stats["pending"] == 0
+        assert stats["max_key_depth"] == 5
+
+    asyncio.run(scenario())
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import gzip
+import zlib
+
+from telegram import Update
+
+from scripts.replay_updates import diff_outputs, replay
+from src.telegram_world_bot.config import RecorderConfig
+from src.telegram_world_bot.telegram.fake_api import FakeBotAPI
+from src.telegram_world_bot.telegram.recorder import UpdateRecorder, read_recording
+from src.telegram_world_bot.telegram.standin import build_standin_app, start_standin, stop_standin
+from src.telegram_world_bot.telegram.synthetic import make_text_update
+
+SCRIPTS = (
+    ("/start", "新用户模式", "确认提交"),
+    ("/start",),  # 走到一半不走了
+    ("/start", "老用户迁移", "取消"),
+    ("我的手机号 13800000000",),
+    ("/help",),
+)
+
+def _record(tmp_path, path):
+    async def scenario():
+        app = build_standin_app(tmp_path / "live", FakeBotAPI(), recorder=RecorderConfig(enabled=True, path=str(path)))
+        await start_standin(app)
+        update_id = 0
+        for user in range(10):
+            for text in SCRIPTS[user % len(SCRIPTS)]:
+                update_id += 1
+                await app.process_update(Update.de_json(make_text_update(update_id, 555000 + user, text), app.bot))
+        await stop_standin(app)
+
+    (tmp_path / "live").mkdir()
+    asyncio.run(scenario())
+
+def test_recording_is_anonymized(tmp_path):
+    path = tmp_path / "updates.jsonl.gz"
+    _record(tmp_path, path)
+    raw = gzip.decompress(path.read_bytes()).decode("utf-8")
+    assert "555000" not in raw and "user555000" not in raw and "13800000000" not in raw
+    records = list(read_recording(str(path)))
+    assert len(records) == 18
+    texts = [r["update"]["message"]["text"] for r in records]
+    assert texts[:3] == ["/start", "新用户模式", "确认提交"]
+    assert "x" * len("我的手机号 13800000000") in texts
+    # 同一个用户映射到同一个假 id，会话才能回放
+    first_user = {r["update"]["message"]["from"]["id"] for r in records[:3]}
+    assert len(first_user) == 1
+
+def test_truncated_member_is_skipped(tmp_path):
+    path = tmp_path / "updates.jsonl.gz"
+    recorder = UpdateRecorder(str(path), salt="s", flush_interval_s=0)
+    for i in range(5):
+        recorder.write(make_text_update(i, 1, "/start"))
+    recorder.close()
+    data = path.read_bytes()
+    path.write_bytes(data[:-8])  # 第一段没有 gzip 尾巴，像被 kill 掉
+    recorder = UpdateRecorder(str(path), salt="s")
+    recorder.write(make_text_update(99, 1, "/help"))
+    recorder.close()
+    ids = [r["update"]["update_id"] for r in read_recording(str(path))]
+    assert ids == [0, 1, 2, 3, 4, 99]
+
+def test_entities_keep_only_position_and_utf16_length():
+    anonymizer = UpdateRecorder("unused", salt="s").anonymizer
+    data = make_text_update(1, 1, "hi 😀 there link")
+    data["message"]["entities"] = [
+        {"type": "text_link", "offset": 12, "length": 4, "url": "https://secret.example/u/alice?token=abc"},
+    ]
+    message = anonymizer.update(data)["message"]
+    assert message["entities"] == [{"type": "text_link", "offset": 12, "length": 4}]
+    # Telegram 的偏移按 UTF-16 算，emoji 占两个码元
+    assert message["text"] == "x" * 16
+    assert anonymizer.update(make_text_update(2, 1, "/start 😀"))["message"]["text"] == "/start xx"
+
+def test_quiet_recorder_flushes_by_timer(tmp_path):
+    path = tmp_path / "updates.jsonl.gz"
+
+    async def scenario():
+        recorder = UpdateRecorder(str(path), salt="s", flush_interval_s=0.05)
+        await recorder.start()
+        recorder.write(make_text_update(1, 1, "/start"))
+        recorder.write(make_text_update(2, 1, "/help"))  # 紧接着写，不会在 write 里 flush
+        await asyncio.sleep(0.2)
+        # 还没 close，也没有新 update，文件里已经能读到两条
+        raw = zlib.decompressobj(wbits=31).decompress(path.read_bytes())
+        recorder.close()
+        return raw
+
+    raw = asyncio.run(scenario())
+    assert raw.count(b"\n") == 2
+
+def test_replay_is_repeatable(tmp_path):
+    path = tmp_path / "updates.jsonl.gz"
+    _record(tmp_path, path)
+    args = argparse.Namespace(recording=str(path), speed=0.0, concurrency=4, limit=0)
+    first = replay(args)
+    second = replay(argparse.Namespace(recording=str(path), speed=50.0, concurrency=1, limit=0))
+    assert first["errors"] == 0 and first["latency_ms"]["n"] == 18
+    assert set(first["latency_ms_by_kind"]) == {"/start", "/help", "新用户模式", "确认提交", "老用户迁移", "取消", "text"}
+    assert diff_outputs(second, first) == []
+    done = [lines for lines in first["outputs"].values() if lines[-1].startswith("sendMessage: ✅")]
+    assert len(done) == 2
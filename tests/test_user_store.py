@@ -0,0 +1,50 @@
+from src.telegram_world_bot.services.user_store import UserStore, UserProfile
+
+def test_user_store_journal_replay_and_compaction(tmp_path):
+    path = tmp_path / "users.json"
+    store = UserStore(str(path), journal=True, compact_threshold=5)
+    for i in range(12):
+        store.upsert(UserProfile(user_id=i % 4, username=f"u{i}"))
+    store.close()
+
+    # compaction 之后 journal 只剩阈值以内的尾巴
+    assert len(store.journal_path.read_text(encoding="utf-8").splitlines()) < 5
+
+    reopened = UserStore(str(path), journal=True)
+    assert len(reopened) == 4
+    assert reopened.get(3).username == "u11"
+    reopened.close()
+
+def test_user_store_journal_ignores_torn_tail(tmp_path):
+    path = tmp_path / "users.json"
+    store = UserStore(str(path), journal=True, group_commit_ms=5)
+    store.upsert(UserProfile(user_id=1, username="a"))
+    store.close()
+    with store.journal_path.open("a", encoding="utf-8") as f:
+        f.write('{"user_id": 2, "usern')
+
+    reopened = UserStore(str(path), journal=True)
+    assert reopened.get(1).username == "a"
+    assert reopened.get(2) is None
+    reopened.upsert(UserProfile(user_id=3, username="c"))
+    reopened.close()
+
+    assert UserStore(str(path), journal=True).get(3).username == "c"
+
+def test_user_store_journal_ignores_torn_multibyte_tail(tmp_path):
+    path = tmp_path / "users.json"
+    store = UserStore(str(path), journal=True, group_commit_ms=5)
+    store.upsert(UserProfile(user_id=1, username="张三"))
+    store.close()
+    with store.journal_path.open("ab") as f:
+        f.write('{"user_id": 2, "username": "新'.encode("utf-8")[:-1])  # "新" 只写进去两个字节
+
+    reopened = UserStore(str(path), journal=True)
+    assert reopened.get(1).username == "张三"
+    assert reopened.get(2) is None
+    reopened.upsert(UserProfile(user_id=3, username="李四"))
+    reopened.close()
+
+    again = UserStore(str(path), journal=True)
+    assert again.get(3).username == "李四" and again.get(2) is None
+    again.close()